@@ -0,0 +1,30 @@
+import json
+import uvicorn
+
+import logs
+from dbInterface import backendName
+
+log = logs.get('api')
+
+with open('config.json') as json_file:
+    config = json.load(json_file)
+
+logs.configure(config)
+
+def runAPI(workers = 1):
+    #more than one worker runs the API in separate processes, each importing gateway.py on its own
+    uvicorn.run("gateway:app", host="0.0.0.0", port=config["main"]["port"], log_level="warning", workers=workers)
+
+def main():
+    #API service: only serves requests from the db the scanner service (scanner.py) keeps up to date
+    workers = config['main'].get('api-workers', 1)
+
+    if backendName(config) == 'memory' and workers > 1:
+        log.warning('the memory backend can not be shared between processes, running the API with one worker')
+        workers = 1
+
+    log.info('starting API with %s workers', workers)
+    runAPI(workers)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+import base64
+import collections
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+#local stand-ins for the TN node and bitcoind, serving synthetic chains that are generated up front from a seed,
+#so every run of a benchmark scans the same blocks. both count the calls they answer per path or method
+B58ALPHABET = '123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz'
+
+def b58encode(data):
+    number = int.from_bytes(data, 'big')
+    chars = ''
+
+    while number > 0:
+        number, rest = divmod(number, 58)
+        chars = B58ALPHABET[rest] + chars
+
+    return '1' * (len(data) - len(data.lstrip(b'\x00'))) + chars
+
+def btcAddress(rand, version = 0x6f):
+    #p2pkh address of a random key hash, 0x6f for testnet and regtest
+    payload = bytes([version]) + bytes(rand.getrandbits(8) for index in range(20))
+    return b58encode(payload + hashlib.sha256(hashlib.sha256(payload).digest()).digest()[:4])
+
+def txId(rand):
+    return '%064x' % rand.getrandbits(256)
+
+class counter(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = collections.Counter()
+
+    def add(self, name):
+        with self.lock:
+            self.calls[name] += 1
+
+    def total(self):
+        with self.lock:
+            return sum(self.calls.values())
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.calls)
+
+class fakeServer(object):
+    #one HTTP/1.1 server with keep-alive on a free local port, requests are answered by self.answer
+    def __init__(self):
+        self.counter = counter()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self.handlerClass())
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+
+    def handlerClass(self):
+        fake = self
+
+        class handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                self.respond(None)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                self.respond(self.rfile.read(length))
+
+            def respond(self, body):
+                status, result = fake.answer(self.command, self.path, self.headers, body)
+                data = json.dumps(result).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return handler
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+class tnNode(fakeServer):
+    #/blocks/height, /blocks/at/{height}, transfer broadcasts and what PyCWaves asks for around them.
+    #withdrawRatio of the txs per block are transfers of the gateway asset to the gateway with a BTC address attached
+    #the calls of a scanner asking for the height, which it keeps making while it waits for new blocks
+    tipCalls = ('/blocks/height',)
+
+    def __init__(self, blocks, txs, withdrawRatio, gatewayAddress, assetId, minAmount, maxAmount, decimals = 8, seed = 1):
+        self.gatewayAddress = gatewayAddress
+        self.assetId = assetId
+        self.lock = threading.Lock()
+        self.rand = random.Random(seed)
+        self.sent = {}
+        self.chain = []
+        self.withdraws = 0
+
+        start = int(time.time() * 1000) - blocks * 60000
+        for height in range(1, blocks + 1):
+            transactions = []
+
+            for index in range(txs):
+                sender = '3N' + b58encode(bytes(self.rand.getrandbits(8) for byte in range(24)))[:33]
+
+                if self.rand.random() < withdrawRatio:
+                    target = btcAddress(self.rand)
+                    amount = int(round(self.rand.uniform(minAmount, maxAmount) * pow(10, decimals)))
+                    transactions.append({'type': 4, 'id': txId(self.rand), 'sender': sender, 'recipient': gatewayAddress, 'assetId': assetId,
+                                         'amount': amount, 'fee': 2000000, 'attachment': b58encode(target.encode()), 'timestamp': start + height * 60000})
+                    self.withdraws += 1
+                else:
+                    transactions.append({'type': 4, 'id': txId(self.rand), 'sender': sender, 'recipient': '3N' + sender[2:], 'assetId': None,
+                                         'amount': self.rand.randint(1, 10 ** 10), 'fee': 100000, 'attachment': '', 'timestamp': start + height * 60000})
+
+            self.chain.append({'height': height, 'timestamp': start + height * 60000, 'transactions': transactions})
+
+        super().__init__()
+
+    def url(self):
+        return 'http://127.0.0.1:%d' % self.port
+
+    def answer(self, command, path, headers, body):
+        path = path.split('?')[0]
+        parts = path.strip('/').split('/')
+        height = len(self.chain)
+
+        if path == '/blocks/height':
+            self.counter.add('/blocks/height')
+            return 200, {'height': height + 1}
+
+        if path.startswith('/blocks/at/'):
+            self.counter.add('/blocks/at')
+            index = int(parts[2]) - 1
+            if 0 <= index < height:
+                return 200, self.chain[index]
+            return 404, {'error': 404, 'message': 'block does not exist'}
+
+        if path in ('/assets/broadcast/transfer', '/transactions/broadcast'):
+            self.counter.add(path)
+            tx = json.loads(body or b'{}')
+            with self.lock:
+                tx['id'] = b58encode(bytes(self.rand.getrandbits(8) for byte in range(32)))
+                self.sent[tx['id']] = height
+            return 200, tx
+
+        if path.startswith('/transactions/info/'):
+            self.counter.add('/transactions/info')
+            if parts[2] == self.assetId:
+                return 200, {'type': 3, 'id': self.assetId, 'assetId': self.assetId, 'height': 1}
+            with self.lock:
+                found = self.sent.get(parts[2])
+            if found is None:
+                return 404, {'error': 311, 'message': 'transactions does not exist'}
+            return 200, {'type': 4, 'id': parts[2], 'height': found}
+
+        if path.startswith('/assets/details/'):
+            self.counter.add('/assets/details')
+            return 200, {'assetId': parts[2], 'issuer': self.gatewayAddress, 'name': 'BENCH', 'description': '', 'quantity': 10 ** 18,
+                         'decimals': 8, 'reissuable': True, 'issueHeight': 1, 'issueTimestamp': 0}
+
+        if path.startswith('/assets/balance/'):
+            self.counter.add('/assets/balance')
+            return 200, {'address': parts[2], 'assetId': parts[3] if len(parts) > 3 else '', 'balance': 10 ** 18}
+
+        if path.startswith('/addresses/balance/'):
+            self.counter.add('/addresses/balance')
+            return 200, {'address': parts[2], 'confirmations': 0, 'balance': 10 ** 18}
+
+        self.counter.add('unknown ' + command + ' ' + path)
+        return 404, {'error': 404, 'message': 'not served by the benchmark node'}
+
+class bitcoinNode(fakeServer):
+    #the JSON-RPC methods of bitcoind otherCalls uses, batches included. depositRatio of the txs per block pay an address
+    #of their own, listed in depositAddresses so a tunnel can be created for each of them
+    tipCalls = ('getbestblockhash', 'getblock')
+
+    def __init__(self, blocks, txs, depositRatio, minAmount, maxAmount, seed = 2, user = 'bench', password = 'bench'):
+        self.auth = 'Basic ' + base64.b64encode((user + ':' + password).encode()).decode()
+        self.user = user
+        self.password = password
+        self.lock = threading.Lock()
+        self.rand = random.Random(seed)
+        self.hashes = []
+        self.blocks = {}
+        self.transactions = {}
+        self.sent = set()
+        self.depositAddresses = []
+
+        start = int(time.time()) - blocks * 600
+        for height in range(1, blocks + 1):
+            txids = []
+
+            for index in range(txs):
+                txid = txId(self.rand)
+                target = btcAddress(self.rand)
+
+                if self.rand.random() < depositRatio:
+                    amount = round(self.rand.uniform(minAmount, maxAmount), 8)
+                    self.depositAddresses.append(target)
+                else:
+                    amount = round(self.rand.uniform(0.0001, 5), 8)
+
+                self.transactions[txid] = {'txid': txid, 'vout': [{'value': amount, 'n': 0, 'scriptPubKey': {'addresses': [target], 'type': 'pubkeyhash'}},
+                                                                   {'value': 0.1, 'n': 1, 'scriptPubKey': {'addresses': [btcAddress(self.rand)], 'type': 'pubkeyhash'}}]}
+                txids.append(txid)
+
+            blockhash = txId(self.rand)
+            self.hashes.append(blockhash)
+            self.blocks[blockhash] = {'hash': blockhash, 'height': height, 'time': start + height * 600, 'tx': txids}
+
+        super().__init__()
+
+    def url(self):
+        return 'http://%s:%s@127.0.0.1:%d' % (self.user, self.password, self.port)
+
+    def answer(self, command, path, headers, body):
+        if headers.get('Authorization') != self.auth:
+            return 401, {'result': None, 'error': {'code': -1, 'message': 'unauthorized'}, 'id': None}
+
+        request = json.loads(body or b'{}')
+
+        if isinstance(request, list):
+            return 200, [self.call(item) for item in request]
+
+        return 200, self.call(request)
+
+    def call(self, request):
+        method = request.get('method', '')
+        params = request.get('params', [])
+        self.counter.add(method)
+
+        if not hasattr(self, 'rpc_' + method):
+            return {'result': None, 'error': {'code': -32601, 'message': 'Method not found'}, 'id': request.get('id')}
+
+        try:
+            result = getattr(self, 'rpc_' + method)(*params)
+            error = None
+        except TypeError:
+            result = None
+            error = {'code': -1, 'message': 'wrong parameters for ' + method}
+        except (KeyError, IndexError):
+            result = None
+            error = {'code': -5, 'message': 'not found'}
+
+        return {'result': result, 'error': error, 'id': request.get('id')}
+
+    def rpc_getbestblockhash(self):
+        return self.hashes[-1]
+
+    def rpc_getblockhash(self, height):
+        if height < 1:
+            raise IndexError(height)
+        return self.hashes[height - 1]
+
+    def rpc_getblock(self, blockhash, verbosity = 1):
+        return self.blocks[blockhash]
+
+    def rpc_getrawtransaction(self, txid, verbose = False):
+        return self.transactions[txid]
+
+    def rpc_sendtoaddress(self, address, amount, *args):
+        with self.lock:
+            txid = txId(self.rand)
+            self.sent.add(txid)
+        return txid
+
+    def rpc_gettransaction(self, txid, *args):
+        with self.lock:
+            if txid not in self.sent:
+                raise KeyError(txid)
+        return {'txid': txid, 'status': 1, 'confirmations': 1, 'blockhash': self.hashes[-1]}
+
+    def rpc_getnewaddress(self, *args):
+        with self.lock:
+            return btcAddress(self.rand)
+
+    def rpc_getbalance(self, *args):
+        return 21000000
+
+    def rpc_validateaddress(self, address):
+        return {'isvalid': True, 'address': address}
+
+    def rpc_walletpassphrase(self, passphrase, timeout):
+        return None
+
+    def rpc_walletlock(self):
+        return None
@@ -0,0 +1,342 @@
+import argparse
+import http.client
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from fakeNodes import bitcoinNode, btcAddress, tnNode
+from startup import freePort, isReady
+from throughput import ASSET, GATEWAY, dropDatabase, makeConfig
+
+#requests per second and latency per endpoint of the API under the traffic of its users, checked against SLOs:
+#    python3 benchmarks/loadtest.py --users 10000 --duration 60 --slo deposit.p99=250 --slo all.errors=0.001
+#the API runs under uvicorn on a database seeded with --users users, the nodes are the stand-ins of fakeNodes.py.
+#exits with 1 when an SLO is missed
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENDPOINTS = ('deposit', 'checktxs', 'fullinfo', 'health', 'tunnel')
+#latencies in ms and the share of errors may not be exceeded, requests per second may not be undercut
+LIMITS = {'p50': 'max', 'p95': 'max', 'p99': 'max', 'errors': 'max', 'rps': 'min'}
+
+def apiConfig(args, tn, btc, workdir):
+    config = makeConfig(args, args.backend, tn, btc, workdir)
+    config['main'].update({'company': 'Load test', 'contact-email': '', 'contact-telegram': '', 'recovery_amount': 0, 'recovery_fee': 0,
+                           'admin-username': 'admin', 'admin-password': 'admin', 'disclaimer': '', 'index-file': '', 'log-level': 'WARNING'})
+    config['dcc'].update({'gateway_fee': args.fee, 'network_fee': 0, 'coldwallet': ''})
+    config['other'].update({'gateway_fee': args.fee, 'network_fee': 0, 'gatewayAddress': btcAddress(random.Random(args.seed)), 'network': 'Bitcoin'})
+
+    return config
+
+def seed(args, config):
+    #users with a tunnel, their deposits and withdraws and the verification of most of them, plus addresses without a tunnel
+    #for the /tunnel bursts. returns (users, new addresses)
+    sys.path.insert(0, ROOT)
+
+    from dbInterface import getDB
+    from tnClass import tnCalls
+
+    if args.backend == 'postgres':
+        dropDatabase(config)
+
+    db = getDB(config)
+    db.createdb()
+    db.createVerify()
+    db.updateExisting()
+    db.insHeights(args.blocks, 'DCC')
+    db.insHeights(args.blocks, 'Other')
+
+    tnc = tnCalls(config, db)
+    rand = random.Random(args.seed)
+    users = [tnc.pwTN.Address(seed='loadtest user %d' % index).address for index in range(args.users)]
+    fresh = [tnc.pwTN.Address(seed='loadtest tunnel %d' % index).address for index in range(args.tunnels)]
+
+    tunnels = []
+    executed = []
+    verified = []
+    errors = []
+
+    for user in users:
+        tunnels.append((rand.choice(['created', 'created', 'created', 'verifying', 'error']), btcAddress(rand), user))
+
+        for index in range(args.txs_per_user):
+            tnTxId = '%064x' % rand.getrandbits(256)
+            otherTxId = '%064x' % rand.getrandbits(256)
+            amount = round(rand.uniform(args.min, args.max), 8)
+
+            if rand.random() < 0.5:
+                executed.append((btcAddress(rand), user, otherTxId, tnTxId, amount, args.fee, 'Deposit'))
+                verifiedTx = ('DCC', tnTxId)
+            else:
+                executed.append((user, btcAddress(rand), otherTxId, tnTxId, amount, args.fee, 'Withdraw'))
+                verifiedTx = ('Other', otherTxId)
+
+            if rand.random() < 0.9:
+                verified.append(verifiedTx + (rand.randint(1, args.blocks),))
+
+        if rand.random() < args.error_ratio:
+            errors.append((btcAddress(rand), user, '', '%064x' % rand.getrandbits(256), args.min, 'tx failed to send - manual intervention required', ''))
+
+    #verified after executed, so the verified blocks are copied to the executed rows
+    for rows, insert in ((tunnels, db.insTunnelBulk), (executed, db.insExecutedBulk), (verified, db.insVerifiedBulk), (errors, db.insErrorBulk)):
+        for index in range(0, len(rows), 10000):
+            insert(rows[index:index + 10000])
+
+    db.close()
+
+    return users, fresh
+
+class results(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = dict((endpoint, []) for endpoint in ENDPOINTS)
+        self.requests = dict((endpoint, 0) for endpoint in ENDPOINTS)
+        self.errors = dict((endpoint, 0) for endpoint in ENDPOINTS)
+        self.recording = False
+
+    def add(self, endpoint, seconds, ok):
+        #seconds is None for requests that got no response
+        if not self.recording:
+            return
+
+        with self.lock:
+            self.requests[endpoint] += 1
+
+            if seconds is not None:
+                self.latencies[endpoint].append(seconds * 1000)
+
+            if not ok:
+                self.errors[endpoint] += 1
+
+def get(connection, path):
+    #(seconds, ok) of one GET on a kept-alive connection
+    start = time.perf_counter()
+    connection.request('GET', path)
+    response = connection.getresponse()
+    response.read()
+
+    return time.perf_counter() - start, response.status < 400
+
+def worker(port, index, args, users, stop, measured):
+    #polls of the status endpoints and scrapes, each worker at its share of --rate, as fast as it can without one
+    rand = random.Random(args.seed + index)
+    mix = [part.split('=') for part in args.mix.split(',')]
+    endpoints = [name for name, weight in mix]
+    weights = [float(weight) for name, weight in mix]
+    interval = args.concurrency / args.rate if args.rate > 0 else 0
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    due = time.perf_counter()
+
+    while not stop.is_set():
+        endpoint = rand.choices(endpoints, weights)[0]
+
+        if endpoint == 'deposit':
+            path = '/api/deposit/' + rand.choice(users)
+        elif endpoint == 'checktxs':
+            path = '/api/checktxs/' + rand.choice(users)
+        else:
+            path = '/api/' + endpoint
+
+        try:
+            seconds, ok = get(connection, path)
+        except (OSError, http.client.HTTPException):
+            seconds, ok = None, False
+            connection.close()
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+
+        measured.add(endpoint, seconds, ok)
+
+        if interval > 0:
+            due += interval
+            time.sleep(max(due - time.perf_counter(), 0))
+
+    connection.close()
+
+def bursts(port, args, fresh, stop, measured):
+    #--burst-size users at once open a tunnel every --burst-interval seconds, new addresses first, then ones that have a tunnel
+    if len(fresh) == 0:
+        return
+
+    addresses = itertools.cycle(fresh)
+
+    def openTunnel(address):
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+        try:
+            seconds, ok = get(connection, '/tunnel/' + address)
+        except (OSError, http.client.HTTPException):
+            seconds, ok = None, False
+        finally:
+            connection.close()
+
+        measured.add('tunnel', seconds, ok)
+
+    while not stop.wait(args.burst_interval):
+        threads = [threading.Thread(target=openTunnel, args=(next(addresses),)) for index in range(args.burst_size)]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+def summary(values, requests, errors, seconds):
+    from spans import percentile
+
+    values = sorted(values)
+
+    if requests == 0:
+        return {'requests': 0, 'rps': 0, 'errors': 0}
+
+    result = {'requests': requests, 'rps': requests / seconds, 'errors': errors / requests}
+
+    if len(values) == 0:
+        return result
+
+    result.update({'p50': percentile(values, 0.5), 'p95': percentile(values, 0.95), 'p99': percentile(values, 0.99)})
+
+    return result
+
+def loadSLOs(args):
+    #{endpoint or all: {metric: limit}} from --slo-file, --slo endpoint.metric=limit on top
+    slos = {}
+
+    if args.slo_file:
+        with open(args.slo_file) as json_file:
+            slos = json.load(json_file)
+
+    for slo in args.slo:
+        name, limit = slo.split('=')
+        endpoint, metric = name.split('.')
+        slos.setdefault(endpoint, {})[metric] = float(limit)
+
+    for endpoint, limits in slos.items():
+        for metric in limits:
+            if metric not in LIMITS or (endpoint not in ENDPOINTS and endpoint != 'all'):
+                raise SystemExit('unknown SLO %s.%s' % (endpoint, metric))
+
+    return slos
+
+def checkSLOs(slos, stats):
+    #the missed SLOs as lines of text
+    missed = []
+
+    for endpoint, limits in sorted(slos.items()):
+        for metric, limit in sorted(limits.items()):
+            value = stats[endpoint].get(metric)
+
+            if value is None:
+                missed.append('%s.%s: no responses' % (endpoint, metric))
+            elif (LIMITS[metric] == 'max' and value > limit) or (LIMITS[metric] == 'min' and value < limit):
+                missed.append('%s.%s: %.4g, limit %.4g' % (endpoint, metric, value, limit))
+
+    return missed
+
+def main():
+    parser = argparse.ArgumentParser(description='requests per second and latency per endpoint of the API, checked against SLOs')
+    parser.add_argument('--users', type=int, default=10000, help='users with a tunnel in the seeded database')
+    parser.add_argument('--txs-per-user', type=int, default=5, help='deposits and withdraws per user in the seeded database')
+    parser.add_argument('--error-ratio', type=float, default=0.01, help='share of the users with an error')
+    parser.add_argument('--tunnels', type=int, default=1000, help='addresses without a tunnel for the /tunnel bursts')
+    parser.add_argument('--backend', default='sqlite', choices=['sqlite', 'postgres'], help='storage backend, the API runs in its own process')
+    parser.add_argument('--workers', type=int, default=1, help='uvicorn worker processes')
+    parser.add_argument('--duration', type=int, default=30, help='seconds of load that are measured')
+    parser.add_argument('--warmup', type=int, default=5, help='seconds of load before the measurement')
+    parser.add_argument('--concurrency', type=int, default=20, help='clients polling at the same time')
+    parser.add_argument('--rate', type=float, default=0, help='requests per second of all clients together, 0 for as many as the API serves')
+    parser.add_argument('--mix', default='deposit=50,checktxs=30,fullinfo=15,health=5', help='shares of the polled endpoints')
+    parser.add_argument('--burst-size', type=int, default=50, help='/tunnel requests per burst')
+    parser.add_argument('--burst-interval', type=int, default=5, help='seconds in between /tunnel bursts')
+    parser.add_argument('--slo', action='append', default=[], help='endpoint.metric=limit, e.g. deposit.p99=250, all.errors=0.001 or fullinfo.rps=100')
+    parser.add_argument('--slo-file', help='JSON file of the form {"deposit": {"p99": 250}, "all": {"errors": 0.001}}')
+    parser.add_argument('--blocks', type=int, default=10, help='blocks of the stand-in nodes')
+    parser.add_argument('--min', type=float, default=1, help='minimum amount of the gateway')
+    parser.add_argument('--max', type=float, default=100, help='maximum amount of the gateway')
+    parser.add_argument('--fee', type=float, default=0.1, help='fee on both chains')
+    parser.add_argument('--seed', type=int, default=1, help='seed of the database and the requests')
+    parser.add_argument('--timeout', type=int, default=120, help='seconds to wait for the API to be ready')
+    parser.add_argument('--slow-query-ms', type=float, default=100, help='slow-query-ms of the API')
+    parser.add_argument('--pg-host', default=os.getenv('PGHOST', 'localhost'))
+    parser.add_argument('--pg-port', type=int, default=int(os.getenv('PGPORT', '5432')))
+    parser.add_argument('--pg-user', default=os.getenv('PGUSER', 'postgres'))
+    parser.add_argument('--pg-password', default=os.getenv('PGPASSWORD', ''))
+    parser.add_argument('--pg-database', default='gatewayloadtest', help='database the postgres runs drop and recreate')
+    args = parser.parse_args()
+    slos = loadSLOs(args)
+
+    tn = tnNode(args.blocks, 0, 0, GATEWAY, ASSET, args.min, args.max, seed=args.seed).start()
+    btc = bitcoinNode(args.blocks, 0, 0, args.min, args.max, seed=args.seed + 1).start()
+    server = None
+
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            config = apiConfig(args, tn, btc, workdir)
+            with open(os.path.join(workdir, 'config.json'), 'w') as json_file:
+                json.dump(config, json_file)
+
+            for name in ('templates', 'static'):
+                os.symlink(os.path.join(ROOT, name), os.path.join(workdir, name))
+
+            start = time.perf_counter()
+            os.chdir(workdir)
+            users, fresh = seed(args, config)
+            print('seeded %d users with %d transactions each in %.1fs' % (len(users), args.txs_per_user, time.perf_counter() - start))
+
+            port = freePort()
+            server = subprocess.Popen([sys.executable, '-m', 'uvicorn', 'gateway:app', '--port', str(port), '--workers', str(args.workers), '--log-level', 'warning'],
+                                      cwd=workdir, env=dict(os.environ, PYTHONPATH=ROOT))
+
+            start = time.perf_counter()
+            while not isReady(port):
+                if server.poll() is not None or time.perf_counter() - start > args.timeout:
+                    raise SystemExit('the API did not get ready')
+
+                time.sleep(0.1)
+
+            measured = results()
+            stop = threading.Event()
+            threads = [threading.Thread(target=worker, args=(port, index, args, users, stop, measured), daemon=True) for index in range(args.concurrency)]
+            threads.append(threading.Thread(target=bursts, args=(port, args, fresh, stop, measured), daemon=True))
+
+            for thread in threads:
+                thread.start()
+
+            time.sleep(args.warmup)
+            measured.recording = True
+            time.sleep(args.duration)
+            measured.recording = False
+            stop.set()
+
+            for thread in threads:
+                thread.join()
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+        tn.stop()
+        btc.stop()
+
+    stats = dict((endpoint, summary(measured.latencies[endpoint], measured.requests[endpoint], measured.errors[endpoint], args.duration)) for endpoint in ENDPOINTS)
+    stats['all'] = summary(sum(measured.latencies.values(), []), sum(measured.requests.values()), sum(measured.errors.values()), args.duration)
+
+    print('%-10s %9s %9s %8s %9s %9s %9s' % ('endpoint', 'requests', 'req/s', 'errors', 'p50 ms', 'p95 ms', 'p99 ms'))
+    for endpoint in ENDPOINTS + ('all',):
+        stat = stats[endpoint]
+        if 'p50' not in stat:
+            print('%-10s %9d %9.1f %7.2f%%' % (endpoint, stat['requests'], stat['rps'], stat['errors'] * 100))
+        else:
+            print('%-10s %9d %9.1f %7.2f%% %9.1f %9.1f %9.1f' % (endpoint, stat['requests'], stat['rps'], stat['errors'] * 100, stat['p50'], stat['p95'], stat['p99']))
+
+    missed = checkSLOs(slos, stats)
+    for line in missed:
+        print('SLO missed: ' + line)
+
+    if len(missed) > 0:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+
+from throughput import callsPerBlock, dropDatabase
+
+#scans a recorded block range of the real chains again, offline and always on the same input. record fetches the
+#blocks and transactions with rpc-mode record, with the config.json of the gateway and its nodes:
+#    python3 benchmarks/replay.py record --fixtures fixtures/day --dcc 1200000 1201440 --other 800000 800144
+#run scans them with the checkers and the controller on an empty database, with rpc-mode replay:
+#    python3 benchmarks/replay.py run --fixtures fixtures/day --backend sqlite --latency 1
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TIPCALLS = {'DCC': ('/blocks/height',), 'Other': ('getbestblockhash', 'getblock')}
+
+def loadConfig(path):
+    with open(path) as json_file:
+        return json.load(json_file)
+
+def record(args):
+    args.fixtures = os.path.abspath(args.fixtures)
+    config = loadConfig(args.config)
+    config['main']['rpc-mode'] = 'record'
+    config['main']['rpc-fixtures'] = args.fixtures
+    os.chdir(ROOT)
+    sys.path.insert(0, ROOT)
+
+    import bitcoinrpc.authproxy as authproxy
+    import logs
+    import rpcReplay
+    from dbInterface import getDB
+    from otherClass import otherCalls
+    from tnClass import tnCalls
+
+    logs.configure(config)
+    db = getDB(config)
+    heights = {}
+
+    if args.dcc:
+        start, end = args.dcc
+        tnc = tnCalls(config, db)
+
+        for height in range(start, end + 1):
+            tnc.getBlock(height)
+
+            if (height - start) % 100 == 0:
+                print('DCC block %d of %d-%d' % (height, start, end), flush=True)
+
+        #the replay ends with the range, the node reports its end as the current height
+        rpcReplay.get(config, 'DCC').add('/blocks/height', [], result={'height': end + config['dcc']['confirmations'] + 1})
+        heights['DCC'] = [start, end]
+
+    if args.other:
+        start, end = args.other
+        otc = otherCalls(config, db)
+        node = authproxy.AuthServiceProxy(config['other']['node'])
+        session = rpcReplay.get(config, 'Other')
+
+        for height in range(start, end + 1):
+            block = otc.getBlock(height)
+
+            #the transactions checkTx asks for, in batches, recorded one by one
+            for index in range(0, len(block['tx']), args.batch):
+                txIds = block['tx'][index:index + args.batch]
+                begin = time.perf_counter()
+                results = node.batch_([['getrawtransaction', txId, True] for txId in txIds])
+                seconds = (time.perf_counter() - begin) / len(txIds)
+
+                for txId, result in zip(txIds, results):
+                    session.add('getrawtransaction', [txId, True], result=result, seconds=seconds)
+
+            print('Other block %d of %d-%d, %d transactions' % (height, start, end, len(block['tx'])), flush=True)
+
+        tip = otc.myProxy.getblockhash(end + config['other']['confirmations'])
+        session.add('getbestblockhash', [], result=tip)
+        otc.myProxy.getblock(tip)
+        heights['Other'] = [start, end]
+
+    #the deposit addresses of the gateway, so the deposits of the range find their tunnels again
+    tunnels = {}
+    for row in db.getExecutedAll():
+        if row[8] == 'Deposit':
+            tunnels[row[2]] = row[1]
+
+    for row in db.getTunnels(status='created'):
+        tunnels[row[1]] = row[0]
+
+    with open(os.path.join(args.fixtures, 'replay.json'), 'w') as json_file:
+        json.dump({'heights': heights, 'tunnels': [[source, target] for target, source in tunnels.items()]}, json_file)
+
+    print('recorded to %s, %d tunnels' % (args.fixtures, len(tunnels)))
+
+def run(args):
+    fixtures = os.path.abspath(args.fixtures)
+    spec = loadConfig(os.path.join(fixtures, 'replay.json'))
+    config = loadConfig(args.config)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        config['main'].update({'rpc-mode': 'replay', 'rpc-fixtures': fixtures, 'rpc-replay-latency': args.latency, 'rpc-replay-latency-ms': args.latency_ms,
+                               'db-backend': args.backend, 'db-location': '', 'log-file': os.path.join(workdir, 'gateway.log'),
+                               'stage-log': os.path.join(workdir, 'checkblock.log'), 'slow-query-log': os.path.join(workdir, 'slowqueries.log')})
+        config['dcc'].update({'timeInBetweenChecks': 0, 'verify-delay': 0})
+        config['other'].update({'timeInBetweenChecks': 0, 'pool-watermark': 0})
+        sys.path.insert(0, ROOT)
+
+        import logs
+        import metrics
+        import rpcReplay
+        from controlClass import controller
+        from dbInterface import getDB
+        from otherChecker import OtherChecker
+        from tnChecker import TNChecker
+
+        logs.configure(config)
+
+        if args.backend in ('postgres', 'dual'):
+            config['main']['name'] = args.pg_database
+            dropDatabase(config)
+
+        db = getDB(config)
+        db.createdb()
+        db.createVerify()
+        db.updateExisting()
+
+        for chain in ('DCC', 'Other'):
+            db.insHeights(spec['heights'][chain][0] - 1 if chain in spec['heights'] else 0, chain)
+
+        if len(spec['tunnels']) > 0:
+            db.createOrGetTunnels([target for source, target in spec['tunnels']], [source for source, target in spec['tunnels']])
+
+        threads = [(controller(config, db).run, 'controller')]
+        if 'DCC' in spec['heights']:
+            threads.append((TNChecker(config, db).run, 'tnChecker'))
+        if 'Other' in spec['heights']:
+            threads.append((OtherChecker(config, db).run, 'otherChecker'))
+
+        start = time.perf_counter()
+        for target, name in threads:
+            threading.Thread(target=target, name=name, daemon=True).start()
+
+        done = {}
+        while len(done) < len(spec['heights']) and time.perf_counter() - start < args.timeout:
+            for chain, (first, last) in spec['heights'].items():
+                if chain not in done and db.lastScannedBlock(chain) >= last:
+                    done[chain] = time.perf_counter() - start
+
+            time.sleep(0.01)
+
+        print('replay of %s on %s' % (', '.join('%s %d-%d' % (chain, first, last) for chain, (first, last) in spec['heights'].items()), args.backend))
+
+        #payouts are counted by the chain they are paid out on, the other one than the chain they were found on
+        for chain, payoutChain in (('DCC', 'Other'), ('Other', 'DCC')):
+            if chain not in spec['heights']:
+                continue
+
+            first, last = spec['heights'][chain]
+            blocks = last - first + 1
+            payouts = metrics.get('gateway_payouts_total', chain=payoutChain, result='sent')
+            perBlock, calls = callsPerBlock(TIPCALLS[chain], rpcReplay.get(config, chain).calls, blocks)
+
+            if chain not in done:
+                print('%-6s did not reach block %d within %ds, %d payouts' % (chain, last, args.timeout, payouts))
+                continue
+
+            print('%-6s %8.1f blocks/s  %8.1f payouts/s (%d)  %6.1f node calls/block' % (chain, blocks / done[chain], payouts / done[chain], payouts, perBlock))
+
+            if args.methods:
+                for method, count in sorted(calls.items(), key=lambda item: -item[1]):
+                    print('%-6s %-40s %8.2f/block' % ('', method, count / blocks))
+
+        madeUp = sum(rpcReplay.get(config, chain).madeUp for chain in ('DCC', 'Other'))
+        print('peak memory %.1f MB with the fixtures, %d payouts not recorded and made up, %d errors' % (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+              madeUp, len(db.getErrors())))
+
+        logs.stop()
+        os._exit(0)
+
+def main():
+    parser = argparse.ArgumentParser(description='records real node answers for a block range and scans them again offline')
+    parser.add_argument('command', choices=['record', 'run'])
+    parser.add_argument('--fixtures', default='fixtures', help='directory of the recorded node answers')
+    parser.add_argument('--config', default=os.path.join(ROOT, 'config.json'), help='config.json of the gateway')
+    parser.add_argument('--dcc', type=int, nargs=2, metavar=('FIRST', 'LAST'), help='record: TN blocks to record')
+    parser.add_argument('--other', type=int, nargs=2, metavar=('FIRST', 'LAST'), help='record: bitcoin blocks to record')
+    parser.add_argument('--batch', type=int, default=500, help='record: transactions per node request')
+    parser.add_argument('--backend', default='sqlite', help='run: storage backend, sqlite, postgres, dual or memory')
+    parser.add_argument('--latency', type=float, default=0, help='run: factor on the recorded response times, 1 as fast as the nodes were')
+    parser.add_argument('--latency-ms', type=float, default=0, help='run: milliseconds added to every node answer')
+    parser.add_argument('--timeout', type=int, default=3600, help='run: seconds before the replay is given up')
+    parser.add_argument('--methods', action='store_true', help='run: also print node calls per block by method')
+    parser.add_argument('--pg-database', default='gatewayreplay', help='run: database the postgres runs drop and recreate')
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        record(args)
+    else:
+        run(args)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+#import and startup times of the API, run from anywhere with the config.json of the gateway in place:
+#    python3 benchmarks/startup.py --runs 5
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def importTime():
+    #seconds for a fresh interpreter to import gateway.py, the interpreter start itself is subtracted
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', 'pass'], cwd=ROOT, check=True)
+    base = time.perf_counter() - start
+
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', 'import gateway'], cwd=ROOT, check=True)
+
+    return time.perf_counter() - start - base
+
+def freePort():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def isListening(port):
+    try:
+        with socket.create_connection(('127.0.0.1', port), timeout=0.1):
+            return True
+    except OSError:
+        return False
+
+def isReady(port):
+    try:
+        with urllib.request.urlopen('http://127.0.0.1:%d/api/ready' % port, timeout=1) as response:
+            return response.status == 200
+    except (urllib.error.URLError, OSError):
+        return False
+
+def startupTime(timeout):
+    #(seconds until the port accepts connections, seconds until /api/ready answers 200 or None)
+    port = freePort()
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, '-m', 'uvicorn', 'gateway:app', '--port', str(port), '--log-level', 'warning'], cwd=ROOT)
+    listening = None
+    ready = None
+
+    try:
+        while time.perf_counter() - start < timeout:
+            if listening is None and isListening(port):
+                listening = time.perf_counter() - start
+
+            if listening is not None and isReady(port):
+                ready = time.perf_counter() - start
+                break
+
+            if server.poll() is not None:
+                break
+
+            time.sleep(0.01)
+    finally:
+        server.terminate()
+        server.wait()
+
+    return listening, ready
+
+def summary(name, values):
+    values = [value for value in values if value is not None]
+
+    if len(values) == 0:
+        print('%-10s no result' % name)
+    else:
+        print('%-10s median %.3fs  min %.3fs  max %.3fs' % (name, statistics.median(values), min(values), max(values)))
+
+def main():
+    parser = argparse.ArgumentParser(description='import and startup benchmark of the gateway API')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--timeout', type=float, default=60)
+    args = parser.parse_args()
+
+    imports = [importTime() for run in range(args.runs)]
+    startups = [startupTime(args.timeout) for run in range(args.runs)]
+
+    summary('import', imports)
+    summary('listening', [listening for listening, ready in startups])
+    summary('ready', [ready for listening, ready in startups])
+
+if __name__ == '__main__':
+    main()
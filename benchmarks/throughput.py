@@ -0,0 +1,199 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from fakeNodes import b58encode, bitcoinNode, tnNode
+
+#blocks and payouts per second of the scanners, run end to end against stand-ins of the TN node and bitcoind:
+#    python3 benchmarks/throughput.py --blocks 100 --txs 50 --backends sqlite,postgres
+#the nodes run in this process, the gateway in a child process per backend, so its peak memory is its own
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GATEWAY = '3JbenchmarkGatewayAddress'
+ASSET = b58encode(b'benchmark gateway asset id 0000')
+
+def makeConfig(args, backend, tn, btc, workdir):
+    return {
+        'main': {'name': args.pg_database, 'db-location': '', 'db-backend': backend, 'use-pg': backend == 'postgres', 'min': args.min, 'max': args.max,
+                 'log-level': 'INFO', 'log-file': os.path.join(workdir, 'gateway.log'), 'stage-log': os.path.join(workdir, 'checkblock.log'),
+                 'slow-query-ms': args.slow_query_ms, 'slow-query-log': os.path.join(workdir, 'slowqueries.log')},
+        'postgres': {'pguser': args.pg_user, 'pgpswd': args.pg_password, 'pghost': args.pg_host, 'pgport': args.pg_port},
+        'dcc': {'node': tn.url(), 'network': 'mainnet', 'chainid': 'L', 'seedenvname': 'BENCHMARK_GATEWAY_SEED', 'gatewaySeed': 'benchmark gateway seed',
+                'gatewayAddress': GATEWAY, 'assetId': ASSET, 'decimals': 8, 'fee': args.fee, 'confirmations': 0, 'timeInBetweenChecks': 0, 'verify-delay': 0},
+        'other': {'node': btc.url(), 'passenvname': 'BENCHMARK_WALLET_PASSPHRASE', 'passphrase': '', 'decimals': 8, 'fee': args.fee, 'confirmations': 0,
+                  'timeInBetweenChecks': 0, 'address-network': 'regtest', 'validate-rpc': False, 'pool-watermark': 0}
+    }
+
+def dropDatabase(config):
+    #every run starts from an empty database
+    import psycopg2
+    from psycopg2 import sql
+
+    dbCon = psycopg2.connect(user=config['postgres']['pguser'], password=config['postgres']['pgpswd'], host=config['postgres']['pghost'], port=config['postgres']['pgport'], dbname='postgres')
+    dbCon.autocommit = True
+    cursor = dbCon.cursor()
+    cursor.execute(sql.SQL('DROP DATABASE IF EXISTS {};').format(sql.Identifier(config['main']['name'])))
+    cursor.close()
+    dbCon.close()
+
+def runGateway(specFile):
+    #child process: scans both chains from block 1 with the checkers and the controller, prints one JSON line
+    with open(specFile) as json_file:
+        spec = json.load(json_file)
+
+    config = spec['config']
+    os.chdir(os.path.dirname(os.path.abspath(specFile)))
+    sys.path.insert(0, ROOT)
+
+    import logs
+    import metrics
+    from controlClass import controller
+    from dbInterface import backendName, getDB
+    from otherChecker import OtherChecker
+    from tnChecker import TNChecker
+
+    logs.configure(config)
+
+    if backendName(config) == 'postgres':
+        dropDatabase(config)
+
+    db = getDB(config)
+    db.createdb()
+    db.createVerify()
+    db.updateExisting()
+    db.insHeights(0, 'DCC')
+    db.insHeights(0, 'Other')
+
+    #a tunnel for every deposit address the node pays to, with a TN address of its own as target
+    tn = TNChecker(config, db)
+    targets = [tn.tnc.pwTN.Address(seed='benchmark deposit %d' % index).address for index in range(len(spec['depositAddresses']))]
+    db.createOrGetTunnels(targets, spec['depositAddresses'])
+
+    other = OtherChecker(config, db)
+    ctrl = controller(config, db)
+
+    start = time.perf_counter()
+    for target, name in ((other.run, 'otherChecker'), (tn.run, 'tnChecker'), (ctrl.run, 'controller')):
+        threading.Thread(target=target, name=name, daemon=True).start()
+
+    done = {}
+    while len(done) < 2 and time.perf_counter() - start < spec['timeout']:
+        for chain in ('DCC', 'Other'):
+            if chain not in done and db.lastScannedBlock(chain) >= spec['blocks']:
+                done[chain] = time.perf_counter() - start
+
+        time.sleep(0.01)
+
+    #payouts are counted by the chain they are paid out on, the other one than the chain they were found on
+    result = {'seconds': dict((chain, round(seconds, 3)) for chain, seconds in done.items()),
+              'payouts': {'DCC': metrics.get('gateway_payouts_total', chain='Other', result='sent'),
+                          'Other': metrics.get('gateway_payouts_total', chain='DCC', result='sent')},
+              'failed': metrics.get('gateway_payouts_total', chain='Other', result='failed') + metrics.get('gateway_payouts_total', chain='DCC', result='failed'),
+              'errors': len(db.getErrors()),
+              'peakMB': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)}
+
+    print(json.dumps(result), flush=True)
+    logs.stop()
+    os._exit(0)
+
+def runBackend(args, backend):
+    #(result of the child, calls per node) for one backend, with fresh nodes serving the same chains
+    tn = tnNode(args.blocks, args.txs, args.withdraw_ratio, GATEWAY, ASSET, args.min, args.max, seed=args.seed).start()
+    btc = bitcoinNode(args.blocks, args.txs, args.deposit_ratio, args.min + args.fee, args.max, seed=args.seed + 1).start()
+
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            specFile = os.path.join(workdir, 'spec.json')
+            with open(specFile, 'w') as json_file:
+                json.dump({'config': makeConfig(args, backend, tn, btc, workdir), 'depositAddresses': btc.depositAddresses,
+                           'blocks': args.blocks, 'timeout': args.timeout}, json_file)
+
+            child = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', specFile], cwd=workdir, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                   text=True, timeout=args.timeout + 600)
+            lines = child.stdout.strip().splitlines()
+
+            if child.returncode != 0 or len(lines) == 0:
+                errors = child.stderr.strip().splitlines()
+                return {'error': errors[-1] if len(errors) > 0 else 'exit code %d' % child.returncode}, {}
+
+            result = json.loads(lines[-1])
+            result['expected'] = {'DCC': tn.withdraws, 'Other': len(btc.depositAddresses)}
+
+            return result, {'DCC': (tn, tn.counter.snapshot()), 'Other': (btc, btc.counter.snapshot())}
+    finally:
+        tn.stop()
+        btc.stop()
+
+def callsPerBlock(tipCalls, calls, blocks):
+    #the height polls of a scanner that caught up are left out, it makes one per block it scans
+    calls = dict(calls)
+    idle = max(calls.get(tipCalls[0], 0) - blocks, 0)
+
+    for method in tipCalls:
+        calls[method] = max(calls.get(method, 0) - idle, 0)
+
+    return sum(calls.values()) / blocks, calls
+
+def report(args, backend, result, nodes):
+    if 'error' in result:
+        print('%-10s failed: %s' % (backend, result['error']))
+        return
+
+    for chain in ('DCC', 'Other'):
+        seconds = result['seconds'].get(chain)
+        node, calls = nodes[chain]
+        perBlock, calls = callsPerBlock(node.tipCalls, calls, args.blocks)
+        payouts = result['payouts'][chain]
+
+        if seconds is None:
+            print('%-10s %-6s did not reach block %d within %ds, %d of %d payouts' % (backend, chain, args.blocks, args.timeout, payouts, result['expected'][chain]))
+            continue
+
+        print('%-10s %-6s %8.1f blocks/s  %8.1f payouts/s (%d of %d)  %6.1f node calls/block' % (backend, chain, args.blocks / seconds, payouts / seconds,
+              payouts, result['expected'][chain], perBlock))
+
+        if args.methods:
+            for method, count in sorted(calls.items(), key=lambda item: -item[1]):
+                print('%-17s %-40s %8.2f/block' % ('', method, count / args.blocks))
+
+    print('%-10s peak memory %.1f MB, %d failed payouts, %d errors' % (backend, result['peakMB'], result['failed'], result['errors']))
+
+def main():
+    parser = argparse.ArgumentParser(description='blocks and payouts per second of the scanners against stand-in nodes')
+    parser.add_argument('--blocks', type=int, default=100, help='blocks per chain')
+    parser.add_argument('--txs', type=int, default=50, help='transactions per block')
+    parser.add_argument('--withdraw-ratio', type=float, default=0.1, help='share of the TN transactions that are withdraws to the gateway')
+    parser.add_argument('--deposit-ratio', type=float, default=0.1, help='share of the bitcoin transactions that pay a deposit address')
+    parser.add_argument('--min', type=float, default=1, help='minimum amount of the gateway')
+    parser.add_argument('--max', type=float, default=100, help='maximum amount of the gateway')
+    parser.add_argument('--fee', type=float, default=0.1, help='fee on both chains')
+    parser.add_argument('--seed', type=int, default=1, help='seed of the generated chains')
+    parser.add_argument('--backends', default='sqlite,postgres', help='comma separated storage backends: sqlite, postgres, dual or memory')
+    parser.add_argument('--timeout', type=int, default=600, help='seconds per backend before a run is given up')
+    parser.add_argument('--methods', action='store_true', help='also print node calls per block by method')
+    parser.add_argument('--slow-query-ms', type=float, default=100, help='slow-query-ms of the gateway')
+    parser.add_argument('--pg-host', default=os.getenv('PGHOST', 'localhost'))
+    parser.add_argument('--pg-port', type=int, default=int(os.getenv('PGPORT', '5432')))
+    parser.add_argument('--pg-user', default=os.getenv('PGUSER', 'postgres'))
+    parser.add_argument('--pg-password', default=os.getenv('PGPASSWORD', ''))
+    parser.add_argument('--pg-database', default='gatewaybenchmark', help='database the postgres runs drop and recreate')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        runGateway(args.child)
+        return
+
+    print('%d blocks of %d transactions per chain, %.0f%% withdraws, %.0f%% deposits' % (args.blocks, args.txs, args.withdraw_ratio * 100, args.deposit_ratio * 100))
+
+    for backend in args.backends.split(','):
+        result, nodes = runBackend(args, backend.strip())
+        report(args, backend.strip(), result, nodes)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+import functools
+import hashlib
+
+#version bytes of base58check addresses and the human readable part of segwit addresses per network
+NETWORKS = {
+    'mainnet': {'p2pkh': 0x00, 'p2sh': 0x05, 'hrp': 'bc'},
+    'testnet': {'p2pkh': 0x6f, 'p2sh': 0xc4, 'hrp': 'tb'},
+    'signet': {'p2pkh': 0x6f, 'p2sh': 0xc4, 'hrp': 'tb'},
+    'regtest': {'p2pkh': 0x6f, 'p2sh': 0xc4, 'hrp': 'bcrt'}
+}
+
+B58ALPHABET = '123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz'
+B58INDEX = dict((char, index) for index, char in enumerate(B58ALPHABET))
+
+BECH32ALPHABET = 'qpzry9x8gf2tvdw0s3jn54khce6mua7l'
+BECH32INDEX = dict((char, index) for index, char in enumerate(BECH32ALPHABET))
+BECH32CONST = 1
+BECH32MCONST = 0x2bc830a3
+
+def b58decode(address):
+    number = 0
+    for char in address:
+        if char not in B58INDEX:
+            return None
+        number = number * 58 + B58INDEX[char]
+
+    data = number.to_bytes((number.bit_length() + 7) // 8, 'big')
+    pad = len(address) - len(address.lstrip('1'))
+
+    return b'\x00' * pad + data
+
+def isValidBase58(address, network):
+    if not 25 < len(address) < 36:
+        return False
+
+    data = b58decode(address)
+    if data is None or len(data) != 25:
+        return False
+
+    payload, checksum = data[:-4], data[-4:]
+    if hashlib.sha256(hashlib.sha256(payload).digest()).digest()[:4] != checksum:
+        return False
+
+    return payload[0] in (NETWORKS[network]['p2pkh'], NETWORKS[network]['p2sh'])
+
+def bech32Polymod(values):
+    generator = [0x3b6a57b2, 0x26508e6d, 0x1ea119fa, 0x3d4233dd, 0x2a1462b3]
+    chk = 1
+
+    for value in values:
+        top = chk >> 25
+        chk = (chk & 0x1ffffff) << 5 ^ value
+        for i in range(5):
+            chk ^= generator[i] if ((top >> i) & 1) else 0
+
+    return chk
+
+def bech32HrpExpand(hrp):
+    return [ord(char) >> 5 for char in hrp] + [0] + [ord(char) & 31 for char in hrp]
+
+def convertBits(data, frombits, tobits):
+    #regroups 5 bit words into bytes, None if the padding is not valid
+    acc = 0
+    bits = 0
+    result = []
+    maxv = (1 << tobits) - 1
+
+    for value in data:
+        acc = (acc << frombits) | value
+        bits += frombits
+        while bits >= tobits:
+            bits -= tobits
+            result.append((acc >> bits) & maxv)
+
+    if bits >= frombits or ((acc << (tobits - bits)) & maxv):
+        return None
+
+    return result
+
+def isValidSegwit(address, network):
+    #BIP173 for witness version 0, BIP350 (bech32m) for version 1 and up
+    if len(address) > 90 or (address.lower() != address and address.upper() != address):
+        return False
+
+    address = address.lower()
+    pos = address.rfind('1')
+    if pos < 1 or pos + 7 > len(address):
+        return False
+
+    hrp = address[:pos]
+    if hrp != NETWORKS[network]['hrp']:
+        return False
+
+    data = []
+    for char in address[pos + 1:]:
+        if char not in BECH32INDEX:
+            return False
+        data.append(BECH32INDEX[char])
+
+    const = bech32Polymod(bech32HrpExpand(hrp) + data)
+    if const not in (BECH32CONST, BECH32MCONST):
+        return False
+
+    witver = data[0]
+    program = convertBits(data[1:-6], 5, 8)
+    if witver > 16 or program is None or not 2 <= len(program) <= 40:
+        return False
+
+    if witver == 0:
+        return const == BECH32CONST and len(program) in (20, 32)
+    else:
+        return const == BECH32MCONST
+
+@functools.lru_cache(maxsize=4096)
+def isValidAddress(address, network = 'mainnet'):
+    #offline check of legacy, p2sh and segwit addresses for the given network
+    if not isinstance(address, str) or address == '':
+        return False
+
+    if address.lower().startswith(NETWORKS[network]['hrp'] + '1'):
+        return isValidSegwit(address, network)
+    else:
+        return isValidBase58(address, network)
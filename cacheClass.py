@@ -0,0 +1,135 @@
+import asyncio
+import hashlib
+import threading
+import time
+
+import logs
+
+log = logs.get(__name__)
+
+class ttlCache(object):
+    #small in-process cache, entries expire after ttl seconds or as soon as a writer invalidates them
+    def __init__(self, ttl, maxsize = 10000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.entries = {}
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+
+            if entry is None:
+                return None
+            elif entry[0] < time.monotonic():
+                del self.entries[key]
+                return None
+            else:
+                return entry[1]
+
+    def set(self, key, value):
+        if self.ttl <= 0:
+            return
+
+        with self.lock:
+            if len(self.entries) >= self.maxsize:
+                self.purge()
+
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+
+    def invalidate(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries = {}
+
+    def purge(self):
+        #drop the expired entries, and the oldest half if that is not enough
+        now = time.monotonic()
+        self.entries = dict((key, entry) for key, entry in self.entries.items() if entry[0] >= now)
+
+        if len(self.entries) >= self.maxsize:
+            keys = list(self.entries)
+            for key in keys[:len(keys) // 2]:
+                del self.entries[key]
+
+class lazy(object):
+    #builds an object on its first use and shares it from then on, attribute access is forwarded so the holder
+    #can stand in for the object itself
+    def __init__(self, factory):
+        self.factory = factory
+        self.instance = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        if self.instance is None:
+            with self.lock:
+                if self.instance is None:
+                    self.instance = self.factory()
+
+        return self.instance
+
+    def built(self):
+        return self.instance is not None
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+class singleFlight(object):
+    #coalesces identical concurrent calls: the first caller runs func in a worker thread, everybody else
+    #asking for the same key meanwhile awaits that same result
+    def __init__(self):
+        self.inflight = {}
+
+    async def run(self, key, func, *args):
+        future = self.inflight.get(key)
+
+        if future is None:
+            future = asyncio.get_event_loop().run_in_executor(None, func, *args)
+            self.inflight[key] = future
+            future.add_done_callback(lambda done: self.inflight.pop(key, None))
+
+        return await asyncio.shield(future)
+
+class responseCache(object):
+    #pre-serialized responses by key: fresh for ttl seconds, after that served stale for up to stale more
+    #seconds while a single background refresh builds the next version. entries are (created, body, etag, variants),
+    #variants holds compressed versions of body by encoding as they get asked for
+    def __init__(self, ttl, stale = 0):
+        self.ttl = ttl
+        self.stale = stale
+        self.entries = {}
+        self.flight = singleFlight()
+
+    async def get(self, key, build):
+        #build is a blocking function returning the body as bytes, it runs in a worker thread
+        entry = self.entries.get(key)
+
+        if entry is not None:
+            age = time.monotonic() - entry[0]
+
+            if age < self.ttl:
+                return entry
+            elif age < self.ttl + self.stale:
+                if key not in self.flight.inflight:
+                    asyncio.ensure_future(self.revalidate(key, build))
+
+                return entry
+
+        return await self.refresh(key, build)
+
+    async def refresh(self, key, build):
+        body = await self.flight.run(key, build)
+        entry = (time.monotonic(), body, '"' + hashlib.sha1(body).hexdigest() + '"', {})
+        self.entries[key] = entry
+
+        return entry
+
+    async def revalidate(self, key, build):
+        #a failed background refresh keeps the stale entry until it runs out
+        try:
+            await self.refresh(key, build)
+        except Exception as e:
+            log.warning('refreshing cached response %s failed: %s', key, e, exc_info=True, extra=logs.SAMPLED)
@@ -1,21 +1,21 @@
 import time
-import traceback
+import logs
+import metrics
 import sharedfunc
-from dbClass import dbCalls
-from dbPGClass import dbPGCalls
+from dbInterface import getDB
 from tnClass import tnCalls
 from otherClass import otherCalls
 from verification import verifier
 
+log = logs.get(__name__)
+metrics.describe('gateway_verification_queue', 'gauge', 'transactions waiting for the controller to verify them')
+
 class controller(object):
     def __init__(self, config, db = None):
         self.config = config
 
         if db == None:
-            if self.config['main']['use-pg']:
-                self.db = dbPGCalls(config)
-            else:
-                self.db = dbCalls(config)
+            self.db = getDB(config)
         else:
             self.db = db
 
@@ -26,45 +26,51 @@ class controller(object):
 
     def run(self):
         #main routine to run continuesly
-        print("INFO: starting controller")
+        log.info('starting controller')
 
         #handle unverified tx
         to_verify = self.db.getUnVerified()
+        metrics.setGauge('gateway_verification_queue', len(to_verify))
 
         if len(to_verify) > 0:
-            for txV in to_verify:
+            for index, txV in enumerate(to_verify):
 
                 if txV[1] != 'DCC':
-                    print("INFO: verify tx: " + txV[2])
+                    log.info('verify tx: %s', txV[2])
                     tx = txV[2]
                     self.otc.verifyTx(tx)
                 else:
-                    print("INFO: verify tx: " + txV[2])
+                    log.info('verify tx: %s', txV[2])
                     tx = {'id': txV[2]}
                     self.tnc.verifyTx(tx)
 
+                metrics.setGauge('gateway_verification_queue', len(to_verify) - index - 1)
+
         while True:
-            #print("INFO: Last scanned Other block: " + str(self.db.lastScannedBlock("Other")))
-            #print("INFO: Last scanned TN block: " + str(self.db.lastScannedBlock("DCC")))
+            #log.info('last scanned Other block: %s', self.db.lastScannedBlock("Other"))
+            #log.info('last scanned TN block: %s', self.db.lastScannedBlock("DCC"))
 
             #handle tunnels on status 'verifying'
             to_verify = self.db.getTunnels(status='verifying')
+            metrics.setGauge('gateway_verification_queue', len(to_verify))
 
             if len(to_verify) > 0:
-                for address in to_verify:
+                for index, address in enumerate(to_verify):
                     sourceAddress = address[0]
                     targetAddress = address[1]
 
                     if self.otc.validateaddress(sourceAddress):
                         txid = self.db.getExecuted(targetAddress=targetAddress)
-                        print("INFO: verify tx: " + txid[0][0])
+                        log.info('verify tx: %s', txid[0][0])
                         tx = {'id': txid[0][0]}
                         self.tnc.verifyTx(tx, sourceAddress, targetAddress)
                     else:
                         txid = self.db.getExecuted(sourceAddress=sourceAddress)
-                        print("INFO: verify tx: " + txid[0][0])
+                        log.info('verify tx: %s', txid[0][0])
                         tx = txid[0][0]
                         self.otc.verifyTx(tx, sourceAddress, targetAddress)
 
+                    metrics.setGauge('gateway_verification_queue', len(to_verify) - index - 1)
+
             #TODO: handle tunnels on status 'sending'
             time.sleep(600)
@@ -1,9 +1,59 @@
 import sqlite3 as sqlite
-from datetime import timedelta
-import datetime
 import os
+import threading
+import time
 
-class dbCalls(object):
+import logs
+import metrics
+import queryLog
+from dbInterface import dbInterface, chunked, configureQueryLog, dailyTotals, executedKeys, executedRows, tunnelKeys, txDirection, LATENCYSTAGES
+
+log = logs.get(__name__)
+
+class timedCursor(sqlite.Cursor):
+    #every statement is timed for the query log
+    def execute(self, statement, params = ()):
+        start = time.perf_counter()
+
+        try:
+            return super().execute(statement, params)
+        finally:
+            queryLog.record('sqlite', statement, time.perf_counter() - start, params, explain=self.connection.explain)
+
+    def executemany(self, statement, rows):
+        rows = list(rows)
+        start = time.perf_counter()
+
+        try:
+            return super().executemany(statement, rows)
+        finally:
+            queryLog.record('sqlite', statement, time.perf_counter() - start, rows, many=True, explain=self.connection.explain)
+
+class timedConnection(sqlite.Connection):
+    def cursor(self, factory = timedCursor):
+        return super().cursor(factory)
+
+    def execute(self, statement, params = ()):
+        return self.cursor().execute(statement, params)
+
+    def executemany(self, statement, rows):
+        return self.cursor().executemany(statement, rows)
+
+    def explain(self, statement, params):
+        #EXPLAIN QUERY PLAN as an indented tree, on a plain cursor so it is not timed itself
+        cursor = sqlite.Cursor(self)
+        rows = cursor.execute('EXPLAIN QUERY PLAN ' + statement, params or ()).fetchall()
+        cursor.close()
+
+        depths = {0: -1}
+        lines = []
+        for id, parent, notused, detail in rows:
+            depths[id] = depths.get(parent, -1) + 1
+            lines.append('  ' * depths[id] + detail)
+
+        return lines
+
+class dbCalls(dbInterface):
     def __init__(self, config):
         self.config = config
 
@@ -14,7 +64,37 @@ class dbCalls(object):
         else:
             dbfile = 'gateway.db'
 
-        self.dbCon = sqlite.connect(dbfile, check_same_thread=False)
+        configureQueryLog(config)
+        self.dbCon = sqlite.connect(dbfile, check_same_thread=False, factory=timedConnection)
+        #readers in the API processes do not block the scanner writes and the other way around
+        self.dbCon.execute('PRAGMA journal_mode=WAL')
+        #tunnels are created on a connection of their own, in transactions that no other thread shares
+        self.tunnelCon = sqlite.connect(dbfile, check_same_thread=False, factory=timedConnection, isolation_level=None)
+        self.tunnelLock = threading.Lock()
+        self.initStatus(config)
+
+    def close(self):
+        self.dbCon.close()
+        self.tunnelCon.close()
+
+    def tunnelTransaction(self, work):
+        #work(cursor) runs between BEGIN IMMEDIATE and COMMIT, holding the write lock of the database from the first
+        #select on, so no other writer can create the same tunnel or claim the same pool address in between
+        with self.tunnelLock:
+            cursor = self.tunnelCon.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+
+            try:
+                result = work(cursor)
+            except:
+                cursor.execute('ROLLBACK')
+                cursor.close()
+                raise
+
+            cursor.execute('COMMIT')
+            cursor.close()
+
+        return result
 
 #DB Setup part
     def createdb(self):
@@ -45,7 +125,10 @@ class dbCalls(object):
                 timestamp timestamp
                 default current_timestamp,
                 amount real,
-                amountFee real
+                amountFee real,
+                direction text,
+                tnVerBlock integer,
+                otherVerBlock integer
         );
         '''
         createTableErrors = '''
@@ -69,6 +152,145 @@ class dbCalls(object):
         cursor.execute(createTableErrors)
         self.dbCon.commit()
 
+        self.createVerify()
+        self.createDirection()
+        self.createRollups()
+        self.createStatus()
+        self.createPool()
+        self.createLatency()
+        self.createTunnelIndex()
+
+    def createDirection(self):
+        #direction and verification blocks are stored with the executed rows, so checkTXs needs no lookups in verified
+        cursor = self.dbCon.cursor()
+        columns = [item[1] for item in cursor.execute('PRAGMA table_info(executed)').fetchall()]
+
+        for column, columnType in (('direction', 'text'), ('tnVerBlock', 'integer'), ('otherVerBlock', 'integer')):
+            if column not in columns:
+                cursor.execute('ALTER TABLE executed ADD COLUMN ' + column + ' ' + columnType)
+
+        #backfill rows written before, or imported without, these columns
+        cursor.execute("UPDATE executed SET direction = CASE WHEN targetAddress LIKE '3J%' THEN 'Deposit' ELSE 'Withdraw' END, " \
+                       "tnVerBlock = (SELECT block FROM verified WHERE tx = executed.tnTxId), otherVerBlock = (SELECT block FROM verified WHERE tx = executed.otherTxId) " \
+                       "WHERE direction IS NULL")
+
+        #plain indexes, covering ones would carry most of the row and make every executed insert of the scanners slower
+        cursor.execute('DROP INDEX IF EXISTS executed_source')
+        cursor.execute('DROP INDEX IF EXISTS executed_target')
+        cursor.execute('CREATE INDEX IF NOT EXISTS executed_sourceaddress ON executed (sourceAddress)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS executed_targetaddress ON executed (targetAddress)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS executed_tntxid ON executed (tnTxId)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS executed_othertxid ON executed (otherTxId)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS verified_tx ON verified (tx)')
+        self.dbCon.commit()
+        cursor.close()
+
+    def createRollups(self):
+        createTableDailyStats = '''
+            CREATE TABLE IF NOT EXISTS dailystats (
+                day text NOT NULL,
+                direction text NOT NULL,
+                txcount integer,
+                volume real,
+                fees real,
+                PRIMARY KEY (day, direction)
+        );
+        '''
+        cursor = self.dbCon.cursor()
+        cursor.execute(createTableDailyStats)
+        self.dbCon.commit()
+
+        #fill the rollups once for databases that existed before them
+        empty = cursor.execute('SELECT NOT EXISTS (SELECT 1 FROM dailystats) AND EXISTS (SELECT 1 FROM executed)').fetchone()[0]
+        cursor.close()
+
+        if empty:
+            self.rebuildRollups()
+
+    def createStatus(self):
+        createTableAddressStatus = '''
+            CREATE TABLE IF NOT EXISTS addressstatus (
+                address text NOT NULL,
+                side text NOT NULL,
+                status text,
+                tx text,
+                block integer,
+                error text,
+                PRIMARY KEY (address, side)
+        );
+        '''
+        createTableStatusPending = '''
+            CREATE TABLE IF NOT EXISTS statuspending (
+                id integer PRIMARY KEY AUTOINCREMENT,
+                address text NOT NULL,
+                side text NOT NULL
+        );
+        '''
+        cursor = self.dbCon.cursor()
+        cursor.execute(createTableAddressStatus)
+        cursor.execute(createTableStatusPending)
+        cursor.execute('CREATE INDEX IF NOT EXISTS statuspending_address ON statuspending (address)')
+        self.dbCon.commit()
+
+        #fill the projection once for databases that existed before it
+        empty = cursor.execute('SELECT NOT EXISTS (SELECT 1 FROM addressstatus) AND (EXISTS (SELECT 1 FROM tunnel) OR EXISTS (SELECT 1 FROM executed) OR EXISTS (SELECT 1 FROM errors))').fetchone()[0]
+        cursor.close()
+
+        if empty:
+            self.rebuildStatus()
+
+        #writes that committed right before a crash, without their status refresh
+        self.refreshStatus([(address, side) for id, address, side in self.getPendingStatus()])
+
+    def createPool(self):
+        createTableAddressPool = '''
+            CREATE TABLE IF NOT EXISTS addresspool (
+                id integer PRIMARY KEY,
+                address text NOT NULL UNIQUE,
+                timestamp timestamp
+                default current_timestamp
+        );
+        '''
+        cursor = self.dbCon.cursor()
+        cursor.execute(createTableAddressPool)
+        self.dbCon.commit()
+        cursor.close()
+
+    def createLatency(self):
+        createTableLatency = '''
+            CREATE TABLE IF NOT EXISTS latency (
+                id integer PRIMARY KEY,
+                sourceTxId text NOT NULL UNIQUE,
+                payoutTxId text,
+                direction text NOT NULL,
+                blockTime real,
+                detected real,
+                sent real,
+                confirmed real,
+                completed real
+        );
+        '''
+        cursor = self.dbCon.cursor()
+        cursor.execute(createTableLatency)
+        cursor.execute('CREATE INDEX IF NOT EXISTS latency_payout ON latency (payoutTxId)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS latency_detected ON latency (detected)')
+        self.dbCon.commit()
+        cursor.close()
+
+    def createTunnelIndex(self):
+        cursor = self.dbCon.cursor()
+        cursor.execute('CREATE INDEX IF NOT EXISTS tunnel_source ON tunnel (sourceAddress)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS tunnel_target ON tunnel (targetAddress)')
+
+        #only one new tunnel per target, withdraw tunnels start as 'sending' and may share their target
+        try:
+            cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS tunnel_created_target ON tunnel (targetAddress) WHERE status = 'created'")
+        except sqlite.IntegrityError:
+            log.warning("duplicate 'created' tunnels per target found, tunnel creation is not protected by a unique index until they are cleaned up")
+
+        self.dbCon.commit()
+        cursor.close()
+
     def createVerify(self):
         createVerifyTable = '''
             CREATE TABLE IF NOT EXISTS verified (
@@ -234,10 +456,96 @@ class dbCalls(object):
         values = (sourceAddress, targetAddress, status)
 
         cursor = self.dbCon.cursor()
+        self.markStatus(cursor, tunnelKeys([targetAddress]))
         qryResult = cursor.execute(sql, values)
         self.dbCon.commit()
         cursor.close()
 
+        self.tunnelsChanged([targetAddress])
+
+    def insTunnelBulk(self, rows):
+        #rows of (status, sourceAddress, targetAddress)
+        sql = 'INSERT INTO tunnel ("status", "sourceAddress", "targetAddress", "timestamp") VALUES (?, ?, ?, CURRENT_TIMESTAMP)'
+
+        cursor = self.dbCon.cursor()
+        self.markStatus(cursor, tunnelKeys([row[2] for row in rows]))
+        cursor.executemany(sql, rows)
+        self.dbCon.commit()
+        cursor.close()
+
+        self.tunnelsChanged([row[2] for row in rows])
+
+    def createOrGetTunnel(self, targetAddress, sourceAddress = ''):
+        existing = "SELECT sourceAddress FROM tunnel WHERE targetAddress = ? AND status <> 'error' ORDER BY id LIMIT 1"
+        claim = 'DELETE FROM addresspool WHERE id = (SELECT MIN(id) FROM addresspool) RETURNING address'
+        insert = "INSERT INTO tunnel (sourceAddress, targetAddress, status, timestamp) VALUES (?, ?, 'created', CURRENT_TIMESTAMP)"
+
+        def work(cursor):
+            qryResult = cursor.execute(existing, (targetAddress,)).fetchall()
+
+            if len(qryResult) > 0:
+                return qryResult[0][0], False
+
+            address = sourceAddress
+            if address == '':
+                qryResult = cursor.execute(claim).fetchall()
+
+                if len(qryResult) == 0:
+                    return '', False
+
+                address = qryResult[0][0]
+
+            cursor.execute(insert, (address, targetAddress))
+            self.markStatus(cursor, tunnelKeys([targetAddress]))
+
+            return address, True
+
+        sourceAddress, created = self.tunnelTransaction(work)
+
+        if created:
+            self.tunnelsChanged([targetAddress])
+
+        return sourceAddress, created
+
+    def createOrGetTunnels(self, targetAddresses, sourceAddresses = None):
+        targetAddresses = list(dict.fromkeys(targetAddresses))
+        insert = "INSERT INTO tunnel (sourceAddress, targetAddress, status, timestamp) VALUES (?, ?, 'created', CURRENT_TIMESTAMP)"
+        result = {}
+
+        def work(cursor):
+            for chunk in chunked(targetAddresses, 500):
+                sql = "SELECT targetAddress, sourceAddress FROM tunnel WHERE status <> 'error' AND targetAddress IN (%s) ORDER BY id DESC" % ', '.join(['?'] * len(chunk))
+
+                #the oldest active tunnel of a target wins, like in createOrGetTunnel
+                for targetAddress, sourceAddress in cursor.execute(sql, chunk).fetchall():
+                    result[targetAddress] = (sourceAddress, False)
+
+            missing = [targetAddress for targetAddress in targetAddresses if targetAddress not in result]
+
+            if sourceAddresses is None:
+                sql = 'DELETE FROM addresspool WHERE id IN (SELECT id FROM addresspool ORDER BY id LIMIT ?) RETURNING id, address'
+                claimed = [row[1] for row in sorted(cursor.execute(sql, (len(missing),)).fetchall())]
+            else:
+                addresses = dict(zip(targetAddresses, sourceAddresses))
+                claimed = [addresses[targetAddress] for targetAddress in missing]
+
+            rows = list(zip(claimed, missing))
+            cursor.executemany(insert, rows)
+            self.markStatus(cursor, tunnelKeys([targetAddress for sourceAddress, targetAddress in rows]))
+
+            return missing, rows
+
+        missing, rows = self.tunnelTransaction(work)
+
+        for sourceAddress, targetAddress in rows:
+            result[targetAddress] = (sourceAddress, True)
+        for targetAddress in missing[len(rows):]:
+            result[targetAddress] = ('', False)
+
+        self.tunnelsCreated([targetAddress for sourceAddress, targetAddress in rows])
+
+        return result
+
     def updTunnel(self, status, sourceAddress, targetAddress, statusOld = ''):
         if statusOld == '':
             statusOld = 'created'
@@ -246,38 +554,70 @@ class dbCalls(object):
         values = (status, statusOld, sourceAddress, targetAddress)
 
         cursor = self.dbCon.cursor()
+        self.markStatus(cursor, tunnelKeys([targetAddress]))
         qryResult = cursor.execute(sql, values)
         self.dbCon.commit()
         cursor.close()
 
+        self.tunnelsChanged([targetAddress])
+
     def delTunnel(self, sourceAddress, targetAddress):
         sql = 'DELETE FROM tunnel WHERE sourceAddress = ? and targetAddress = ?'
         values = (sourceAddress, targetAddress)
 
         cursor = self.dbCon.cursor()
+        self.markStatus(cursor, tunnelKeys([targetAddress]))
         qryResult = cursor.execute(sql, values)
         self.dbCon.commit()
         cursor.close()
 
+        self.tunnelsChanged([targetAddress])
+
 #executed table related
-    def insExecuted(self, sourceAddress, targetAddress, otherTxId, tnTxID, amount, amountFee):
-        sql = 'INSERT INTO executed ("sourceAddress", "targetAddress", "otherTxId", "tnTxId", "amount", "amountFee") VALUES (?, ?, ?, ?, ?, ?)'
-        values = (sourceAddress, targetAddress, otherTxId, tnTxID, amount, amountFee)
+    def insExecuted(self, sourceAddress, targetAddress, otherTxId, tnTxID, amount, amountFee, direction = ''):
+        if direction == '':
+            direction = txDirection(targetAddress)
+
+        sql = 'INSERT INTO executed ("sourceAddress", "targetAddress", "otherTxId", "tnTxId", "amount", "amountFee", "direction", "tnVerBlock", "otherVerBlock") ' \
+              'VALUES (?, ?, ?, ?, ?, ?, ?, (SELECT block FROM verified WHERE tx = ?), (SELECT block FROM verified WHERE tx = ?))'
+        values = (sourceAddress, targetAddress, otherTxId, tnTxID, amount, amountFee, direction, tnTxID, otherTxId)
 
         cursor = self.dbCon.cursor()
+        self.markStatus(cursor, executedKeys([(sourceAddress, targetAddress)]))
         qryResult = cursor.execute(sql, values)
+        self.addRollup(cursor, {direction: (1, amount or 0, amountFee or 0)})
+        self.dbCon.commit()
+        cursor.close()
+
+        self.executedChanged([(sourceAddress, targetAddress)])
+
+    def insExecutedBulk(self, rows):
+        #rows of (sourceAddress, targetAddress, otherTxId, tnTxID, amount, amountFee[, direction])
+        sql = 'INSERT INTO executed ("sourceAddress", "targetAddress", "otherTxId", "tnTxId", "amount", "amountFee", "direction", "tnVerBlock", "otherVerBlock") ' \
+              'VALUES (?, ?, ?, ?, ?, ?, ?, (SELECT block FROM verified WHERE tx = ?), (SELECT block FROM verified WHERE tx = ?))'
+        rows = executedRows(rows)
+
+        cursor = self.dbCon.cursor()
+        self.markStatus(cursor, executedKeys([(row[0], row[1]) for row in rows]))
+        cursor.executemany(sql, [row + (row[3], row[2]) for row in rows])
+        self.addRollup(cursor, dailyTotals(rows))
         self.dbCon.commit()
         cursor.close()
 
+        self.executedChanged([(row[0], row[1]) for row in rows])
+
     def updExecuted(self, id, sourceAddress, targetAddress, otherTxId, tnTxID, amount, amountFee):
-        sql = 'UPDATE executed SET "sourceAddress" = ?, "targetAddress" = ?, "otherTxId" = ?, "tnTxId" = ?, "amount" = ?, "amountFee" = ?) WHERE id = ?'
+        sql = 'UPDATE executed SET "sourceAddress" = ?, "targetAddress" = ?, "otherTxId" = ?, "tnTxId" = ?, "amount" = ?, "amountFee" = ? WHERE id = ?'
         values = (sourceAddress, targetAddress, otherTxId, tnTxID, amount, amountFee, id)
 
         cursor = self.dbCon.cursor()
+        self.markStatus(cursor, executedKeys([(sourceAddress, targetAddress)]))
         qryResult = cursor.execute(sql, values)
         self.dbCon.commit()
         cursor.close()
 
+        self.executedChanged([(sourceAddress, targetAddress)])
+
     def didWeSendTx(self, txid):
         sql = 'SELECT * FROM executed WHERE (otherTxId = ? OR tnTxId = ?)'
         values = (txid, txid)
@@ -334,10 +674,25 @@ class dbCalls(object):
         values = (sourceAddress, targetAddress, tnTxId, otherTxId, amount, error, exception)
 
         cursor = self.dbCon.cursor()
+        self.markStatus(cursor, executedKeys([(sourceAddress, targetAddress)]))
         qryResult = cursor.execute(sql, values)
         self.dbCon.commit()
         cursor.close()
 
+        self.executedChanged([(sourceAddress, targetAddress)])
+
+    def insErrorBulk(self, rows):
+        #rows of (sourceAddress, targetAddress, tnTxId, otherTxId, amount, error, exception)
+        sql = 'INSERT INTO errors ("sourceAddress", "targetAddress", "tnTxId", "otherTxId", "amount", "error", "exception") VALUES (?, ?, ?, ?, ?, ?, ?)'
+
+        cursor = self.dbCon.cursor()
+        self.markStatus(cursor, executedKeys([(row[0], row[1]) for row in rows]))
+        cursor.executemany(sql, rows)
+        self.dbCon.commit()
+        cursor.close()
+
+        self.executedChanged([(row[0], row[1]) for row in rows])
+
     def getErrors(self):
         sql = 'SELECT * FROM errors'
 
@@ -411,34 +766,50 @@ class dbCalls(object):
         if self.getVerified(tx) is None:
             sql = 'INSERT INTO verified ("chain", "tx", "block") VALUES (?, ?, ?)'
             values = (chain, tx, block)
-
-            cursor = self.dbCon.cursor()
-            qryResult = cursor.execute(sql, values)
-            self.dbCon.commit()
-            cursor.close()
         else:
             sql = 'UPDATE verified SET "block" = ? WHERE tx = ?'
             values = (block, tx)
 
-            cursor = self.dbCon.cursor()
-            qryResult = cursor.execute(sql, values)
-            self.dbCon.commit()
-            cursor.close()
+        cursor = self.dbCon.cursor()
+        qryResult = cursor.execute(sql, values)
+        self.updVerBlocks(cursor, [(tx, block)])
+        self.markVerifiedStatus(cursor, [tx])
+        self.dbCon.commit()
+        cursor.close()
+
+        self.verifiedChanged([tx])
+
+    def insVerifiedBulk(self, rows):
+        #rows of (chain, tx, block) for tx that are not in the verified table yet
+        sql = 'INSERT INTO verified ("chain", "tx", "block") VALUES (?, ?, ?)'
+
+        cursor = self.dbCon.cursor()
+        cursor.executemany(sql, rows)
+        self.updVerBlocks(cursor, [(tx, block) for chain, tx, block in rows])
+        self.markVerifiedStatus(cursor, [row[1] for row in rows])
+        self.dbCon.commit()
+        cursor.close()
+
+        self.verifiedChanged([row[1] for row in rows])
+
+    def updVerBlocks(self, cursor, blocks):
+        #keeps the copies on executed in step, runs in the transaction of the verified write
+        cursor.executemany('UPDATE executed SET tnVerBlock = ? WHERE tnTxId = ?', [(block, tx) for tx, block in blocks])
+        cursor.executemany('UPDATE executed SET otherVerBlock = ? WHERE otherTxId = ?', [(block, tx) for tx, block in blocks])
 
 #other
     def checkTXs(self, address):
+        columns = "SELECT sourceAddress, targetAddress, tnTxId, otherTxId as 'OtherTxId', ifnull(tnVerBlock, 0) as 'TNVerBlock', ifnull(otherVerBlock, 0) as 'OtherVerBlock', amount, direction as 'TypeTX', " \
+                  "CASE WHEN direction = 'Deposit' AND tnVerBlock IS NOT NULL THEN 'verified' WHEN direction <> 'Deposit' AND otherVerBlock IS NOT NULL AND otherVerBlock IS NOT 0 THEN 'verified' ELSE 'unverified' END 'Status' FROM executed "
+
         if address == '':
             cursor = self.dbCon.cursor()
-            sql = "SELECT e.sourceAddress, e.targetAddress, e.tnTxId, e.otherTxId as 'OtherTxId', ifnull(v.block, 0) as 'TNVerBlock', ifnull(v2.block, 0) as 'OtherVerBlock', e.amount, CASE WHEN e.targetAddress LIKE '3J%' THEN 'Deposit' ELSE 'Withdraw' END 'TypeTX', " \
-            "CASE WHEN e.targetAddress LIKE '3J%' AND v.block IS NOT NULL THEN 'verified' WHEN e.targetAddress NOT LIKE '3J%' AND v2.block IS NOT NULL AND v2.block IS NOT 0 THEN 'verified' ELSE 'unverified' END 'Status' " \
-            "FROM executed e LEFT JOIN verified v ON e.tnTxId = v.tx LEFT JOIN verified v2 ON e.otherTxId = v2.tx "
-            cursor.execute(sql)
+            cursor.execute(columns + "ORDER BY id")
         else:
+            #one index per branch, the second one leaves out the rows of the first
             cursor = self.dbCon.cursor()
-            sql = "SELECT e.sourceAddress, e.targetAddress, e.tnTxId, e.otherTxId as 'OtherTxId', ifnull(v.block, 0) as 'TNVerBlock', ifnull(v2.block, 0) as 'OtherVerBlock', e.amount, CASE WHEN e.targetAddress LIKE '3J%' THEN 'Deposit' ELSE 'Withdraw' END 'TypeTX', " \
-            "CASE WHEN e.targetAddress LIKE '3J%' AND v.block IS NOT NULL THEN 'verified' WHEN e.targetAddress NOT LIKE '3J%' AND v2.block IS NOT NULL AND v2.block IS NOT 0 THEN 'verified' ELSE 'unverified' END 'Status' " \
-            "FROM executed e LEFT JOIN verified v ON e.tnTxId = v.tx LEFT JOIN verified v2 ON e.otherTxId = v2.tx WHERE (e.sourceAddress = ? or e.targetAddress = ?)"
-            cursor.execute(sql, (address, address))
+            sql = columns + "WHERE sourceAddress = ? UNION ALL " + columns + "WHERE targetAddress = ? AND sourceAddress <> ?"
+            cursor.execute(sql, (address, address, address))
 
         tx = [dict((cursor.description[i][0], value) for i, value in enumerate(row)) for row in cursor.fetchall()]
         cursor.close()
@@ -449,39 +820,10 @@ class dbCalls(object):
             return tx
 
     def getFees(self, fromdate, todate):
-        #check date notation
-        if len(fromdate) != 0:
-            fromyear,frommonth,fromday = fromdate.split('-')
-
-            isValidFromDate = True
-            try :
-                datetime.datetime(int(fromyear),int(frommonth),int(fromday))
-            except ValueError :
-                isValidFromDate = False
-        else:
-            isValidFromDate = False
-
-        if len(todate) != 0:
-            toyear,tomonth,today = todate.split('-')
-
-            isValidtoDate = True
-            try :
-                datetime.datetime(int(toyear),int(tomonth),int(today))
-            except ValueError :
-                isValidtoDate = False
-        else:
-            isValidtoDate = False
-
-        if not isValidFromDate:
-            fromdate = '1990-01-01'
-    
-        if not isValidtoDate:
-            todat = datetime.date.today() + timedelta(days=1)
-            todate = todat.strftime('%Y-%m-%d')
-        
+        fromdate, todate = self.dateRange(fromdate, todate)
         values = (fromdate, todate)
 
-        sql = "SELECT SUM(amountFee) as totalFee from executed WHERE timestamp > ? and timestamp < ?"
+        sql = "SELECT COALESCE(SUM(fees), 0) as totalFee from dailystats WHERE day >= ? and day < ?"
         cursor = self.dbCon.cursor()
         result = cursor.execute(sql, values).fetchall()
         cursor.close()
@@ -492,3 +834,186 @@ class dbCalls(object):
             Fees = result[0][0]
 
         return { 'totalFees': Fees }
+
+#dailystats table related
+    def addRollup(self, cursor, totals):
+        #runs in the transaction of the executed insert
+        sql = "INSERT INTO dailystats (day, direction, txcount, volume, fees) VALUES (date('now'), ?, ?, ?, ?) " \
+              "ON CONFLICT (day, direction) DO UPDATE SET txcount = txcount + excluded.txcount, volume = volume + excluded.volume, fees = fees + excluded.fees"
+
+        for direction, (txcount, volume, fees) in totals.items():
+            cursor.execute(sql, (direction, txcount, volume, fees))
+
+    def rebuildRollups(self):
+        sql = "INSERT INTO dailystats (day, direction, txcount, volume, fees) " \
+              "SELECT date(timestamp), direction, COUNT(*), COALESCE(SUM(amount), 0), COALESCE(SUM(amountFee), 0) " \
+              "FROM executed WHERE timestamp IS NOT NULL GROUP BY 1, 2"
+
+        cursor = self.dbCon.cursor()
+        cursor.execute('DELETE FROM dailystats')
+        cursor.execute(sql)
+        self.dbCon.commit()
+        cursor.close()
+
+    def getDailyStats(self, fromdate, todate):
+        fromdate, todate = self.dateRange(fromdate, todate)
+        values = (fromdate, todate)
+
+        sql = 'SELECT day, direction, txcount, volume, fees FROM dailystats WHERE day >= ? and day < ? ORDER BY day, direction'
+        cursor = self.dbCon.cursor()
+        qryResult = cursor.execute(sql, values).fetchall()
+        cursor.close()
+
+        return [{'day': row[0], 'direction': row[1], 'txcount': row[2], 'volume': row[3], 'fees': row[4]} for row in qryResult]
+
+#addressstatus table related
+    def getAddressStatus(self, address, side):
+        sql = 'SELECT status, tx, block, error FROM addressstatus WHERE address = ? AND side = ?'
+        values = (address, side)
+
+        cursor = self.dbCon.cursor()
+        qryResult = cursor.execute(sql, values).fetchall()
+        cursor.close()
+
+        if len(qryResult) > 0:
+            return qryResult[0]
+        else:
+            return {}
+
+    def updAddressStatus(self, rows, pending = None):
+        #rows of (address, side, status, tx, block, error)
+        sql = 'INSERT INTO addressstatus ("address", "side", "status", "tx", "block", "error") VALUES (?, ?, ?, ?, ?, ?) ' \
+              'ON CONFLICT (address, side) DO UPDATE SET status = excluded.status, tx = excluded.tx, block = excluded.block, error = excluded.error'
+
+        cursor = self.dbCon.cursor()
+        cursor.executemany(sql, rows)
+        cursor.executemany('DELETE FROM statuspending WHERE id = ?', [(id,) for id in pending or []])
+        self.dbCon.commit()
+        cursor.close()
+
+    def getPendingStatus(self, keys = None):
+        cursor = self.dbCon.cursor()
+
+        if keys is None:
+            qryResult = cursor.execute('SELECT id, address, side FROM statuspending').fetchall()
+        else:
+            keys = set(keys)
+            addresses = list(set(address for address, side in keys))
+            qryResult = []
+
+            for chunk in chunked(addresses, 500):
+                sql = 'SELECT id, address, side FROM statuspending WHERE address IN (%s)' % ', '.join(['?'] * len(chunk))
+                qryResult += [row for row in cursor.execute(sql, chunk).fetchall() if (row[1], row[2]) in keys]
+        cursor.close()
+
+        return qryResult
+
+    def markStatus(self, cursor, keys):
+        #runs in the transaction of the write, so a crash before its refresh leaves the pairs for createStatus
+        cursor.executemany('INSERT INTO statuspending ("address", "side") VALUES (?, ?)', list(keys))
+
+    def markVerifiedStatus(self, cursor, txs):
+        #the pairs verifiedChanged refreshes, found through the executed rows of the tx
+        sql = "INSERT INTO statuspending (address, side) SELECT targetAddress, 'target' FROM executed WHERE tnTxId = ? AND targetAddress <> '' " \
+              "UNION SELECT sourceAddress, 'source' FROM executed WHERE otherTxId = ? AND sourceAddress <> ''"
+
+        cursor.executemany(sql, [(tx, tx) for tx in txs])
+
+    def getAddressStatuses(self, addresses, side):
+        result = {}
+
+        cursor = self.dbCon.cursor()
+        for chunk in chunked(addresses, 500):
+            sql = 'SELECT address, status, tx, block, error FROM addressstatus WHERE side = ? AND address IN (%s)' % ', '.join(['?'] * len(chunk))
+
+            for row in cursor.execute(sql, [side] + list(chunk)).fetchall():
+                result[row[0]] = row[1:]
+        cursor.close()
+
+        return result
+
+    def getStatusAddresses(self):
+        sql = "SELECT targetAddress, 'target' FROM tunnel UNION SELECT targetAddress, 'source' FROM tunnel " \
+              "UNION SELECT targetAddress, 'target' FROM executed UNION SELECT sourceAddress, 'source' FROM executed " \
+              "UNION SELECT targetAddress, 'target' FROM errors UNION SELECT sourceAddress, 'source' FROM errors"
+
+        cursor = self.dbCon.cursor()
+        qryResult = cursor.execute(sql).fetchall()
+        cursor.close()
+
+        return qryResult
+
+#addresspool table related
+    def insPoolAddresses(self, addresses):
+        sql = 'INSERT OR IGNORE INTO addresspool ("address") VALUES (?)'
+
+        cursor = self.dbCon.cursor()
+        cursor.executemany(sql, [(address,) for address in addresses])
+        self.dbCon.commit()
+        cursor.close()
+
+    def claimPoolAddresses(self, count = 1):
+        sql = 'DELETE FROM addresspool WHERE id IN (SELECT id FROM addresspool ORDER BY id LIMIT ?) RETURNING id, address'
+        values = (count,)
+
+        cursor = self.dbCon.cursor()
+        qryResult = cursor.execute(sql, values).fetchall()
+        self.dbCon.commit()
+        cursor.close()
+
+        return [row[1] for row in sorted(qryResult)]
+
+    def delPoolAddresses(self, addresses):
+        sql = 'DELETE FROM addresspool WHERE address = ?'
+
+        cursor = self.dbCon.cursor()
+        cursor.executemany(sql, [(address,) for address in addresses])
+        self.dbCon.commit()
+        cursor.close()
+
+    def getPoolSize(self):
+        sql = 'SELECT count(*) FROM addresspool'
+
+        cursor = self.dbCon.cursor()
+        qryResult = cursor.execute(sql).fetchall()
+        cursor.close()
+
+        return qryResult[0][0]
+
+#latency table related
+    def insLatency(self, sourceTxId, direction, blockTime, detected):
+        sql = 'INSERT OR IGNORE INTO latency ("sourceTxId", "direction", "blockTime", "detected") VALUES (?, ?, ?, ?)'
+        values = (sourceTxId, direction, blockTime, detected)
+
+        cursor = self.dbCon.cursor()
+        cursor.execute(sql, values)
+        self.dbCon.commit()
+        cursor.close()
+
+    def updLatency(self, stage, at, sourceTxId = '', payoutTxId = ''):
+        if stage not in LATENCYSTAGES:
+            raise ValueError('unknown latency stage ' + stage)
+
+        if stage == 'sent':
+            sql = 'UPDATE latency SET sent = COALESCE(sent, ?), payoutTxId = ? WHERE sourceTxId = ?'
+            values = (at, payoutTxId, sourceTxId)
+        else:
+            sql = 'UPDATE latency SET ' + stage + ' = COALESCE(' + stage + ', ?) WHERE payoutTxId = ?'
+            values = (at, payoutTxId)
+
+        cursor = self.dbCon.cursor()
+        cursor.execute(sql, values)
+        self.dbCon.commit()
+        cursor.close()
+
+    def getLatencies(self, since):
+        sql = 'SELECT direction, blockTime, detected, sent, confirmed, completed FROM latency WHERE detected >= ?'
+        values = (since,)
+
+        cursor = self.dbCon.cursor()
+        qryResult = cursor.execute(sql, values).fetchall()
+        cursor.close()
+
+        return qryResult
+
+metrics.instrument(dbCalls, 'gateway_db_seconds', 'duration of storage calls by backend and method', dbInterface.methods(), stage='db', backend='sqlite')
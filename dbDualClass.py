@@ -0,0 +1,269 @@
+import collections
+import hashlib
+import io
+import sqlite3
+import threading
+import time
+
+import logs
+import metrics
+from dbClass import dbCalls
+from dbInterface import dbInterface
+from dbPGClass import dbPGCalls
+from pgImporter import sqliteImporter, checksumValue, copyValue, readChunk
+
+log = logs.get(__name__)
+
+metrics.describe('gateway_backfill_state', 'gauge', 'backfill of the secondary DB: 0 running, 1 finished and consistent, -1 failed or inconsistent')
+
+class dbDualCalls(dbInterface):
+    #migration backend: every write goes to both stores, all reads are served by the primary.
+    #the primary is Postgres when use-pg is set and SQLite otherwise, so the cut over is flipping use-pg
+    #while dual-write stays on, and switching dual-write off once the old store is not needed anymore
+    RECHECKS = 3
+
+    def __init__(self, config):
+        self.config = config
+        self.sqlite = dbCalls(config)
+        self.pg = dbPGCalls(config)
+
+        if self.config['main']['use-pg']:
+            self.primary = self.pg
+            self.secondary = self.sqlite
+        else:
+            self.primary = self.sqlite
+            self.secondary = self.pg
+
+        self.secondaryErrors = 0
+
+    def dualWrite(self, name, *args, **kwargs):
+        result = getattr(self.primary, name)(*args, **kwargs)
+        self.secondaryWrite(name, *args, **kwargs)
+
+        return result
+
+    def secondaryWrite(self, name, *args, **kwargs):
+        #the secondary must never break the running gateway, the consistency check finds what got lost
+        try:
+            getattr(self.secondary, name)(*args, **kwargs)
+        except Exception as e:
+            self.secondaryErrors += 1
+            log.error('write %s to secondary DB failed: %s', name, e)
+
+#tunnel creation and pool claims pick addresses, the secondary gets the ones the primary picked
+    def createOrGetTunnel(self, targetAddress, sourceAddress = ''):
+        address, created = self.primary.createOrGetTunnel(targetAddress, sourceAddress)
+
+        if created:
+            if sourceAddress == '':
+                self.secondaryWrite('delPoolAddresses', [address])
+
+            self.secondaryWrite('createOrGetTunnel', targetAddress, address)
+
+        return address, created
+
+    def createOrGetTunnels(self, targetAddresses, sourceAddresses = None):
+        result = self.primary.createOrGetTunnels(targetAddresses, sourceAddresses)
+        created = [(targetAddress, address) for targetAddress, (address, isNew) in result.items() if isNew]
+
+        if len(created) > 0:
+            if sourceAddresses is None:
+                self.secondaryWrite('delPoolAddresses', [address for targetAddress, address in created])
+
+            self.secondaryWrite('createOrGetTunnels', [targetAddress for targetAddress, address in created], [address for targetAddress, address in created])
+
+        return result
+
+    def claimPoolAddresses(self, count = 1):
+        addresses = self.primary.claimPoolAddresses(count)
+
+        if len(addresses) > 0:
+            self.secondaryWrite('delPoolAddresses', addresses)
+
+        return addresses
+
+    def close(self):
+        self.sqlite.close()
+        self.pg.close()
+
+#DB Setup part
+    def createdb(self):
+        self.sqlite.createdb()
+        self.sqlite.createVerify()
+        self.sqlite.updateExisting()
+        self.pg.createdb()
+
+    def startBackfill(self):
+        #copy the rows written before the dual writes started, only from a SQLite primary into Postgres
+        if self.primary is not self.sqlite:
+            return None
+
+        importer = sqliteImporter(self.config, self.pg)
+        importer.prepareBackfill()
+
+        backfillThread = threading.Thread(target=self.runBackfill, args=(importer,), daemon=True)
+        backfillThread.start()
+
+        return backfillThread
+
+    def runBackfill(self, importer):
+        metrics.setGauge('gateway_backfill_state', 0)
+
+        try:
+            importer.backfill()
+            checker = consistencyChecker(self.config, self.sqlite, self.pg)
+            mismatches = checker.check()
+
+            #writes that land between reading SQLite and Postgres show up as differences, they are gone on a second look
+            for attempt in range(self.RECHECKS):
+                if len(mismatches) == 0:
+                    break
+
+                time.sleep(5)
+                mismatches = checker.check()
+        except Exception as e:
+            metrics.setGauge('gateway_backfill_state', -1)
+            log.error('backfill of the secondary DB failed: %s', e, exc_info=True)
+            return
+
+        if len(mismatches) > 0:
+            metrics.setGauge('gateway_backfill_state', -1)
+            log.error('secondary DB differs after the backfill in %s', ', '.join(mismatches))
+        else:
+            metrics.setGauge('gateway_backfill_state', 1)
+
+def delegate(name):
+    if name in dbInterface.WRITES:
+        def method(self, *args, **kwargs):
+            return self.dualWrite(name, *args, **kwargs)
+    else:
+        def method(self, *args, **kwargs):
+            return getattr(self.primary, name)(*args, **kwargs)
+
+    method.__name__ = name
+    return method
+
+#everything of the storage interface that is not handled above is forwarded
+for name in dbInterface.methods():
+    if name not in dbDualCalls.__dict__:
+        setattr(dbDualCalls, name, delegate(name))
+
+class consistencyChecker(object):
+    #compares the SQLite and Postgres stores table by table. ids and timestamps are left out, as both
+    #stores assign them on their own for rows written during the migration
+    IGNORED = ['id', 'timestamp']
+
+    def __init__(self, config, sqliteDb, pgDb, chunksize = 0):
+        self.config = config
+        self.sqlite = sqliteDb
+        self.pg = pgDb
+        self.importer = sqliteImporter(config, pgDb, chunksize)
+        self.chunksize = self.importer.chunksize
+
+    def check(self, repair = False):
+        #an own SQLite connection, so the check never sees uncommitted writes of the gateway
+        consq = sqlite3.connect(self.importer.dbfile)
+        dbCon = self.pg.openConn()
+        mismatches = []
+
+        try:
+            for table in self.importer.getTables(consq):
+                columns = [column for column in self.importer.getColumns(consq, dbCon, table) if column[0].lower() not in self.IGNORED]
+                if len(columns) == 0:
+                    continue
+
+                sqCount, sqDigest = self.digest(self.sqliteRows(consq, table, columns), columns)
+                pgCount, pgDigest = self.digest(self.pgRows(dbCon, table, columns), columns)
+
+                if sqCount == pgCount and sqDigest == pgDigest:
+                    log.info('%s is consistent: %s rows', table, sqCount)
+                    continue
+
+                log.error('%s differs: %s rows in SQLite, %s in Postgres', table, sqCount, pgCount)
+                self.showDifferences(consq, dbCon, table, columns)
+                mismatches.append(table)
+
+                if repair:
+                    self.repairTable(consq, dbCon, table)
+        finally:
+            self.pg.closeConn(dbCon)
+            consq.close()
+
+        return mismatches
+
+    def sqliteRows(self, consq, table, columns):
+        names = [column[0] for column in columns]
+        lastrowid = -1
+
+        while True:
+            rows = readChunk(consq, table, names, lastrowid, self.chunksize)
+            if len(rows) == 0:
+                break
+
+            for row in rows:
+                yield row[1:]
+            lastrowid = rows[-1][0]
+
+    def pgRows(self, dbCon, table, columns):
+        cursor = dbCon.cursor(name='check_' + table.lower(), withhold=True)
+        cursor.itersize = self.chunksize
+        cursor.execute('SELECT %s FROM %s' % (', '.join('"' + column[0].lower() + '"' for column in columns), table))
+
+        for row in cursor:
+            yield row
+
+        cursor.close()
+
+    def digest(self, rows, columns):
+        #order independent: the sum of the row hashes
+        types = [column[1] for column in columns]
+        count = 0
+        total = 0
+
+        for row in rows:
+            count += 1
+            total += int(hashlib.md5(checksumValue(row, types)).hexdigest(), 16)
+
+        return count, total % (2 ** 128)
+
+    def showDifferences(self, consq, dbCon, table, columns, limit = 5):
+        types = [column[1] for column in columns]
+        sqRows = collections.Counter(checksumValue(row, types) for row in self.sqliteRows(consq, table, columns))
+        pgRows = collections.Counter(checksumValue(row, types) for row in self.pgRows(dbCon, table, columns))
+
+        for row in list((sqRows - pgRows).elements())[:limit]:
+            log.warning('only in SQLite %s: %s', table, row.decode().strip())
+        for row in list((pgRows - sqRows).elements())[:limit]:
+            log.warning('only in Postgres %s: %s', table, row.decode().strip())
+
+    def repairTable(self, consq, dbCon, table):
+        #replace the Postgres rows with the SQLite ones in a single transaction
+        if self.config['main']['use-pg']:
+            log.warning('repair only copies from a SQLite primary, %s left as is', table)
+            return
+
+        columns = self.importer.getColumns(consq, dbCon, table)
+        names = [column[0] for column in columns]
+        copySql = 'COPY %s (%s) FROM STDIN' % (table, ', '.join('"' + name.lower() + '"' for name in names))
+
+        cursor = dbCon.cursor()
+        cursor.execute('BEGIN')
+        cursor.execute('TRUNCATE TABLE %s' % table)
+
+        lastrowid = -1
+        while True:
+            rows = readChunk(consq, table, names, lastrowid, self.chunksize)
+            if len(rows) == 0:
+                break
+
+            buffer = io.StringIO()
+            for row in rows:
+                buffer.write('\t'.join(copyValue(value) for value in row[1:]) + '\n')
+            buffer.seek(0)
+
+            cursor.copy_expert(copySql, buffer)
+            lastrowid = rows[-1][0]
+
+        cursor.execute('COMMIT')
+        cursor.close()
+        log.info('%s copied again from SQLite', table)
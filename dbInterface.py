@@ -0,0 +1,500 @@
+import datetime
+import importlib
+import json
+import threading
+from datetime import timedelta
+
+import queryLog
+from cacheClass import ttlCache
+from hubClass import hub
+
+#storage backends by name, as class or as 'module:class' which is only imported when it gets used
+BACKENDS = {
+    'sqlite': 'dbClass:dbCalls',
+    'postgres': 'dbPGClass:dbPGCalls',
+    'dual': 'dbDualClass:dbDualCalls',
+    'memory': 'dbMemClass:dbMemCalls'
+}
+
+instances = {}
+instancesLock = threading.Lock()
+
+def registerBackend(name, backend):
+    BACKENDS[name] = backend
+
+def backendName(config):
+    #db-backend wins, otherwise the older dual-write and use-pg switches decide
+    name = config['main'].get('db-backend', '')
+
+    if name != '':
+        return name
+    elif config['main'].get('dual-write', False):
+        return 'dual'
+    elif config['main']['use-pg']:
+        return 'postgres'
+    else:
+        return 'sqlite'
+
+def getBackendClass(name):
+    backend = BACKENDS[name]
+
+    if isinstance(backend, str):
+        moduleName, className = backend.split(':')
+        backend = getattr(importlib.import_module(moduleName), className)
+
+    return backend
+
+def newDB(config, name = ''):
+    if name == '':
+        name = backendName(config)
+
+    return getBackendClass(name)(config)
+
+def configKey(config):
+    #configs loaded separately from the same file share their instances
+    return json.dumps(config, sort_keys=True, default=str)
+
+def getDB(config, name = ''):
+    #one shared backend instance per config, so all consumers in a process use the same connections and data
+    if name == '':
+        name = backendName(config)
+
+    key = (name, configKey(config))
+    with instancesLock:
+        if key not in instances:
+            instances[key] = newDB(config, name)
+
+        return instances[key]
+
+def txDirection(targetAddress):
+    #classification of rows written before the direction was stored with them, only used to backfill
+    if targetAddress.startswith('3J'):
+        return 'Deposit'
+    else:
+        return 'Withdraw'
+
+def executedRows(rows):
+    #rows of insExecutedBulk with the optional direction filled in
+    result = []
+
+    for row in rows:
+        if len(row) > 6 and row[6] != '':
+            result.append(tuple(row[:7]))
+        else:
+            result.append(tuple(row[:6]) + (txDirection(row[1]),))
+
+    return result
+
+#the columns of the latency table updLatency may set
+LATENCYSTAGES = ('sent', 'confirmed', 'completed')
+
+def configureQueryLog(config):
+    #slow statements of the sql backends, with their plans, go to their own rotating log
+    queryLog.configure(config['main'].get('slow-query-ms', 100), config['main'].get('slow-query-log', 'slowqueries.log'))
+
+def statusKeys(keys):
+    #(address, side) pairs of the addressstatus projection, rows without an address have no status
+    return set(key for key in keys if key[0] is not None and key[0] != '')
+
+def tunnelKeys(targetAddresses):
+    return statusKeys((address, side) for address in targetAddresses for side in ('target', 'source'))
+
+def executedKeys(rows):
+    #rows of (sourceAddress, targetAddress) written to executed or errors
+    return statusKeys(key for sourceAddress, targetAddress in rows for key in ((targetAddress, 'target'), (sourceAddress, 'source')))
+
+def chunked(items, size):
+    #keeps IN lists below the parameter limits
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def dailyTotals(rows):
+    #direction -> (txcount, volume, fees) for rows in the layout of executedRows
+    totals = {}
+
+    for sourceAddress, targetAddress, otherTxId, tnTxId, amount, amountFee, direction in rows:
+        txcount, volume, fees = totals.get(direction, (0, 0, 0))
+        totals[direction] = (txcount + 1, volume + (amount or 0), fees + (amountFee or 0))
+
+    return totals
+
+class dbInterface(object):
+    #the storage interface every backend implements. methods that change data are listed in WRITES,
+    #lookups return {} (or None/0 where noted) when nothing is found and rows as tuples in the column
+    #order of the SQLite tables otherwise
+    WRITES = ['createdb', 'createVerify', 'updateExisting', 'updHeights', 'insHeights', 'insTunnel', 'insTunnelBulk', 'createOrGetTunnel', 'createOrGetTunnels', 'updTunnel', 'delTunnel', 'insExecuted', 'insExecutedBulk', 'updExecuted', 'insError', 'insErrorBulk', 'insVerified', 'insVerifiedBulk', 'rebuildRollups', 'updAddressStatus', 'refreshStatus', 'rebuildStatus', 'insPoolAddresses', 'claimPoolAddresses', 'delPoolAddresses', 'insLatency', 'updLatency']
+
+    @classmethod
+    def methods(cls):
+        return [name for name in dir(dbInterface) if not name.startswith('_') and name not in ('WRITES', 'methods', 'dateRange', 'initStatus', 'close') and callable(getattr(dbInterface, name))]
+
+#DB Setup part
+    def createdb(self):
+        raise NotImplementedError
+
+    def createVerify(self):
+        pass
+
+    def updateExisting(self):
+        pass
+
+    def close(self):
+        #at shutdown, closes all connections of the backend
+        pass
+
+#heights table related
+    def lastScannedBlock(self, chain):
+        #0 when the chain was never scanned
+        raise NotImplementedError
+
+    def getHeights(self):
+        raise NotImplementedError
+
+    def updHeights(self, block, chain):
+        raise NotImplementedError
+
+    def insHeights(self, block, chain):
+        raise NotImplementedError
+
+#tunnel table related
+    def doWeHaveTunnels(self):
+        raise NotImplementedError
+
+    def getTargetAddress(self, sourceAddress):
+        #the target address itself
+        raise NotImplementedError
+
+    def getSourceAddress(self, targetAddress):
+        #rows of (sourceAddress,)
+        raise NotImplementedError
+
+    def getTunnelStatus(self, targetAddress = '', sourceAddress = ''):
+        raise NotImplementedError
+
+    def getTunnels(self, status = ''):
+        raise NotImplementedError
+
+    def insTunnel(self, status, sourceAddress, targetAddress):
+        raise NotImplementedError
+
+    def insTunnelBulk(self, rows):
+        raise NotImplementedError
+
+    def createOrGetTunnel(self, targetAddress, sourceAddress = ''):
+        #(sourceAddress, created) in one atomic step: the active tunnel of the target, or a new 'created' one.
+        #without a sourceAddress the address is claimed from the address pool in the same step, ('', False)
+        #means the pool was empty and the call has to be repeated with an address
+        raise NotImplementedError
+
+    def createOrGetTunnels(self, targetAddresses, sourceAddresses = None):
+        #createOrGetTunnel for many targets in one transaction, target -> (sourceAddress, created).
+        #sourceAddresses lines up with targetAddresses, without it the addresses are claimed from the pool
+        raise NotImplementedError
+
+    def updTunnel(self, status, sourceAddress, targetAddress, statusOld = ''):
+        raise NotImplementedError
+
+    def delTunnel(self, sourceAddress, targetAddress):
+        raise NotImplementedError
+
+#executed table related
+    def insExecuted(self, sourceAddress, targetAddress, otherTxId, tnTxId, amount, amountFee, direction = ''):
+        #direction is 'Deposit' or 'Withdraw', stored with the row together with the blocks of the verified table
+        raise NotImplementedError
+
+    def insExecutedBulk(self, rows):
+        #rows of (sourceAddress, targetAddress, otherTxId, tnTxId, amount, amountFee[, direction])
+        raise NotImplementedError
+
+    def updExecuted(self, id, sourceAddress, targetAddress, otherTxId, tnTxId, amount, amountFee):
+        raise NotImplementedError
+
+    def didWeSendTx(self, txid):
+        raise NotImplementedError
+
+    def getExecutedAll(self):
+        raise NotImplementedError
+
+    def getExecuted(self, sourceAddress = '', targetAddress = '', otherTxId = '', tnTxId = ''):
+        raise NotImplementedError
+
+#error table related
+    def insError(self, sourceAddress, targetAddress, tnTxId, otherTxId, amount, error, exception = ''):
+        raise NotImplementedError
+
+    def insErrorBulk(self, rows):
+        raise NotImplementedError
+
+    def getErrors(self):
+        raise NotImplementedError
+
+    def getError(self, sourceAddress = '', targetAddress = ''):
+        raise NotImplementedError
+
+#verified table related
+    def getVerifiedAll(self):
+        raise NotImplementedError
+
+    def getUnVerified(self):
+        raise NotImplementedError
+
+    def getVerified(self, tx):
+        #the block, None for unknown tx
+        raise NotImplementedError
+
+    def insVerified(self, chain, tx, block):
+        #also updates the stored verification block of the executed rows of tx
+        raise NotImplementedError
+
+    def insVerifiedBulk(self, rows):
+        raise NotImplementedError
+
+#other
+    def checkTXs(self, address):
+        raise NotImplementedError
+
+    def getFees(self, fromdate, todate):
+        raise NotImplementedError
+
+#dailystats table related, rolled up from executed
+    def rebuildRollups(self):
+        raise NotImplementedError
+
+    def getDailyStats(self, fromdate, todate):
+        #list of {'day', 'direction', 'txcount', 'volume', 'fees'}
+        raise NotImplementedError
+
+#addresspool table related, deposit addresses generated ahead of the tunnels that use them
+    def insPoolAddresses(self, addresses):
+        raise NotImplementedError
+
+    def claimPoolAddresses(self, count = 1):
+        #removes up to count addresses from the pool in one statement and returns them, oldest first
+        raise NotImplementedError
+
+    def delPoolAddresses(self, addresses):
+        #removes the given addresses from the pool, e.g. the ones another store already handed out
+        raise NotImplementedError
+
+    def getPoolSize(self):
+        raise NotImplementedError
+
+#latency table related, when each transfer passed the stages from the user's transaction to its completed payout.
+#times are unix seconds, stages not reached yet are None
+    def insLatency(self, sourceTxId, direction, blockTime, detected):
+        #the first detection of a transfer wins, a rescanned block does not move it
+        raise NotImplementedError
+
+    def updLatency(self, stage, at, sourceTxId = '', payoutTxId = ''):
+        #stage is 'sent' (by sourceTxId, also stores payoutTxId), 'confirmed' or 'completed' (by payoutTxId).
+        #only the first time a stage is reached is kept
+        raise NotImplementedError
+
+    def getLatencies(self, since):
+        #rows of (direction, blockTime, detected, sent, confirmed, completed) of the transfers detected since
+        raise NotImplementedError
+
+#addressstatus table related, the deposit and withdraw status per address as verifier.checkTX reports it.
+#every write to tunnel, executed, verified and errors recalculates the affected addresses, so a check is one read
+    def getAddressStatus(self, address, side):
+        #(status, tx, block, error) for side 'target' (deposits) or 'source' (withdraws), {} for unknown addresses
+        raise NotImplementedError
+
+    def updAddressStatus(self, rows, pending = None):
+        #rows of (address, side, status, tx, block, error), pending are ids of getPendingStatus the rows settle
+        raise NotImplementedError
+
+    def getPendingStatus(self, keys = None):
+        #rows of (id, address, side) of the pairs a write changed that were not refreshed yet, all of them or those of keys.
+        #the sql backends mark them in the transaction of the write, createStatus refreshes what a crash left behind
+        raise NotImplementedError
+
+    def getAddressStatuses(self, addresses, side):
+        #address -> (status, tx, block, error) for the known ones of addresses
+        raise NotImplementedError
+
+    def getStatusAddresses(self):
+        #rows of (address, side) for every address the projection holds
+        raise NotImplementedError
+
+    def initStatus(self, config):
+        self.statusCache = ttlCache(config['main'].get('status-ttl', 2))
+        self.statusLock = threading.Lock()
+
+    def getStatus(self, address, side):
+        key = (address, side)
+        result = self.statusCache.get(key)
+
+        if result is None:
+            row = self.getAddressStatus(address, side)
+
+            if len(row) == 0:
+                #nothing was ever written for the address
+                result = {'status': '', 'tx': '', 'block': '', 'error': 'no tx found'}
+            else:
+                result = {'status': row[0], 'tx': row[1], 'block': '' if row[2] is None else row[2], 'error': row[3]}
+
+            self.statusCache.set(key, result)
+
+        return dict(result)
+
+    def getStatuses(self, addresses, side):
+        #getStatus for many addresses, everything the cache does not have is read in one go
+        results = {}
+        missing = []
+
+        for address in addresses:
+            result = self.statusCache.get((address, side))
+
+            if result is None:
+                missing.append(address)
+            else:
+                results[address] = dict(result)
+
+        if len(missing) > 0:
+            rows = self.getAddressStatuses(missing, side)
+
+            for address in missing:
+                if address in rows:
+                    row = rows[address]
+                    result = {'status': row[0], 'tx': row[1], 'block': '' if row[2] is None else row[2], 'error': row[3]}
+                else:
+                    result = {'status': '', 'tx': '', 'block': '', 'error': 'no tx found'}
+
+                self.statusCache.set((address, side), result)
+                results[address] = dict(result)
+
+        return results
+
+    def addressStatus(self, address, side):
+        #calculates the status from the tables, the tunnel is always looked up by its target
+        result = {'status': '', 'tx': '', 'block': '', 'error': ''}
+        tx = self.getTunnelStatus(targetAddress=address)
+
+        if len(tx) != 0:
+            result['status'] = tx[0][0]
+
+            if result['status'] == "error":
+                if side == 'target':
+                    resexec = self.getError(targetAddress=address)
+                else:
+                    resexec = self.getError(sourceAddress=address)
+
+                if len(resexec) != 0:
+                    result['error'] = resexec[0][0]
+                    if side == 'target':
+                        result['tx'] = resexec[0][2]
+                    else:
+                        result['tx'] = resexec[0][1]
+
+                return result
+            elif result['status'] != "sending" and result['status'] != "verifying":
+                return result
+
+        if side == 'target':
+            tx = self.getExecuted(targetAddress=address)
+        else:
+            tx = self.getExecuted(sourceAddress=address)
+
+        if len(tx) == 0:
+            result['error'] = 'no tx found'
+        else:
+            result['tx'] = tx[0][0]
+            block = self.getVerified(result['tx'])
+            result['block'] = 0 if block is None else block
+
+        return result
+
+    def refreshStatus(self, addresses):
+        #recalculates the (address, side) pairs after a write, serialised so an older result never wins
+        keys = statusKeys(addresses)
+        if len(keys) == 0:
+            return
+
+        with self.statusLock:
+            #only marks committed before the status is read are settled by it
+            pending = [row[0] for row in self.getPendingStatus(keys)]
+            rows = []
+            results = []
+            for address, side in keys:
+                result = self.addressStatus(address, side)
+                rows.append((address, side, result['status'], result['tx'], None if result['block'] == '' else result['block'], result['error']))
+                results.append((address, side, result))
+
+            self.updAddressStatus(rows, pending)
+
+            for address, side, result in results:
+                self.statusCache.invalidate((address, side))
+                hub.publish(address, side, result)
+
+    def tunnelsChanged(self, targetAddresses):
+        self.refreshStatus(tunnelKeys(targetAddresses))
+
+    def tunnelsCreated(self, targetAddresses):
+        #a new tunnel is the newest one of its target, so both sides are 'created' without reading anything
+        keys = tunnelKeys(targetAddresses)
+        if len(keys) == 0:
+            return
+
+        with self.statusLock:
+            pending = [row[0] for row in self.getPendingStatus(keys)]
+            self.updAddressStatus([(address, side, 'created', '', None, '') for address, side in keys], pending)
+
+            for address, side in keys:
+                self.statusCache.invalidate((address, side))
+                hub.publish(address, side, {'status': 'created', 'tx': '', 'block': '', 'error': ''})
+
+    def executedChanged(self, rows):
+        #rows of (sourceAddress, targetAddress) written to executed or errors
+        self.refreshStatus(executedKeys(rows))
+
+    def verifiedChanged(self, txs):
+        keys = []
+
+        for tx in txs:
+            row = self.getExecuted(tnTxId=tx)
+            if len(row) > 0:
+                keys.append((row[0][2], 'target'))
+
+            row = self.getExecuted(otherTxId=tx)
+            if len(row) > 0:
+                keys.append((row[0][1], 'source'))
+
+        self.refreshStatus(keys)
+
+    def rebuildStatus(self):
+        self.refreshStatus(self.getStatusAddresses())
+        self.statusCache.clear()
+
+    def dateRange(self, fromdate, todate):
+        #check date notation, invalid or missing dates fall back to everything up to today
+        if len(fromdate) != 0:
+            fromyear,frommonth,fromday = fromdate.split('-')
+
+            isValidFromDate = True
+            try :
+                fromdate = datetime.datetime(int(fromyear),int(frommonth),int(fromday)).strftime('%Y-%m-%d')
+            except ValueError :
+                isValidFromDate = False
+        else:
+            isValidFromDate = False
+
+        if len(todate) != 0:
+            toyear,tomonth,today = todate.split('-')
+
+            isValidtoDate = True
+            try :
+                todate = datetime.datetime(int(toyear),int(tomonth),int(today)).strftime('%Y-%m-%d')
+            except ValueError :
+                isValidtoDate = False
+        else:
+            isValidtoDate = False
+
+        if not isValidFromDate:
+            fromdate = '1990-01-01'
+
+        if not isValidtoDate:
+            todat = datetime.date.today() + timedelta(days=1)
+            todate = todat.strftime('%Y-%m-%d')
+
+        return fromdate, todate
@@ -0,0 +1,493 @@
+import collections
+import datetime
+import itertools
+import threading
+
+import metrics
+from dbInterface import dbInterface, dailyTotals, executedRows, txDirection, LATENCYSTAGES
+
+class dbMemCalls(dbInterface):
+    #keeps everything in process memory, for benchmarks and load tests of the scanning and payout paths
+    #without any disk or database I/O. rows have the same layout as the SQLite tables, nothing is persisted
+    def __init__(self, config):
+        self.config = config
+        self.lock = threading.RLock()
+        self.ids = itertools.count(1)
+
+        self.heights = collections.OrderedDict()
+        self.tunnels = collections.OrderedDict()
+        self.executed = collections.OrderedDict()
+        self.errors = collections.OrderedDict()
+        self.verified = collections.OrderedDict()
+        self.dailystats = {}
+        self.addressstatus = {}
+        self.addresspool = collections.OrderedDict()
+        self.latency = collections.OrderedDict()
+        self.latencyByPayout = {}
+
+        #secondary indexes, address or txid -> ids
+        self.tunnelsBySource = collections.defaultdict(list)
+        self.tunnelsByTarget = collections.defaultdict(list)
+        self.executedBy = collections.defaultdict(list)
+
+        self.initStatus(config)
+
+    def now(self):
+        return datetime.datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+
+#DB Setup part
+    def createdb(self):
+        pass
+
+#heights table related
+    def lastScannedBlock(self, chain):
+        with self.lock:
+            if chain in self.heights:
+                return self.heights[chain][2]
+            else:
+                return 0
+
+    def getHeights(self):
+        with self.lock:
+            qryResult = [(row[1], row[2]) for row in self.heights.values()]
+
+        if len(qryResult) > 0:
+            return qryResult
+        else:
+            return {}
+
+    def updHeights(self, block, chain):
+        with self.lock:
+            if chain in self.heights:
+                row = self.heights[chain]
+                self.heights[chain] = (row[0], chain, block)
+
+    def insHeights(self, block, chain):
+        with self.lock:
+            self.heights[chain] = (next(self.ids), chain, block)
+
+#tunnel table related
+    def doWeHaveTunnels(self):
+        with self.lock:
+            return any(row[4] == 'created' for row in self.tunnels.values())
+
+    def getTargetAddress(self, sourceAddress):
+        with self.lock:
+            for id in self.tunnelsBySource.get(sourceAddress, []):
+                if self.tunnels[id][4] != 'error':
+                    return self.tunnels[id][2]
+
+        return {}
+
+    def getSourceAddress(self, targetAddress):
+        with self.lock:
+            if targetAddress == '':
+                qryResult = [(row[1],) for row in self.tunnels.values() if row[4] == 'created']
+            else:
+                qryResult = [(self.tunnels[id][1],) for id in self.tunnelsByTarget.get(targetAddress, []) if self.tunnels[id][4] != 'error']
+
+        if len(qryResult) > 0:
+            return qryResult
+        else:
+            return {}
+
+    def getTunnelStatus(self, targetAddress = '', sourceAddress = ''):
+        with self.lock:
+            if targetAddress != '':
+                ids = self.tunnelsByTarget.get(targetAddress, [])
+            elif sourceAddress != '':
+                ids = self.tunnelsBySource.get(sourceAddress, [])
+            else:
+                return {}
+
+            if len(ids) > 0:
+                return [(self.tunnels[ids[-1]][4],)]
+            else:
+                return {}
+
+    def getTunnels(self, status = ''):
+        if status == '':
+            return {}
+
+        with self.lock:
+            qryResult = [(row[1], row[2]) for row in self.tunnels.values() if row[4] == status]
+
+        if len(qryResult) > 0:
+            return qryResult
+        else:
+            return {}
+
+    def insTunnel(self, status, sourceAddress, targetAddress):
+        with self.lock:
+            #same as the partial unique index of the SQL backends
+            if status == 'created' and any(self.tunnels[id][4] == 'created' for id in self.tunnelsByTarget.get(targetAddress, [])):
+                raise ValueError('a created tunnel for ' + targetAddress + ' already exists')
+
+            id = next(self.ids)
+            self.tunnels[id] = (id, sourceAddress, targetAddress, self.now(), status)
+            self.tunnelsBySource[sourceAddress].append(id)
+            self.tunnelsByTarget[targetAddress].append(id)
+
+        self.tunnelsChanged([targetAddress])
+
+    def insTunnelBulk(self, rows):
+        for status, sourceAddress, targetAddress in rows:
+            self.insTunnel(status, sourceAddress, targetAddress)
+
+    def createOrGetTunnel(self, targetAddress, sourceAddress = ''):
+        with self.lock:
+            for id in self.tunnelsByTarget.get(targetAddress, []):
+                if self.tunnels[id][4] != 'error':
+                    return self.tunnels[id][1], False
+
+            if sourceAddress == '':
+                claimed = self.claimPoolAddresses(1)
+
+                if len(claimed) == 0:
+                    return '', False
+
+                sourceAddress = claimed[0]
+
+            id = next(self.ids)
+            self.tunnels[id] = (id, sourceAddress, targetAddress, self.now(), 'created')
+            self.tunnelsBySource[sourceAddress].append(id)
+            self.tunnelsByTarget[targetAddress].append(id)
+
+        self.tunnelsChanged([targetAddress])
+
+        return sourceAddress, True
+
+    def createOrGetTunnels(self, targetAddresses, sourceAddresses = None):
+        if sourceAddresses is None:
+            sourceAddresses = [''] * len(targetAddresses)
+
+        result = {}
+        for targetAddress, sourceAddress in zip(targetAddresses, sourceAddresses):
+            if targetAddress not in result:
+                result[targetAddress] = self.createOrGetTunnel(targetAddress, sourceAddress)
+
+        return result
+
+    def updTunnel(self, status, sourceAddress, targetAddress, statusOld = ''):
+        if statusOld == '':
+            statusOld = 'created'
+
+        with self.lock:
+            for id in self.tunnelsBySource.get(sourceAddress, []):
+                row = self.tunnels[id]
+                if row[2] == targetAddress and row[4] == statusOld:
+                    self.tunnels[id] = (id, sourceAddress, targetAddress, self.now(), status)
+
+        self.tunnelsChanged([targetAddress])
+
+    def delTunnel(self, sourceAddress, targetAddress):
+        with self.lock:
+            for id in list(self.tunnelsBySource.get(sourceAddress, [])):
+                if self.tunnels[id][2] == targetAddress:
+                    del self.tunnels[id]
+                    self.tunnelsBySource[sourceAddress].remove(id)
+                    self.tunnelsByTarget[targetAddress].remove(id)
+
+        self.tunnelsChanged([targetAddress])
+
+#executed table related
+    def insExecuted(self, sourceAddress, targetAddress, otherTxId, tnTxId, amount, amountFee, direction = ''):
+        if direction == '':
+            direction = txDirection(targetAddress)
+
+        with self.lock:
+            id = next(self.ids)
+            self.executed[id] = (id, sourceAddress, targetAddress, tnTxId, otherTxId, self.now(), amount, amountFee, direction, self.getVerified(tnTxId), self.getVerified(otherTxId))
+
+            for key in (('source', sourceAddress), ('target', targetAddress), ('other', otherTxId), ('tn', tnTxId)):
+                self.executedBy[key].append(id)
+
+            self.addRollup(self.executed[id][5][:10], {direction: (1, amount or 0, amountFee or 0)})
+
+        self.executedChanged([(sourceAddress, targetAddress)])
+
+    def insExecutedBulk(self, rows):
+        for row in executedRows(rows):
+            self.insExecuted(*row)
+
+    def updExecuted(self, id, sourceAddress, targetAddress, otherTxId, tnTxId, amount, amountFee):
+        with self.lock:
+            if id in self.executed:
+                old = self.executed[id]
+                for key in (('source', old[1]), ('target', old[2]), ('other', old[4]), ('tn', old[3])):
+                    self.executedBy[key].remove(id)
+
+                self.executed[id] = (id, sourceAddress, targetAddress, tnTxId, otherTxId, old[5], amount, amountFee) + old[8:]
+                for key in (('source', sourceAddress), ('target', targetAddress), ('other', otherTxId), ('tn', tnTxId)):
+                    self.executedBy[key].append(id)
+
+        self.executedChanged([(sourceAddress, targetAddress)])
+
+    def didWeSendTx(self, txid):
+        with self.lock:
+            return len(self.executedBy.get(('other', txid), [])) > 0 or len(self.executedBy.get(('tn', txid), [])) > 0
+
+    def getExecutedAll(self):
+        with self.lock:
+            qryResult = list(self.executed.values())
+
+        if len(qryResult) > 0:
+            return qryResult
+        else:
+            return {}
+
+    def getExecuted(self, sourceAddress = '', targetAddress = '', otherTxId = '', tnTxId = ''):
+        with self.lock:
+            if sourceAddress != '':
+                ids = self.executedBy.get(('source', sourceAddress), [])
+                column = 4
+            elif targetAddress != '':
+                ids = self.executedBy.get(('target', targetAddress), [])
+                column = 3
+            elif otherTxId != '':
+                ids = self.executedBy.get(('other', otherTxId), [])
+                column = None
+            elif tnTxId != '':
+                ids = self.executedBy.get(('tn', tnTxId), [])
+                column = None
+            else:
+                return {}
+
+            if len(ids) == 0:
+                return {}
+
+            row = self.executed[max(ids)]
+
+        if column is None:
+            return [row]
+        else:
+            return [(row[column],)]
+
+#error table related
+    def insError(self, sourceAddress, targetAddress, tnTxId, otherTxId, amount, error, exception = ''):
+        with self.lock:
+            id = next(self.ids)
+            self.errors[id] = (id, sourceAddress, targetAddress, tnTxId, otherTxId, self.now(), amount, error, exception)
+
+        self.executedChanged([(sourceAddress, targetAddress)])
+
+    def insErrorBulk(self, rows):
+        for row in rows:
+            self.insError(*row)
+
+    def getErrors(self):
+        with self.lock:
+            qryResult = list(self.errors.values())
+
+        if len(qryResult) > 0:
+            return qryResult
+        else:
+            return {}
+
+    def getError(self, sourceAddress = '', targetAddress = ''):
+        if sourceAddress != '':
+            column = 1
+            address = sourceAddress
+        elif targetAddress != '':
+            column = 2
+            address = targetAddress
+        else:
+            return {}
+
+        with self.lock:
+            for row in reversed(self.errors.values()):
+                if row[column] == address:
+                    return [(row[7], row[3], row[4])]
+
+        return {}
+
+#verified table related
+    def getVerifiedAll(self):
+        with self.lock:
+            qryResult = list(self.verified.values())
+
+        if len(qryResult) > 0:
+            return qryResult
+        else:
+            return {}
+
+    def getUnVerified(self):
+        with self.lock:
+            qryResult = [row for row in self.verified.values() if row[3] == 0]
+
+        if len(qryResult) > 0:
+            return qryResult
+        else:
+            return {}
+
+    def getVerified(self, tx):
+        with self.lock:
+            if tx in self.verified:
+                return self.verified[tx][3]
+            else:
+                return None
+
+    def insVerified(self, chain, tx, block):
+        with self.lock:
+            if tx in self.verified:
+                row = self.verified[tx]
+                self.verified[tx] = (row[0], row[1], tx, block)
+            else:
+                self.verified[tx] = (next(self.ids), chain, tx, block)
+
+            #keep the copies on executed in step
+            for id in self.executedBy.get(('tn', tx), []):
+                row = self.executed[id]
+                self.executed[id] = row[:9] + (block,) + row[10:]
+            for id in self.executedBy.get(('other', tx), []):
+                row = self.executed[id]
+                self.executed[id] = row[:10] + (block,)
+
+        self.verifiedChanged([tx])
+
+    def insVerifiedBulk(self, rows):
+        for row in rows:
+            self.insVerified(*row)
+
+#other
+    def checkTXs(self, address):
+        with self.lock:
+            if address == '':
+                rows = list(self.executed.values())
+            else:
+                ids = set(self.executedBy.get(('source', address), []) + self.executedBy.get(('target', address), []))
+                rows = [self.executed[id] for id in sorted(ids)]
+
+            tx = []
+            for row in rows:
+                tnBlock = row[9]
+                otherBlock = row[10]
+                deposit = row[8] == 'Deposit'
+
+                if deposit and tnBlock is not None:
+                    status = 'verified'
+                elif not deposit and otherBlock is not None and otherBlock != 0:
+                    status = 'verified'
+                else:
+                    status = 'unverified'
+
+                tx.append({'sourceAddress': row[1], 'targetAddress': row[2], 'tnTxId': row[3], 'OtherTxId': row[4], 'TNVerBlock': tnBlock or 0, 'OtherVerBlock': otherBlock or 0, 'amount': row[6], 'TypeTX': row[8], 'Status': status})
+
+        if len(tx) == 0:
+            return {'error': 'no tx found'}
+        else:
+            return tx
+
+    def getFees(self, fromdate, todate):
+        fromdate, todate = self.dateRange(fromdate, todate)
+
+        with self.lock:
+            Fees = sum(stats[2] for (day, direction), stats in self.dailystats.items() if fromdate <= day < todate)
+
+        return { 'totalFees': Fees }
+
+#dailystats table related
+    def addRollup(self, day, totals):
+        for direction, (txcount, volume, fees) in totals.items():
+            old = self.dailystats.get((day, direction), (0, 0, 0))
+            self.dailystats[(day, direction)] = (old[0] + txcount, old[1] + volume, old[2] + fees)
+
+    def rebuildRollups(self):
+        with self.lock:
+            self.dailystats = {}
+
+            for row in self.executed.values():
+                self.addRollup(row[5][:10], dailyTotals([(row[1], row[2], row[4], row[3], row[6], row[7], row[8])]))
+
+    def getDailyStats(self, fromdate, todate):
+        fromdate, todate = self.dateRange(fromdate, todate)
+
+        with self.lock:
+            qryResult = sorted((day, direction, stats) for (day, direction), stats in self.dailystats.items() if fromdate <= day < todate)
+
+        return [{'day': day, 'direction': direction, 'txcount': stats[0], 'volume': stats[1], 'fees': stats[2]} for day, direction, stats in qryResult]
+
+#addressstatus table related
+    def getAddressStatus(self, address, side):
+        with self.lock:
+            return self.addressstatus.get((address, side), {})
+
+    def updAddressStatus(self, rows, pending = None):
+        with self.lock:
+            for address, side, status, tx, block, error in rows:
+                self.addressstatus[(address, side)] = (status, tx, block, error)
+
+    def getPendingStatus(self, keys = None):
+        #nothing outlives the process, so there is nothing to repair after a crash
+        return []
+
+    def getAddressStatuses(self, addresses, side):
+        with self.lock:
+            return dict((address, self.addressstatus[(address, side)]) for address in addresses if (address, side) in self.addressstatus)
+
+    def getStatusAddresses(self):
+        with self.lock:
+            keys = set()
+
+            for row in self.tunnels.values():
+                keys.add((row[2], 'target'))
+                keys.add((row[2], 'source'))
+            for row in list(self.executed.values()) + list(self.errors.values()):
+                keys.add((row[2], 'target'))
+                keys.add((row[1], 'source'))
+
+        return list(keys)
+
+#addresspool table related
+    def insPoolAddresses(self, addresses):
+        with self.lock:
+            for address in addresses:
+                if address not in self.addresspool:
+                    self.addresspool[address] = self.now()
+
+    def claimPoolAddresses(self, count = 1):
+        with self.lock:
+            claimed = list(self.addresspool)[:count]
+
+            for address in claimed:
+                del self.addresspool[address]
+
+        return claimed
+
+    def delPoolAddresses(self, addresses):
+        with self.lock:
+            for address in addresses:
+                self.addresspool.pop(address, None)
+
+    def getPoolSize(self):
+        with self.lock:
+            return len(self.addresspool)
+
+#latency table related
+    def insLatency(self, sourceTxId, direction, blockTime, detected):
+        with self.lock:
+            if sourceTxId not in self.latency:
+                self.latency[sourceTxId] = {'payoutTxId': None, 'direction': direction, 'blockTime': blockTime, 'detected': detected, 'sent': None, 'confirmed': None, 'completed': None}
+
+    def updLatency(self, stage, at, sourceTxId = '', payoutTxId = ''):
+        if stage not in LATENCYSTAGES:
+            raise ValueError('unknown latency stage ' + stage)
+
+        with self.lock:
+            if stage == 'sent':
+                row = self.latency.get(sourceTxId)
+
+                if row is not None:
+                    row['payoutTxId'] = payoutTxId
+                    self.latencyByPayout[payoutTxId] = row
+            else:
+                row = self.latencyByPayout.get(payoutTxId)
+
+            if row is not None and row[stage] is None:
+                row[stage] = at
+
+    def getLatencies(self, since):
+        with self.lock:
+            return [(row['direction'], row['blockTime'], row['detected'], row['sent'], row['confirmed'], row['completed']) for row in self.latency.values() if row['detected'] >= since]
+
+metrics.instrument(dbMemCalls, 'gateway_db_seconds', 'duration of storage calls by backend and method', dbInterface.methods(), stage='db', backend='memory')
@@ -1,42 +1,164 @@
 import psycopg2 as pgdb
 from psycopg2 import sql
 from psycopg2 import pool
-from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT, TRANSACTION_STATUS_IDLE, connection as pgConnection, cursor as pgCursor
+from psycopg2.extras import execute_values
 
-from datetime import timedelta
-import datetime
-import os
+import contextlib
+import threading
+import time
+import logs
+import metrics
+import queryLog
+
+from dbInterface import dbInterface, configureQueryLog, dailyTotals, executedKeys, executedRows, tunnelKeys, txDirection, LATENCYSTAGES
+from pgImporter import sqliteImporter
+
+log = logs.get(__name__)
+
+class timedCursor(pgCursor):
+    #every statement is timed for the query log, execute_values hands over its pages with the values inlined as bytes
+    def execute(self, query, vars = None):
+        start = time.perf_counter()
+
+        try:
+            return super().execute(query, vars)
+        finally:
+            seconds = time.perf_counter() - start
+
+            if isinstance(query, bytes):
+                queryLog.record('postgres', query.decode('utf-8', 'replace'), seconds, explain=self.explain, inlined=True)
+            else:
+                if not isinstance(query, str):
+                    query = query.as_string(self.connection)
+
+                queryLog.record('postgres', query, seconds, vars, explain=self.explain)
+
+    def explain(self, statement, params):
+        #EXPLAIN without ANALYZE, nothing is executed. prepared statements are explained through EXPLAIN EXECUTE
+        cursor = self.connection.cursor(cursor_factory=pgCursor)
+        cursor.execute('EXPLAIN ' + statement, params)
+        lines = [row[0] for row in cursor.fetchall()]
+        cursor.close()
+
+        return lines
+
+class pooledConnection(pgConnection):
+    #autocommit is set once per connection, the names of the statements prepared on it are kept with it
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        self.prepared = set()
+
+class dbPGCalls(dbInterface):
+    #hot path statements, prepared once per connection and then executed by name
+    PREPARED = {
+        'gettargetaddress': 'SELECT targetaddress FROM tunnel WHERE "status" <> $1 AND sourceaddress = $2',
+        'didwesendtx': 'SELECT 1 FROM executed WHERE (othertxid = $1 OR tntxid = $1) LIMIT 1',
+        'getexecutedsource': 'SELECT othertxid FROM executed WHERE sourceaddress = $1 ORDER BY id DESC LIMIT 1',
+        'getexecutedtarget': 'SELECT tntxid FROM executed WHERE targetaddress = $1 ORDER BY id DESC LIMIT 1',
+        'getexecutedother': 'SELECT id, sourceaddress, targetaddress, tntxid, othertxid, timestamp, amount, amountFee, direction, tnverblock, otherverblock FROM executed WHERE othertxid = $1 ORDER BY id DESC LIMIT 1',
+        'getexecutedtn': 'SELECT id, sourceaddress, targetaddress, tntxid, othertxid, timestamp, amount, amountFee, direction, tnverblock, otherverblock FROM executed WHERE tntxid = $1 ORDER BY id DESC LIMIT 1',
+        'getverified': 'SELECT block FROM verified WHERE tx = $1',
+        'updverified': 'UPDATE verified SET "block" = $2 WHERE tx = $1',
+        'insverified': 'INSERT INTO verified ("chain", "tx", "block") VALUES ($1, $2, $3)',
+        'updexecutedtn': 'UPDATE executed SET tnverblock = $2 WHERE tntxid = $1',
+        'updexecutedother': 'UPDATE executed SET otherverblock = $2 WHERE othertxid = $1',
+        'getaddressstatus': 'SELECT status, tx, block, error FROM addressstatus WHERE address = $1 AND side = $2',
+        'createorgettunnel': "WITH existing AS (SELECT sourceaddress FROM tunnel WHERE targetaddress = $1::text AND status <> 'error' ORDER BY id LIMIT 1), "
+                             "claimed AS (DELETE FROM addresspool WHERE $2::text = '' AND id = (SELECT id FROM addresspool WHERE NOT EXISTS (SELECT 1 FROM existing) ORDER BY id LIMIT 1 FOR UPDATE SKIP LOCKED) RETURNING address), "
+                             "source AS (SELECT address FROM claimed UNION ALL SELECT $2 WHERE $2 <> '' AND NOT EXISTS (SELECT 1 FROM existing)), "
+                             "ins AS (INSERT INTO tunnel (sourceaddress, targetaddress, status, timestamp) SELECT address, $1, 'created', CURRENT_TIMESTAMP FROM source ON CONFLICT DO NOTHING RETURNING sourceaddress) "
+                             "SELECT sourceaddress, true FROM ins UNION ALL SELECT sourceaddress, false FROM existing UNION ALL SELECT '', false WHERE NOT EXISTS (SELECT 1 FROM existing) AND NOT EXISTS (SELECT 1 FROM source)",
+        'claimpooladdresses': 'DELETE FROM addresspool WHERE id IN (SELECT id FROM addresspool ORDER BY id LIMIT $1 FOR UPDATE SKIP LOCKED) RETURNING id, address'
+    }
 
-class dbPGCalls(object):
     def __init__(self, config):
         self.config = config
+        self.initStatus(config)
+        configureQueryLog(config)
+
+        minconn = self.config['postgres'].get('minconn', 1)
+        maxconn = self.config['postgres'].get('maxconn', 10)
+        self.available = threading.BoundedSemaphore(maxconn)
 
         try:
-            self.psPool = pgdb.pool.ThreadedConnectionPool(1, 10,database=config['main']['name'], user=self.config["postgres"]["pguser"], password=self.config["postgres"]["pgpswd"], host=self.config["postgres"]["pghost"], port=self.config["postgres"]["pgport"])
+            self.psPool = pgdb.pool.ThreadedConnectionPool(minconn, maxconn, database=config['main']['name'], user=self.config["postgres"]["pguser"], password=self.config["postgres"]["pgpswd"], host=self.config["postgres"]["pghost"], port=self.config["postgres"]["pgport"], connection_factory=pooledConnection, cursor_factory=timedCursor)
             dbCon = self.psPool.getconn()
-            #self.dbCon = pgdb.connect(database=config['main']['name'], user=self.config["postgres"]["pguser"], password=self.config["postgres"]["pgpswd"], host=self.config["postgres"]["pghost"], port=self.config["postgres"]["pgport"])
-            #self.dbCon.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
             self.psPool.putconn(dbCon)
         except:
-            self.dbCon = pgdb.connect(user=self.config["postgres"]["pguser"], password=self.config["postgres"]["pgpswd"], host=self.config["postgres"]["pghost"], port=self.config["postgres"]["pgport"])
-            self.dbCon.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            dbCon = pgdb.connect(user=self.config["postgres"]["pguser"], password=self.config["postgres"]["pgpswd"], host=self.config["postgres"]["pghost"], port=self.config["postgres"]["pgport"])
+            dbCon.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
             sqlstr = sql.SQL('CREATE DATABASE {};').format(sql.Identifier(self.config['main']['name']))
-            cursor = self.dbCon.cursor()
+            cursor = dbCon.cursor()
             cursor.execute(sqlstr)
             cursor.close()
-            self.dbCon.close()
+            dbCon.close()
 
-            self.psPool = pgdb.pool.ThreadedConnectionPool(1, 10,database=config['main']['name'], user=self.config["postgres"]["pguser"], password=self.config["postgres"]["pgpswd"], host=self.config["postgres"]["pghost"], port=self.config["postgres"]["pgport"])
-            #self.dbCon = pgdb.connect(database=config['main']['name'], user=self.config["postgres"]["pguser"], password=self.config["postgres"]["pgpswd"], host=self.config["postgres"]["pghost"], port=self.config["postgres"]["pgport"])
-            #self.dbCon.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            self.psPool = pgdb.pool.ThreadedConnectionPool(minconn, maxconn, database=config['main']['name'], user=self.config["postgres"]["pguser"], password=self.config["postgres"]["pgpswd"], host=self.config["postgres"]["pghost"], port=self.config["postgres"]["pgport"], connection_factory=pooledConnection, cursor_factory=timedCursor)
 
     def openConn(self):
-        dbCon = self.psPool.getconn()
-        dbCon.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        #a pooled connection per call, handed back in closeConn. waits for a free one instead of
+        #failing with PoolError when all maxconn connections are in use
+        self.available.acquire()
+
+        try:
+            dbCon = self.psPool.getconn()
+
+            while dbCon.closed:
+                self.psPool.putconn(dbCon, close=True)
+                dbCon = self.psPool.getconn()
+        except:
+            self.available.release()
+            raise
+
         return dbCon
 
     def closeConn(self, dbCon):
-        self.psPool.putconn(dbCon)
+        #also after a failed statement: a transaction left open is rolled back, a broken connection is closed,
+        #and the slot is always given back
+        try:
+            close = dbCon.closed
+
+            if not close and dbCon.info.transaction_status != TRANSACTION_STATUS_IDLE:
+                #rollback() does nothing on an autocommit connection, the BEGIN of the caller is ended explicitly
+                try:
+                    cursor = dbCon.cursor(cursor_factory=pgCursor)
+                    cursor.execute('ROLLBACK')
+                    cursor.close()
+                except pgdb.Error:
+                    close = True
+
+            self.psPool.putconn(dbCon, close=close or dbCon.closed)
+        finally:
+            self.available.release()
+
+    @contextlib.contextmanager
+    def connection(self):
+        #a cursor on a pooled connection, handed back however the block ends
+        dbCon = self.openConn()
+
+        try:
+            cursor = dbCon.cursor()
+
+            try:
+                yield cursor
+            finally:
+                if not cursor.closed and not dbCon.closed:
+                    cursor.close()
+        finally:
+            self.closeConn(dbCon)
+
+    def close(self):
+        self.psPool.closeall()
+
+    def execPrepared(self, cursor, name, values):
+        #prepared statements live as long as the pooled connection they were prepared on
+        if name not in cursor.connection.prepared:
+            cursor.execute('PREPARE ' + name + ' AS ' + self.PREPARED[name])
+            cursor.connection.prepared.add(name)
+
+        cursor.execute('EXECUTE ' + name + ' (' + ', '.join(['%s'] * len(values)) + ')', values)
 
 #DB Setup part
     def createdb(self):
@@ -67,7 +189,10 @@ class dbPGCalls(object):
                 timestamp timestamp
                 default current_timestamp,
                 amount real,
-                amountFee real
+                amountFee real,
+                direction text,
+                tnverblock integer,
+                otherverblock integer
         );
         '''
         createTableErrors = '''
@@ -93,90 +218,164 @@ class dbPGCalls(object):
             );
         '''
 
-        dbCon = self.openConn()
-        cursor = dbCon.cursor()
-        cursor.execute(sql.SQL(createHeightTable))
-        cursor.execute(sql.SQL(createTunnelTable))
-        cursor.execute(sql.SQL(createTableExecuted))
-        cursor.execute(sql.SQL(createTableErrors))
-        cursor.execute(sql.SQL(createVerifyTable))
-        self.closeConn(dbCon)
+        with self.connection() as cursor:
+            cursor.execute(sql.SQL(createHeightTable))
+            cursor.execute(sql.SQL(createTunnelTable))
+            cursor.execute(sql.SQL(createTableExecuted))
+            cursor.execute(sql.SQL(createTableErrors))
+            cursor.execute(sql.SQL(createVerifyTable))
+
+        self.createDirection()
+        self.createRollups()
+        self.createStatus()
+        self.createPool()
+        self.createLatency()
+        self.createTunnelIndex()
+
+    def createDirection(self):
+        #direction and verification blocks are stored with the executed rows, so checkTXs is an index only scan
+        with self.connection() as cursor:
+            cursor.execute('ALTER TABLE executed ADD COLUMN IF NOT EXISTS direction text, ADD COLUMN IF NOT EXISTS tnverblock integer, ADD COLUMN IF NOT EXISTS otherverblock integer')
+
+            #backfill rows written before, or imported without, these columns
+            cursor.execute("UPDATE executed SET direction = CASE WHEN targetaddress LIKE '3J%' THEN 'Deposit' ELSE 'Withdraw' END, " \
+                           "tnverblock = (SELECT block FROM verified WHERE tx = executed.tntxid LIMIT 1), otherverblock = (SELECT block FROM verified WHERE tx = executed.othertxid LIMIT 1) " \
+                           "WHERE direction IS NULL")
+
+            cursor.execute('CREATE INDEX IF NOT EXISTS executed_source ON executed (sourceaddress) INCLUDE (targetaddress, tntxid, othertxid, amount, direction, tnverblock, otherverblock)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS executed_target ON executed (targetaddress) INCLUDE (sourceaddress, tntxid, othertxid, amount, direction, tnverblock, otherverblock)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS executed_tntxid ON executed (tntxid)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS executed_othertxid ON executed (othertxid)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS verified_tx ON verified (tx)')
+
+    def createRollups(self):
+        createTableDailyStats = '''
+            CREATE TABLE IF NOT EXISTS dailystats (
+                day date NOT NULL,
+                direction text NOT NULL,
+                txcount integer,
+                volume double precision,
+                fees double precision,
+                PRIMARY KEY (day, direction)
+        );
+        '''
 
-#import existing sqlite db
-    def importSQLite(self):
-        import sqlite3
+        with self.connection() as cursor:
+            cursor.execute(createTableDailyStats)
 
-        if self.config["main"]["db-location"] != "":
-            path= os.getcwd()
-            dbfile = path + '/' + self.config["main"]["db-location"] + '/' + 'gateway.db'
-            dbfile = os.path.normpath(dbfile)
-        else:
-            dbfile = 'gateway.db'
-
-        consq=sqlite3.connect(dbfile)
-        cursq=consq.cursor()
-        
-        tabnames=[]
-        
-        cursq.execute("SELECT name FROM sqlite_master WHERE type='table'")
-        tabgrab = cursq.fetchall()
-        for item in tabgrab:
-            tabnames.append(item[0])
+            #fill the rollups once for databases that existed before them
+            cursor.execute('SELECT NOT EXISTS (SELECT 1 FROM dailystats) AND EXISTS (SELECT 1 FROM executed)')
+            empty = cursor.fetchone()[0]
 
-        dbCon = self.openConn()
-        for table in tabnames:
-            cursq.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name = ?;", (table,))
-            create = cursq.fetchone()[0]
-            cursq.execute("SELECT * FROM %s;" %table)
-            rows=cursq.fetchall()
-            if len(rows) == 0:
-                continue
-            colcount=len(rows[0])
-            pholder='%s,'*colcount
-            newholder=pholder[:-1]
-        
+        if empty:
+            self.rebuildRollups()
+
+    def createStatus(self):
+        createTableAddressStatus = '''
+            CREATE TABLE IF NOT EXISTS addressstatus (
+                address text NOT NULL,
+                side text NOT NULL,
+                status text,
+                tx text,
+                block integer,
+                error text,
+                PRIMARY KEY (address, side)
+        );
+        '''
+        createTableStatusPending = '''
+            CREATE TABLE IF NOT EXISTS statuspending (
+                id BIGSERIAL PRIMARY KEY,
+                address text NOT NULL,
+                side text NOT NULL
+        );
+        '''
+
+        with self.connection() as cursor:
+            cursor.execute(createTableAddressStatus)
+            cursor.execute(createTableStatusPending)
+            cursor.execute('CREATE INDEX IF NOT EXISTS statuspending_address ON statuspending (address)')
+
+            #fill the projection once for databases that existed before it
+            cursor.execute('SELECT NOT EXISTS (SELECT 1 FROM addressstatus) AND (EXISTS (SELECT 1 FROM tunnel) OR EXISTS (SELECT 1 FROM executed) OR EXISTS (SELECT 1 FROM errors))')
+            empty = cursor.fetchone()[0]
+
+        if empty:
+            self.rebuildStatus()
+
+        #writes that committed right before a crash, without their status refresh
+        self.refreshStatus([(address, side) for id, address, side in self.getPendingStatus()])
+
+    def createPool(self):
+        createTableAddressPool = '''
+            CREATE TABLE IF NOT EXISTS addresspool (
+                id SERIAL PRIMARY KEY,
+                address text NOT NULL UNIQUE,
+                timestamp timestamp
+                default current_timestamp
+        );
+        '''
+
+        with self.connection() as cursor:
+            cursor.execute(createTableAddressPool)
+
+    def createLatency(self):
+        createTableLatency = '''
+            CREATE TABLE IF NOT EXISTS latency (
+                id SERIAL PRIMARY KEY,
+                sourcetxid text NOT NULL UNIQUE,
+                payouttxid text,
+                direction text NOT NULL,
+                blocktime double precision,
+                detected double precision,
+                sent double precision,
+                confirmed double precision,
+                completed double precision
+        );
+        '''
+
+        with self.connection() as cursor:
+            cursor.execute(createTableLatency)
+            cursor.execute('CREATE INDEX IF NOT EXISTS latency_payout ON latency (payouttxid)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS latency_detected ON latency (detected)')
+
+    def createTunnelIndex(self):
+        with self.connection() as cursor:
+            cursor.execute('CREATE INDEX IF NOT EXISTS tunnel_source ON tunnel (sourceaddress)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS tunnel_target ON tunnel (targetaddress)')
+
+            #only one new tunnel per target, withdraw tunnels start as 'sending' and may share their target
             try:
-                curpg = dbCon.cursor()
-                curpg.execute("DROP TABLE IF EXISTS %s;" %table)
-                curpg.execute(create)
-                curpg.executemany("INSERT INTO %s VALUES (%s);" % (table, newholder),rows)
-
-                if table != 'heights':
-                    curpg.execute("ALTER TABLE %s ALTER id ADD GENERATED ALWAYS AS IDENTITY (START WITH %s);" % (table, len(rows)+1))
-        
-            except Exception as e:
-                self.closeConn(dbCon)
-                print ('Error %s' % e) 
-        
-        self.closeConn(dbCon)
-        consq.close()
+                cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS tunnel_created_target ON tunnel (targetaddress) WHERE status = 'created'")
+            except pgdb.IntegrityError:
+                log.warning("duplicate 'created' tunnels per target found, tunnel creation is not protected by a unique index until they are cleaned up")
+
+#import existing sqlite db
+    def importSQLite(self, chunksize = 0):
+        sqliteImporter(self.config, self, chunksize).run()
+        self.createDirection()
+        self.createRollups()
+        self.createStatus()
 
 #heights table related
     def lastScannedBlock(self, chain):
         sql = 'SELECT height FROM heights WHERE chain = %s'
         values = (chain,)
 
-        dbCon = self.openConn()
-        cursor = dbCon.cursor()
-        cursor.execute(sql, values)
-        qryResult = cursor.fetchall()
-        cursor.close()
-        self.closeConn(dbCon)
+        with self.connection() as cursor:
+            cursor.execute(sql, values)
+            qryResult = cursor.fetchall()
 
         if len(qryResult) > 0:
             return qryResult[0][0]
         else:
-            return {}
+            return 0
 
     def getHeights(self):
         sql = 'SELECT chain, height FROM heights'
 
-        dbCon = self.openConn()
-        cursor = dbCon.cursor()
-        cursor.execute(sql)
-        qryResult = cursor.fetchall()
-        cursor.close()
-        self.closeConn(dbCon)
+        with self.connection() as cursor:
+            cursor.execute(sql)
+            qryResult = cursor.fetchall()
 
         if len(qryResult) > 0:
             return qryResult
@@ -187,33 +386,24 @@ class dbPGCalls(object):
         sql = 'UPDATE heights SET "height" = %s WHERE chain = %s'
         values = (block, chain)
 
-        dbCon = self.openConn()
-        cursor = dbCon.cursor()
-        cursor.execute(sql, values)
-        cursor.close()
-        self.closeConn(dbCon)
+        with self.connection() as cursor:
+            cursor.execute(sql, values)
 
     def insHeights(self, block, chain):
         sql = 'INSERT INTO heights ("chain", "height") VALUES (%s, %s)'
         values = (chain, block)
 
-        dbCon = self.openConn()
-        cursor = dbCon.cursor()
-        cursor.execute(sql, values)
-        cursor.close()
-        self.closeConn(dbCon)
+        with self.connection() as cursor:
+            cursor.execute(sql, values)
 
 #tunnel table related
     def doWeHaveTunnels(self):
         sql = 'SELECT * FROM tunnel WHERE "status" = %s'
         values = ("created", )
 
-        dbCon = self.openConn()
-        cursor = dbCon.cursor()
-        cursor.execute(sql, values)
-        qryResult = cursor.fetchall()
-        cursor.close()
-        self.closeConn(dbCon)
+        with self.connection() as cursor:
+            cursor.execute(sql, values)
+            qryResult = cursor.fetchall()
 
         if len(qryResult) > 0:
             return True
@@ -221,15 +411,11 @@ class dbPGCalls(object):
             return False
 
     def getTargetAddress(self, sourceAddress):
-        sql = 'SELECT targetaddress FROM tunnel WHERE "status" <> %s AND sourceaddress = %s'
         values = ("error", sourceAddress)
 
-        dbCon = self.openConn()
-        cursor = dbCon.cursor()
-        cursor.execute(sql, values)
-        qryResult = cursor.fetchall()
-        cursor.close()
-        self.closeConn(dbCon)
+        with self.connection() as cursor:
+            self.execPrepared(cursor, 'gettargetaddress', values)
+            qryResult = cursor.fetchall()
 
         if len(qryResult) > 0:
             return qryResult[0][0]
@@ -241,25 +427,19 @@ class dbPGCalls(object):
             sql = 'SELECT sourceaddress FROM tunnel WHERE "status" = %s'
             values = ("created",)
 
-            dbCon = self.openConn()
-            cursor = dbCon.cursor()
-            cursor.execute(sql, values)
-            qryResult = cursor.fetchall()
-            cursor.close()
-            self.closeConn(dbCon)
+            with self.connection() as cursor:
+                cursor.execute(sql, values)
+                qryResult = cursor.fetchall()
         else:
             sql = 'SELECT sourceaddress FROM tunnel WHERE "status" <> %s AND targetaddress = %s'
             values = ("error", targetAddress)
 
-            dbCon = self.openConn()
-            cursor = dbCon.cursor()
-            cursor.execute(sql, values)
-            qryResult = cursor.fetchall()
-            cursor.close()
-            self.closeConn(dbCon)
+            with self.connection() as cursor:
+                cursor.execute(sql, values)
+                qryResult = cursor.fetchall()
 
         if len(qryResult) > 0:
-            return qryResult[0][0]
+            return qryResult
         else:
             return {}
 
@@ -273,12 +453,9 @@ class dbPGCalls(object):
         else:
             return {}
 
-        dbCon = self.openConn()
-        cursor = dbCon.cursor()
-        cursor.execute(sql, values)
-        qryResult = cursor.fetchall()
-        cursor.close()
-        self.closeConn(dbCon)
+        with self.connection() as cursor:
+            cursor.execute(sql, values)
+            qryResult = cursor.fetchall()
 
         if len(qryResult) > 0:
             return qryResult
@@ -292,12 +469,9 @@ class dbPGCalls(object):
         else:
             return {}
 
-        dbCon = self.openConn()
-        cursor = dbCon.cursor()
-        cursor.execute(sql, values)
-        qryResult = cursor.fetchall()
-        cursor.close()
-        self.closeConn(dbCon)
+        with self.connection() as cursor:
+            cursor.execute(sql, values)
+            qryResult = cursor.fetchall()
 
         if len(qryResult) > 0:
             return qryResult
@@ -308,11 +482,92 @@ class dbPGCalls(object):
         sql = 'INSERT INTO tunnel ("sourceaddress", "targetaddress", "status", "timestamp") VALUES (%s, %s, %s, CURRENT_TIMESTAMP)'
         values = (sourceAddress, targetAddress, status)
 
-        dbCon = self.openConn()
-        cursor = dbCon.cursor()
-        cursor.execute(sql, values)
-        cursor.close()
-        self.closeConn(dbCon)
+        with self.connection() as cursor:
+            cursor.execute('BEGIN')
+            self.markStatus(cursor, tunnelKeys([targetAddress]))
+            cursor.execute(sql, values)
+            cursor.execute('COMMIT')
+
+        self.tunnelsChanged([targetAddress])
+
+    def insTunnelBulk(self, rows):
+        #rows of (status, sourceAddress, targetAddress)
+        sql = 'INSERT INTO tunnel ("status", "sourceaddress", "targetaddress", "timestamp") VALUES %s'
+
+        with self.connection() as cursor:
+            cursor.execute('BEGIN')
+            self.markStatus(cursor, tunnelKeys([row[2] for row in rows]))
+            execute_values(cursor, sql, rows, template='(%s, %s, %s, CURRENT_TIMESTAMP)')
+            cursor.execute('COMMIT')
+
+        self.tunnelsChanged([row[2] for row in rows])
+
+    def createOrGetTunnel(self, targetAddress, sourceAddress = ''):
+        values = (targetAddress, sourceAddress)
+
+        with self.connection() as cursor:
+            while True:
+                cursor.execute('BEGIN')
+                self.execPrepared(cursor, 'createorgettunnel', values)
+                qryResult = cursor.fetchall()
+
+                if len(qryResult) > 0:
+                    if qryResult[0][1]:
+                        self.markStatus(cursor, tunnelKeys([targetAddress]))
+
+                    cursor.execute('COMMIT')
+                    break
+
+                #another writer created the tunnel after our snapshot, undo the claim and look again
+                cursor.execute('ROLLBACK')
+
+        if qryResult[0][1]:
+            self.tunnelsChanged([targetAddress])
+
+        return qryResult[0][0], qryResult[0][1]
+
+    def createOrGetTunnels(self, targetAddresses, sourceAddresses = None):
+        targetAddresses = list(dict.fromkeys(targetAddresses))
+        insert = "INSERT INTO tunnel (sourceaddress, targetaddress, status, timestamp) VALUES %s ON CONFLICT DO NOTHING RETURNING targetaddress"
+
+        with self.connection() as cursor:
+            while True:
+                result = {}
+                cursor.execute('BEGIN')
+
+                #the oldest active tunnel of a target wins, like in createOrGetTunnel
+                cursor.execute("SELECT targetaddress, sourceaddress FROM tunnel WHERE status <> 'error' AND targetaddress = ANY(%s) ORDER BY id DESC", (targetAddresses,))
+                for targetAddress, sourceAddress in cursor.fetchall():
+                    result[targetAddress] = (sourceAddress, False)
+
+                missing = [targetAddress for targetAddress in targetAddresses if targetAddress not in result]
+
+                if sourceAddresses is None:
+                    self.execPrepared(cursor, 'claimpooladdresses', (len(missing),))
+                    claimed = [row[1] for row in sorted(cursor.fetchall())]
+                else:
+                    addresses = dict(zip(targetAddresses, sourceAddresses))
+                    claimed = [addresses[targetAddress] for targetAddress in missing]
+
+                rows = list(zip(claimed, missing))
+                inserted = execute_values(cursor, insert, rows, template="(%s, %s, 'created', CURRENT_TIMESTAMP)", fetch=True)
+
+                if len(inserted) == len(rows):
+                    self.markStatus(cursor, tunnelKeys([targetAddress for sourceAddress, targetAddress in rows]))
+                    cursor.execute('COMMIT')
+                    break
+
+                #another writer created some of the tunnels first, start over with the claims undone
+                cursor.execute('ROLLBACK')
+
+        for sourceAddress, targetAddress in rows:
+            result[targetAddress] = (sourceAddress, True)
+        for targetAddress in missing[len(rows):]:
+            result[targetAddress] = ('', False)
+
+        self.tunnelsCreated([targetAddress for sourceAddress, targetAddress in rows])
+
+        return result
 
     def updTunnel(self, status, sourceAddress, targetAddress, statusOld = ''):
         if statusOld == '':
@@ -321,53 +576,79 @@ class dbPGCalls(object):
         sql = 'UPDATE tunnel SET "status" = %s, "timestamp" = CURRENT_TIMESTAMP WHERE status = %s AND sourceaddress = %s and targetaddress = %s'
         values = (status, statusOld, sourceAddress, targetAddress)
 
-        dbCon = self.openConn()
-        cursor = dbCon.cursor()
-        cursor.execute(sql, values)
-        cursor.close()
-        self.closeConn(dbCon)
+        with self.connection() as cursor:
+            cursor.execute('BEGIN')
+            self.markStatus(cursor, tunnelKeys([targetAddress]))
+            cursor.execute(sql, values)
+            cursor.execute('COMMIT')
+
+        self.tunnelsChanged([targetAddress])
 
     def delTunnel(self, sourceAddress, targetAddress):
         sql = 'DELETE FROM tunnel WHERE sourceaddress = %s and targetaddress = %s'
         values = (sourceAddress, targetAddress)
 
-        dbCon = self.openConn()
-        cursor = dbCon.cursor()
-        cursor.execute(sql, values)
-        cursor.close()
-        self.closeConn(dbCon)
+        with self.connection() as cursor:
+            cursor.execute('BEGIN')
+            self.markStatus(cursor, tunnelKeys([targetAddress]))
+            cursor.execute(sql, values)
+            cursor.execute('COMMIT')
+
+        self.tunnelsChanged([targetAddress])
 
 #executed table related
-    def insExecuted(self, sourceAddress, targetAddress, otherTxId, tntxid, amount, amountFee):
-        sql = 'INSERT INTO executed ("sourceaddress", "targetaddress", "othertxid", "tntxid", "amount", "amountFee") VALUES (%s, %s, %s, %s, %s, %s)'
-        values = (sourceAddress, targetAddress, otherTxId, tntxid, amount, amountFee)
+    def insExecuted(self, sourceAddress, targetAddress, otherTxId, tnTxId, amount, amountFee, direction = ''):
+        if direction == '':
+            direction = txDirection(targetAddress)
+
+        #the daily rollup is updated in the same statement
+        sql = 'WITH ins AS (INSERT INTO executed ("sourceaddress", "targetaddress", "othertxid", "tntxid", "amount", amountfee, "direction", "tnverblock", "otherverblock") ' \
+              'VALUES (%s, %s, %s, %s, %s, %s, %s, (SELECT block FROM verified WHERE tx = %s LIMIT 1), (SELECT block FROM verified WHERE tx = %s LIMIT 1))) ' \
+              'INSERT INTO dailystats ("day", "direction", "txcount", "volume", "fees") VALUES (current_date, %s, 1, %s, %s) ' \
+              'ON CONFLICT (day, direction) DO UPDATE SET txcount = dailystats.txcount + 1, volume = dailystats.volume + excluded.volume, fees = dailystats.fees + excluded.fees'
+        values = (sourceAddress, targetAddress, otherTxId, tnTxId, amount, amountFee, direction, tnTxId, otherTxId, direction, amount or 0, amountFee or 0)
+
+        with self.connection() as cursor:
+            cursor.execute('BEGIN')
+            self.markStatus(cursor, executedKeys([(sourceAddress, targetAddress)]))
+            cursor.execute(sql, values)
+            cursor.execute('COMMIT')
 
-        dbCon = self.openConn()
-        cursor = dbCon.cursor()
-        cursor.execute(sql, values)
-        cursor.close()
-        self.closeConn(dbCon)
+        self.executedChanged([(sourceAddress, targetAddress)])
 
-    def updExecuted(self, id, sourceAddress, targetAddress, otherTxId, tntxid, amount, amountFee):
-        sql = 'UPDATE executed SET "sourceaddress" = %s, "targetaddress" = %s, "othertxid" = %s, "tntxid" = %s, "amount" = %s, "amountFee" = %s) WHERE id = %s'
-        values = (sourceAddress, targetAddress, otherTxId, tntxid, amount, amountFee, id)
+    def insExecutedBulk(self, rows):
+        #rows of (sourceAddress, targetAddress, otherTxId, tnTxId, amount, amountFee[, direction])
+        sql = 'INSERT INTO executed ("sourceaddress", "targetaddress", "othertxid", "tntxid", "amount", amountfee, "direction", "tnverblock", "otherverblock") VALUES %s'
+        template = '(%s, %s, %s, %s, %s, %s, %s, (SELECT block FROM verified WHERE tx = %s LIMIT 1), (SELECT block FROM verified WHERE tx = %s LIMIT 1))'
+        rows = executedRows(rows)
 
-        dbCon = self.openConn()
-        cursor = dbCon.cursor()
-        cursor.execute(sql, values)
-        cursor.close()
-        self.closeConn(dbCon)
+        with self.connection() as cursor:
+            cursor.execute('BEGIN')
+            self.markStatus(cursor, executedKeys([(row[0], row[1]) for row in rows]))
+            execute_values(cursor, sql, [row + (row[3], row[2]) for row in rows], template=template)
+            self.addRollup(cursor, dailyTotals(rows))
+            cursor.execute('COMMIT')
+
+        self.executedChanged([(row[0], row[1]) for row in rows])
+
+    def updExecuted(self, id, sourceAddress, targetAddress, otherTxId, tnTxId, amount, amountFee):
+        sql = 'UPDATE executed SET "sourceaddress" = %s, "targetaddress" = %s, "othertxid" = %s, "tntxid" = %s, "amount" = %s, amountfee = %s WHERE id = %s'
+        values = (sourceAddress, targetAddress, otherTxId, tnTxId, amount, amountFee, id)
+
+        with self.connection() as cursor:
+            cursor.execute('BEGIN')
+            self.markStatus(cursor, executedKeys([(sourceAddress, targetAddress)]))
+            cursor.execute(sql, values)
+            cursor.execute('COMMIT')
+
+        self.executedChanged([(sourceAddress, targetAddress)])
 
     def didWeSendTx(self, txid):
-        sql = 'SELECT * FROM executed WHERE (othertxid = %s OR tntxid = %s)'
-        values = (txid, txid)
+        values = (txid,)
 
-        dbCon = self.openConn()
-        cursor = dbCon.cursor()
-        cursor.execute(sql, values)
-        qryResult = cursor.fetchall()
-        cursor.close()
-        self.closeConn(dbCon)
+        with self.connection() as cursor:
+            self.execPrepared(cursor, 'didwesendtx', values)
+            qryResult = cursor.fetchall()
 
         if len(qryResult) > 0:
             return True
@@ -377,40 +658,34 @@ class dbPGCalls(object):
     def getExecutedAll(self):
         sql = 'SELECT * FROM executed'
 
-        dbCon = self.openConn()
-        cursor = dbCon.cursor()
-        cursor.execute(sql)
-        qryResult = cursor.fetchall()
-        cursor.close()
-        self.closeConn(dbCon)
+        with self.connection() as cursor:
+            cursor.execute(sql)
+            qryResult = cursor.fetchall()
 
         if len(qryResult) > 0:
             return qryResult
         else:
             return {}
 
-    def getExecuted(self, sourceAddress = '', targetAddress = '', otherTxId = '', tntxid = ''):
+    def getExecuted(self, sourceAddress = '', targetAddress = '', otherTxId = '', tnTxId = ''):
         if sourceAddress != '':
-            sql = 'SELECT othertxid FROM executed WHERE sourceaddress = %s ORDER BY id DESC LIMIT 1'
+            name = 'getexecutedsource'
             values = (sourceAddress,)
         elif targetAddress != '':
-            sql = 'SELECT tntxid FROM executed WHERE targetaddress = %s ORDER BY id DESC LIMIT 1'
+            name = 'getexecutedtarget'
             values = (targetAddress,)
         elif otherTxId != '':
-            sql = 'SELECT * FROM executed WHERE othertxid = %s ORDER BY id DESC LIMIT 1'
+            name = 'getexecutedother'
             values = (otherTxId,)
-        elif tntxid != '':
-            sql = 'SELECT * FROM executed WHERE tntxid = %s ORDER BY id DESC LIMIT 1'
-            values = (tntxid,)
+        elif tnTxId != '':
+            name = 'getexecutedtn'
+            values = (tnTxId,)
         else:
             return {}
 
-        dbCon = self.openConn()
-        cursor = dbCon.cursor()
-        cursor.execute(sql, values)
-        qryResult = cursor.fetchall()
-        cursor.close()
-        self.closeConn(dbCon)
+        with self.connection() as cursor:
+            self.execPrepared(cursor, name, values)
+            qryResult = cursor.fetchall()
 
         if len(qryResult) > 0:
             return qryResult
@@ -418,25 +693,36 @@ class dbPGCalls(object):
             return {}
 
 #error table related
-    def insError(self, sourceAddress, targetAddress, tntxid, otherTxId, amount, error, exception = ''):
+    def insError(self, sourceAddress, targetAddress, tnTxId, otherTxId, amount, error, exception = ''):
         sql = 'INSERT INTO errors ("sourceaddress", "targetaddress", "tntxid", "othertxid", "amount", "error", "exception") VALUES (%s, %s, %s, %s, %s, %s, %s)'
-        values = (sourceAddress, targetAddress, tntxid, otherTxId, amount, error, exception)
+        values = (sourceAddress, targetAddress, tnTxId, otherTxId, amount, error, exception)
 
-        dbCon = self.openConn()
-        cursor = dbCon.cursor()
-        cursor.execute(sql, values)
-        cursor.close()
-        self.closeConn(dbCon)
+        with self.connection() as cursor:
+            cursor.execute('BEGIN')
+            self.markStatus(cursor, executedKeys([(sourceAddress, targetAddress)]))
+            cursor.execute(sql, values)
+            cursor.execute('COMMIT')
+
+        self.executedChanged([(sourceAddress, targetAddress)])
+
+    def insErrorBulk(self, rows):
+        #rows of (sourceAddress, targetAddress, tnTxId, otherTxId, amount, error, exception)
+        sql = 'INSERT INTO errors ("sourceaddress", "targetaddress", "tntxid", "othertxid", "amount", "error", "exception") VALUES %s'
+
+        with self.connection() as cursor:
+            cursor.execute('BEGIN')
+            self.markStatus(cursor, executedKeys([(row[0], row[1]) for row in rows]))
+            execute_values(cursor, sql, rows)
+            cursor.execute('COMMIT')
+
+        self.executedChanged([(row[0], row[1]) for row in rows])
 
     def getErrors(self):
         sql = 'SELECT * FROM errors'
 
-        dbCon = self.openConn()
-        cursor = dbCon.cursor()
-        cursor.execute(sql)
-        qryResult = cursor.fetchall()
-        cursor.close()
-        self.closeConn(dbCon)
+        with self.connection() as cursor:
+            cursor.execute(sql)
+            qryResult = cursor.fetchall()
 
         if len(qryResult) > 0:
             return qryResult
@@ -453,12 +739,9 @@ class dbPGCalls(object):
         else:
             return {}
 
-        dbCon = self.openConn()
-        cursor = dbCon.cursor()
-        cursor.execute(sql, values)
-        qryResult = cursor.fetchall()
-        cursor.close()
-        self.closeConn(dbCon)
+        with self.connection() as cursor:
+            cursor.execute(sql, values)
+            qryResult = cursor.fetchall()
 
         if len(qryResult) > 0:
             return qryResult
@@ -469,12 +752,9 @@ class dbPGCalls(object):
     def getVerifiedAll(self):
         sql = 'SELECT * FROM verified'
 
-        dbCon = self.openConn()
-        cursor = dbCon.cursor()
-        cursor.execute(sql)
-        qryResult = cursor.fetchall()
-        cursor.close()
-        self.closeConn(dbCon)
+        with self.connection() as cursor:
+            cursor.execute(sql)
+            qryResult = cursor.fetchall()
 
         if len(qryResult) > 0:
             return qryResult
@@ -484,12 +764,9 @@ class dbPGCalls(object):
     def getUnVerified(self):
         sql = 'SELECT * FROM verified WHERE block = 0'
 
-        dbCon = self.openConn()
-        cursor = dbCon.cursor()
-        cursor.execute(sql)
-        qryResult = cursor.fetchall()
-        cursor.close()
-        self.closeConn(dbCon)
+        with self.connection() as cursor:
+            cursor.execute(sql)
+            qryResult = cursor.fetchall()
 
         if len(qryResult) > 0:
             return qryResult
@@ -497,15 +774,11 @@ class dbPGCalls(object):
             return {}
 
     def getVerified(self, tx):
-        sql = 'SELECT block FROM verified WHERE tx = %s'
         values = (tx,)
 
-        dbCon = self.openConn()
-        cursor = dbCon.cursor()
-        cursor.execute(sql, values)
-        qryResult = cursor.fetchall()
-        cursor.close()
-        self.closeConn(dbCon)
+        with self.connection() as cursor:
+            self.execPrepared(cursor, 'getverified', values)
+            qryResult = cursor.fetchall()
 
         if len(qryResult) > 0:
             return qryResult[0][0]
@@ -513,46 +786,54 @@ class dbPGCalls(object):
             return None
 
     def insVerified(self, chain, tx, block):
-        if self.getVerified(tx) is None:
-            sql = 'INSERT INTO verified ("chain", "tx", "block") VALUES (%s, %s, %s)'
-            values = (chain, tx, block)
+        #try the update first, only unknown tx need the insert
+        with self.connection() as cursor:
+            cursor.execute('BEGIN')
+            self.execPrepared(cursor, 'updverified', (tx, block))
 
-            dbCon = self.openConn()
-            cursor = dbCon.cursor()
-            cursor.execute(sql, values)
-            cursor.close()
-            self.closeConn(dbCon)
-        else:
-            sql = 'UPDATE verified SET "block" = %s WHERE tx = %s'
-            values = (block, tx)
+            if cursor.rowcount == 0:
+                self.execPrepared(cursor, 'insverified', (chain, tx, block))
 
-            dbCon = self.openConn()
-            cursor = dbCon.cursor()
-            cursor.execute(sql, values)
-            cursor.close()
-            self.closeConn(dbCon)
+            #keep the copies on executed in step
+            self.execPrepared(cursor, 'updexecutedtn', (tx, block))
+            self.execPrepared(cursor, 'updexecutedother', (tx, block))
+            self.markVerifiedStatus(cursor, [tx])
+            cursor.execute('COMMIT')
+
+        self.verifiedChanged([tx])
+
+    def insVerifiedBulk(self, rows):
+        #rows of (chain, tx, block) for tx that are not in the verified table yet
+        sql = 'INSERT INTO verified ("chain", "tx", "block") VALUES %s'
+
+        blocks = [(tx, block) for chain, tx, block in rows]
+
+        with self.connection() as cursor:
+            cursor.execute('BEGIN')
+            execute_values(cursor, sql, rows)
+            execute_values(cursor, 'UPDATE executed SET tnverblock = v.block FROM (VALUES %s) AS v (tx, block) WHERE executed.tntxid = v.tx', blocks)
+            execute_values(cursor, 'UPDATE executed SET otherverblock = v.block FROM (VALUES %s) AS v (tx, block) WHERE executed.othertxid = v.tx', blocks)
+            self.markVerifiedStatus(cursor, [row[1] for row in rows])
+            cursor.execute('COMMIT')
+
+        self.verifiedChanged([row[1] for row in rows])
 
 #other
     def checkTXs(self, address):
+        columns = "SELECT sourceaddress as \"sourceAddress\", targetaddress as \"targetAddress\", tntxid as \"tnTxId\", othertxid as \"OtherTxId\", COALESCE(tnverblock, 0) as \"TNVerBlock\", COALESCE(otherverblock, 0) as \"OtherVerBlock\", amount, direction as \"TypeTX\", " \
+                  "CASE WHEN direction = 'Deposit' AND tnverblock IS NOT NULL THEN 'verified' WHEN direction <> 'Deposit' AND otherverblock > 0 THEN 'verified' ELSE 'unverified' END \"Status\" FROM executed "
+
         if address == '':
-            dbCon = self.openConn()
-            cursor = dbCon.cursor()
-            sql = "SELECT e.sourceaddress, e.targetaddress, e.tntxid, e.othertxid as othertxid, COALESCE(v.block, 0) as TNVerBlock, COALESCE(v2.block, 0) as OtherVerBlock, e.amount, CASE WHEN e.targetaddress LIKE '3J%%' THEN 'Deposit' ELSE 'Withdraw' END TypeTX, " \
-            "CASE WHEN e.targetaddress LIKE '3J%%' AND v.block IS NOT NULL THEN 'verified' WHEN e.targetaddress NOT LIKE '3J%%' AND v2.block IS NOT NULL AND v2.block > 0 THEN 'verified' ELSE 'unverified' END Status " \
-            "FROM executed e LEFT JOIN verified v ON e.tntxid = v.tx LEFT JOIN verified v2 ON e.othertxid = v2.tx "
-            cursor.execute(sql)
+            sql = columns + "ORDER BY id"
+            values = None
         else:
-            dbCon = self.openConn()
-            cursor = dbCon.cursor()
-            sql = "SELECT e.sourceaddress, e.targetaddress, e.tntxid, e.othertxid as othertxid, COALESCE(v.block, 0) as TNVerBlock, COALESCE(v2.block, 0) as OtherVerBlock, e.amount, CASE WHEN e.targetaddress LIKE '3J%%' THEN 'Deposit' ELSE 'Withdraw' END TypeTX, " \
-            "CASE WHEN e.targetaddress LIKE '3J%%' AND v.block IS NOT NULL THEN 'verified' WHEN e.targetaddress NOT LIKE '3J%%' AND v2.block IS NOT NULL AND v2.block > 0 THEN 'verified' ELSE 'unverified' END Status " \
-            "FROM executed e LEFT JOIN verified v ON e.tntxid = v.tx LEFT JOIN verified v2 ON e.othertxid = v2.tx WHERE (e.sourceaddress = %s or e.targetaddress = %s)"
-            values = (address, address)
-            cursor.execute(sql, values)
+            #one covering index per branch, the second one leaves out the rows of the first
+            sql = columns + "WHERE sourceaddress = %s UNION ALL " + columns + "WHERE targetaddress = %s AND sourceaddress <> %s"
+            values = (address, address, address)
 
-        tx = [dict((cursor.description[i][0], value) for i, value in enumerate(row)) for row in cursor.fetchall()]
-        cursor.close()
-        self.closeConn(dbCon)
+        with self.connection() as cursor:
+            cursor.execute(sql, values)
+            tx = [dict((cursor.description[i][0], value) for i, value in enumerate(row)) for row in cursor.fetchall()]
 
         if len(tx) == 0:
             return {'error': 'no tx found'}
@@ -560,50 +841,189 @@ class dbPGCalls(object):
             return tx
 
     def getFees(self, fromdate, todate):
-        #check date notation
-        if len(fromdate) != 0:
-            fromyear,frommonth,fromday = fromdate.split('-')
-
-            isValidFromDate = True
-            try :
-                datetime.datetime(int(fromyear),int(frommonth),int(fromday))
-            except ValueError :
-                isValidFromDate = False
-        else:
-            isValidFromDate = False
-
-        if len(todate) != 0:
-            toyear,tomonth,today = todate.split('-')
-
-            isValidtoDate = True
-            try :
-                datetime.datetime(int(toyear),int(tomonth),int(today))
-            except ValueError :
-                isValidtoDate = False
-        else:
-            isValidtoDate = False
-
-        if not isValidFromDate:
-            fromdate = '1990-01-01'
-    
-        if not isValidtoDate:
-            todat = datetime.date.today() + timedelta(days=1)
-            todate = todat.strftime('%Y-%m-%d')
-        
+        fromdate, todate = self.dateRange(fromdate, todate)
         values = (fromdate, todate)
 
-        sql = 'SELECT SUM(amountFee) as totalFee from executed WHERE timestamp > %s and timestamp < %s'
+        sql = 'SELECT COALESCE(SUM(fees), 0) as totalFee from dailystats WHERE day >= %s and day < %s'
 
-        dbCon = self.openConn()
-        cursor = dbCon.cursor()
-        cursor.execute(sql, values)
-        qryResult = cursor.fetchall()
-        cursor.close()
-        self.closeConn(dbCon)
+        with self.connection() as cursor:
+            cursor.execute(sql, values)
+            qryResult = cursor.fetchall()
 
         if len(qryResult) == 0:
             Fees = 0
         else:
             Fees = qryResult[0][0]
 
-        return { 'totalFees': Fees }
\ No newline at end of file
+        return { 'totalFees': Fees }
+
+#dailystats table related
+    def addRollup(self, cursor, totals):
+        #runs in the transaction of the executed insert
+        sql = 'INSERT INTO dailystats ("day", "direction", "txcount", "volume", "fees") VALUES %s ' \
+              'ON CONFLICT (day, direction) DO UPDATE SET txcount = dailystats.txcount + excluded.txcount, volume = dailystats.volume + excluded.volume, fees = dailystats.fees + excluded.fees'
+        rows = [(direction, txcount, volume, fees) for direction, (txcount, volume, fees) in totals.items()]
+
+        if len(rows) > 0:
+            execute_values(cursor, sql, rows, template='(current_date, %s, %s, %s, %s)')
+
+    def rebuildRollups(self):
+        sql = "INSERT INTO dailystats (day, direction, txcount, volume, fees) " \
+              "SELECT timestamp::date, direction, COUNT(*), COALESCE(SUM(amount), 0), COALESCE(SUM(amountfee), 0) " \
+              "FROM executed WHERE timestamp IS NOT NULL GROUP BY 1, 2"
+
+        with self.connection() as cursor:
+            cursor.execute('BEGIN')
+            #concurrent upserts wait until the rebuilt rows are committed, so none is counted twice
+            cursor.execute('LOCK TABLE dailystats IN EXCLUSIVE MODE')
+            cursor.execute('DELETE FROM dailystats')
+            cursor.execute(sql)
+            cursor.execute('COMMIT')
+
+    def getDailyStats(self, fromdate, todate):
+        fromdate, todate = self.dateRange(fromdate, todate)
+        values = (fromdate, todate)
+
+        sql = 'SELECT day, direction, txcount, volume, fees FROM dailystats WHERE day >= %s and day < %s ORDER BY day, direction'
+
+        with self.connection() as cursor:
+            cursor.execute(sql, values)
+            qryResult = cursor.fetchall()
+
+        return [{'day': row[0].isoformat(), 'direction': row[1], 'txcount': row[2], 'volume': row[3], 'fees': row[4]} for row in qryResult]
+
+#addressstatus table related
+    def getAddressStatus(self, address, side):
+        values = (address, side)
+
+        with self.connection() as cursor:
+            self.execPrepared(cursor, 'getaddressstatus', values)
+            qryResult = cursor.fetchall()
+
+        if len(qryResult) > 0:
+            return qryResult[0]
+        else:
+            return {}
+
+    def updAddressStatus(self, rows, pending = None):
+        #rows of (address, side, status, tx, block, error)
+        sql = 'INSERT INTO addressstatus ("address", "side", "status", "tx", "block", "error") VALUES %s ' \
+              'ON CONFLICT (address, side) DO UPDATE SET status = excluded.status, tx = excluded.tx, block = excluded.block, error = excluded.error'
+
+        with self.connection() as cursor:
+            execute_values(cursor, sql, rows)
+
+            #a crash before the delete only refreshes the pairs once more at the next start
+            if pending:
+                cursor.execute('DELETE FROM statuspending WHERE id = ANY(%s)', (list(pending),))
+
+    def getPendingStatus(self, keys = None):
+        with self.connection() as cursor:
+            if keys is None:
+                cursor.execute('SELECT id, address, side FROM statuspending')
+                qryResult = cursor.fetchall()
+            else:
+                keys = set(keys)
+                cursor.execute('SELECT id, address, side FROM statuspending WHERE address = ANY(%s)', (list(set(address for address, side in keys)),))
+                qryResult = [row for row in cursor.fetchall() if (row[1], row[2]) in keys]
+
+        return qryResult
+
+    def markStatus(self, cursor, keys):
+        #runs in the transaction of the write, so a crash before its refresh leaves the pairs for createStatus
+        execute_values(cursor, 'INSERT INTO statuspending ("address", "side") VALUES %s', list(keys))
+
+    def markVerifiedStatus(self, cursor, txs):
+        #the pairs verifiedChanged refreshes, found through the executed rows of the tx
+        sql = "INSERT INTO statuspending (address, side) SELECT targetaddress, 'target' FROM executed WHERE tntxid = ANY(%s) AND targetaddress <> '' " \
+              "UNION SELECT sourceaddress, 'source' FROM executed WHERE othertxid = ANY(%s) AND sourceaddress <> ''"
+
+        cursor.execute(sql, (list(txs), list(txs)))
+
+    def getAddressStatuses(self, addresses, side):
+        sql = 'SELECT address, status, tx, block, error FROM addressstatus WHERE side = %s AND address = ANY(%s)'
+        values = (side, list(addresses))
+
+        with self.connection() as cursor:
+            cursor.execute(sql, values)
+            qryResult = cursor.fetchall()
+
+        return dict((row[0], row[1:]) for row in qryResult)
+
+    def getStatusAddresses(self):
+        sql = "SELECT targetaddress, 'target' FROM tunnel UNION SELECT targetaddress, 'source' FROM tunnel " \
+              "UNION SELECT targetaddress, 'target' FROM executed UNION SELECT sourceaddress, 'source' FROM executed " \
+              "UNION SELECT targetaddress, 'target' FROM errors UNION SELECT sourceaddress, 'source' FROM errors"
+
+        with self.connection() as cursor:
+            cursor.execute(sql)
+            qryResult = cursor.fetchall()
+
+        return qryResult
+
+#addresspool table related
+    def insPoolAddresses(self, addresses):
+        sql = 'INSERT INTO addresspool ("address") VALUES %s ON CONFLICT (address) DO NOTHING'
+
+        with self.connection() as cursor:
+            execute_values(cursor, sql, [(address,) for address in addresses])
+
+    def claimPoolAddresses(self, count = 1):
+        #concurrent claims skip the rows another transaction already took
+        values = (count,)
+
+        with self.connection() as cursor:
+            self.execPrepared(cursor, 'claimpooladdresses', values)
+            qryResult = cursor.fetchall()
+
+        return [row[1] for row in sorted(qryResult)]
+
+    def delPoolAddresses(self, addresses):
+        sql = 'DELETE FROM addresspool WHERE address = ANY(%s)'
+        values = (list(addresses),)
+
+        with self.connection() as cursor:
+            cursor.execute(sql, values)
+
+    def getPoolSize(self):
+        sql = 'SELECT count(*) FROM addresspool'
+
+        with self.connection() as cursor:
+            cursor.execute(sql)
+            qryResult = cursor.fetchall()
+
+        return qryResult[0][0]
+
+#latency table related
+    def insLatency(self, sourceTxId, direction, blockTime, detected):
+        sql = 'INSERT INTO latency ("sourcetxid", "direction", "blocktime", "detected") VALUES (%s, %s, %s, %s) ON CONFLICT (sourcetxid) DO NOTHING'
+        values = (sourceTxId, direction, blockTime, detected)
+
+        with self.connection() as cursor:
+            cursor.execute(sql, values)
+
+    def updLatency(self, stage, at, sourceTxId = '', payoutTxId = ''):
+        if stage not in LATENCYSTAGES:
+            raise ValueError('unknown latency stage ' + stage)
+
+        if stage == 'sent':
+            sql = 'UPDATE latency SET sent = COALESCE(sent, %s), payouttxid = %s WHERE sourcetxid = %s'
+            values = (at, payoutTxId, sourceTxId)
+        else:
+            sql = 'UPDATE latency SET ' + stage + ' = COALESCE(' + stage + ', %s) WHERE payouttxid = %s'
+            values = (at, payoutTxId)
+
+        with self.connection() as cursor:
+            cursor.execute(sql, values)
+
+    def getLatencies(self, since):
+        sql = 'SELECT direction, blocktime, detected, sent, confirmed, completed FROM latency WHERE detected >= %s'
+        values = (since,)
+
+        with self.connection() as cursor:
+            cursor.execute(sql, values)
+            qryResult = cursor.fetchall()
+
+        return qryResult
+
+metrics.instrument(dbPGCalls, 'gateway_db_seconds', 'duration of storage calls by backend and method', dbInterface.methods(), stage='db', backend='postgres')
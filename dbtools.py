@@ -0,0 +1,63 @@
+import argparse
+import json
+import sys
+
+import logs
+from dbInterface import getDB, newDB
+
+log = logs.get('dbtools')
+
+with open('config.json') as json_file:
+    config = json.load(json_file)
+
+logs.configure(config)
+
+def importSQLite(args):
+    #can be rerun after an interruption, it continues with the last committed chunk
+    dbc = newDB(config, 'postgres')
+    dbc.createdb()
+    dbc.importSQLite(args.chunk)
+
+def checkDual(args):
+    from dbDualClass import consistencyChecker
+
+    mismatches = consistencyChecker(config, newDB(config, 'sqlite'), newDB(config, 'postgres')).check(repair=args.repair)
+
+    if len(mismatches) > 0:
+        sys.exit(1)
+
+def rebuildRollups(args):
+    dbc = getDB(config)
+    dbc.createdb()
+    dbc.rebuildRollups()
+    log.info('daily rollups rebuilt')
+
+def rebuildStatus(args):
+    dbc = getDB(config)
+    dbc.createdb()
+    dbc.rebuildStatus()
+    log.info('address status rebuilt')
+
+def main():
+    parser = argparse.ArgumentParser(description='gateway database maintenance')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    cmdImport = commands.add_parser('import-sqlite', help='stream gateway.db into the Postgres DB')
+    cmdImport.add_argument('--chunk', type=int, default=0, help='rows per COPY chunk')
+    cmdImport.set_defaults(func=importSQLite)
+
+    cmdCheck = commands.add_parser('check-dual', help='compare the SQLite and Postgres DB during a dual-write migration')
+    cmdCheck.add_argument('--repair', action='store_true', help='copy differing tables again from SQLite')
+    cmdCheck.set_defaults(func=checkDual)
+
+    cmdRollups = commands.add_parser('rebuild-rollups', help='recalculate the daily fee and volume rollups from the executed table')
+    cmdRollups.set_defaults(func=rebuildRollups)
+
+    cmdStatus = commands.add_parser('rebuild-status', help='recalculate the deposit and withdraw status of every address')
+    cmdStatus.set_defaults(func=rebuildStatus)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
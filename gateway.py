@@ -1,23 +1,35 @@
+import asyncio
 import json
 import re
 import secrets
 from typing import List
 
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Response
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from pydantic import BaseModel
 from starlette.middleware.cors import CORSMiddleware
 from starlette.requests import Request
-from starlette.staticfiles import StaticFiles
+from starlette.responses import StreamingResponse
 from starlette.status import HTTP_401_UNAUTHORIZED
 from starlette.templating import Jinja2Templates
 
-from dbClass import dbCalls
-from dbPGClass import dbPGCalls
-from otherClass import otherCalls
-from tnClass import tnCalls
+import latencyLedger
+import logs
+import metrics
+import profiler
+import queryLog
+import spans
+from cacheClass import lazy, responseCache, singleFlight
+from dbInterface import getDB
+from hubClass import hub
+from otherClass import getOther
+from poolClass import addressPool
+from responseClass import acceptedEncoding, compress, compressionMiddleware, fastJSONResponse, listResponse, staticAssets
+from tnClass import getTN
 from verification import verifier
 
+log = logs.get(__name__)
+
 
 class cHeights(BaseModel):
     TN: int
@@ -34,6 +46,20 @@ class cExecResult(BaseModel):
     address: str
 
 
+class cAddressList(BaseModel):
+    addresses: List[str]
+
+
+class cTunnelResult(BaseModel):
+    targetAddress: str
+    successful: int
+    address: str
+
+
+class cTunnelResults(BaseModel):
+    tunnels: List[cTunnelResult] = []
+
+
 class cFullInfo(BaseModel):
     chainName: str
     assetID: str
@@ -71,6 +97,18 @@ class cDepositWD(BaseModel):
     error: str
 
 
+class cAddressStatus(BaseModel):
+    address: str
+    status: str
+    tx: str
+    block: str
+    error: str
+
+
+class cAddressStatuses(BaseModel):
+    statuses: List[cAddressStatus] = []
+
+
 class cTx(BaseModel):
     sourceAddress: str
     targetAddress: str
@@ -92,15 +130,27 @@ class cFees(BaseModel):
     totalFees: float
 
 
+class cDayStats(BaseModel):
+    day: str
+    direction: str
+    txcount: int
+    volume: float
+    fees: float
+
+
+class cDailyStats(BaseModel):
+    days: List[cDayStats] = []
+
+
 class cHealth(BaseModel):
     chainName: str
     assetID: str
     status: str
-    connectionTN: bool
+    connectionDCC: bool
     connectionOther: bool
-    blocksbehindTN: int
+    blocksbehindDCC: int
     blockbehindOther: int
-    balanceTN: float
+    balanceDCC: float
     balanceOther: float
     numberErrors: int
 
@@ -113,27 +163,36 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(compressionMiddleware)
 
 security = HTTPBasic()
-app.mount("/static", StaticFiles(directory="static"), name="static")
+assets = lazy(lambda: staticAssets("static"))
 templates = Jinja2Templates(directory="templates")
+templates.env.globals['static_url'] = lambda name: assets.url(name)
 
 with open('config.json') as json_file:
     config = json.load(json_file)
 
-if config['main']['use-pg']:
-    dbc = dbPGCalls(config)
-else:
-    dbc = dbCalls(config)
+logs.configure(config)
 
-checkit = verifier(config, dbc)
+#nothing is connected at import, the shared objects are built by the warm up after startup or on first use
+dbc = lazy(lambda: getDB(config))
+tnc = lazy(lambda: getTN(config, dbc.get()))
+checkit = lazy(lambda: verifier(config, dbc.get()))
+pool = lazy(lambda: addressPool(config, dbc.get()))
+tunnelFlight = singleFlight()
+readiness = {'ready': False, 'error': 'starting'}
+bulkMax = config['main'].get('bulk-max', 1000)
+pageCache = responseCache(config['main'].get('info-ttl', 10), config['main'].get('info-stale', 60))
+eventsPoll = config['main'].get('events-poll', 2)
+profileMax = config['main'].get('profile-max', 300)
 
 
 def get_current_username(credentials: HTTPBasicCredentials = Depends(security)):
     correct_username = secrets.compare_digest(credentials.username, config["main"]["admin-username"])
     correct_password = secrets.compare_digest(credentials.password, config["main"]["admin-password"])
     if not (correct_username and correct_password):
-        print("ERROR: invalid logon details")
+        log.error('invalid logon details')
         raise HTTPException(
             status_code=HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -142,40 +201,76 @@ def get_current_username(credentials: HTTPBasicCredentials = Depends(security)):
     return credentials.username
 
 
+def check_bulk(addresses):
+    if len(addresses) > bulkMax:
+        raise HTTPException(status_code=413, detail="at most " + str(bulkMax) + " addresses per request")
+
+
 def get_tnBalance():
-    return tnCalls(config, dbc).currentBalance()
+    return tnc.currentBalance()
 
 
 def get_otherBalance():
-    return otherCalls(config, dbc).currentBalance()
+    return getOther(config, dbc.get()).currentBalance()
 
 
-@app.get("/")
-async def index(request: Request):
-    heights = await getHeights()
+def cached_response(request: Request, entry, media_type):
+    #pre-serialized body of the page cache, 304 when the client already has this version
+    created, body, etag, variants = entry
+    headers = {'ETag': etag, 'Cache-Control': 'public, max-age=' + str(int(pageCache.ttl)), 'Vary': 'Accept-Encoding'}
+    tags = [tag.strip() for tag in request.headers.get('if-none-match', '').split(',')]
+
+    if etag in tags or 'W/' + etag in tags:
+        return Response(status_code=304, headers=headers)
+
+    #compressed once per version and encoding, not on every request
+    encoding = acceptedEncoding(request.headers.get('accept-encoding', ''))
+    if encoding != '':
+        if encoding not in variants:
+            variants[encoding] = compress(body, encoding)
+
+        body = variants[encoding]
+        headers['Content-Encoding'] = encoding
+
+    return Response(content=body, media_type=media_type, headers=headers)
+
+
+def build_index():
+    result = dbc.getHeights()
+    heights = {'DCC': result[0][1], 'Other': result[1][1]}
     index = config['main']['index-file']
     if index == "": index = "index.html"
-    return templates.TemplateResponse(index, {"request": request,
-                                              "chainName": config['main']['name'],
-                                              "assetID": config['dcc']['assetId'],
-                                              "tn_gateway_fee": config['dcc']['gateway_fee'],
-                                              "tn_network_fee": config['dcc']['network_fee'],
-                                              "tn_total_fee": config['dcc']['network_fee'] + config['dcc']['gateway_fee'],
-                                              "eth_gateway_fee": config['other']['gateway_fee'],
-                                              "eth_network_fee": config['other']['network_fee'],
-                                              "eth_total_fee": config['other']['network_fee'] + config['other'][
-                                                  'gateway_fee'],
-                                              "fee": config['dcc']['fee'],
-                                              "company": config['main']['company'],
-                                              "email": config['main']['contact-email'],
-                                              "telegram": config['main']['contact-telegram'],
-                                              "recovery_amount": config['main']['recovery_amount'],
-                                              "recovery_fee": config['main']['recovery_fee'],
-                                              "ethHeight": heights['Other'],
-                                              "tnHeight": heights['DCC'],
-                                              "tnAddress": config['dcc']['gatewayAddress'],
-                                              "ethAddress": config['other']['gatewayAddress'],
-                                              "disclaimer": config['main']['disclaimer']})
+    return templates.get_template(index).render({"chainName": config['main']['name'],
+                                                 "assetID": config['dcc']['assetId'],
+                                                 "tn_gateway_fee": config['dcc']['gateway_fee'],
+                                                 "tn_network_fee": config['dcc']['network_fee'],
+                                                 "tn_total_fee": config['dcc']['network_fee'] + config['dcc']['gateway_fee'],
+                                                 "eth_gateway_fee": config['other']['gateway_fee'],
+                                                 "eth_network_fee": config['other']['network_fee'],
+                                                 "eth_total_fee": config['other']['network_fee'] + config['other'][
+                                                     'gateway_fee'],
+                                                 "fee": config['dcc']['fee'],
+                                                 "company": config['main']['company'],
+                                                 "email": config['main']['contact-email'],
+                                                 "telegram": config['main']['contact-telegram'],
+                                                 "recovery_amount": config['main']['recovery_amount'],
+                                                 "recovery_fee": config['main']['recovery_fee'],
+                                                 "ethHeight": heights['Other'],
+                                                 "tnHeight": heights['DCC'],
+                                                 "tnAddress": config['dcc']['gatewayAddress'],
+                                                 "ethAddress": config['other']['gatewayAddress'],
+                                                 "disclaimer": config['main']['disclaimer']}).encode('utf-8')
+
+
+@app.get("/static/{name:path}", include_in_schema=False)
+async def static(name: str, request: Request, v: str = ''):
+    return assets.response(name, request.headers, v)
+
+
+@app.get("/")
+async def index(request: Request):
+    entry = await pageCache.get('index', build_index)
+    return cached_response(request, entry, 'text/html; charset=utf-8')
 
 
 @app.get('/heights', response_model=cHeights)
@@ -191,7 +286,7 @@ async def getErrors(request: Request, username: str = Depends(get_current_userna
         return {"message": "change the default username and password please!"}
 
     if username == config["main"]["admin-username"]:
-        print("INFO: displaying errors page")
+        log.info('displaying errors page', extra=logs.SAMPLED)
         result = dbc.getErrors()
         return templates.TemplateResponse("errors.html", {"request": request, "errors": result})
 
@@ -202,12 +297,76 @@ async def getExecuted(request: Request, username: str = Depends(get_current_user
         return {"message": "change the default username and password please!"}
 
     if username == config["main"]["admin-username"]:
-        print("INFO: displaying executed page")
+        log.info('displaying executed page', extra=logs.SAMPLED)
         result = dbc.getExecutedAll()
         result2 = dbc.getVerifiedAll()
         return templates.TemplateResponse("tx.html", {"request": request, "txs": result, "vtxs": result2})
 
 
+@app.get('/metrics')
+async def getMetrics(username: str = Depends(get_current_username)):
+    return Response(content=metrics.render(), media_type='text/plain; version=0.0.4')
+
+
+@app.get('/stages')
+async def getStages(blocks: int = 1000, username: str = Depends(get_current_username)):
+    #p50/p95/p99 seconds of the checkBlock stages over the newest blocks of the stage log
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, spans.breakdown, config['main'].get('stage-log', 'checkblock.log'), blocks)
+
+
+@app.get('/latency')
+async def getLatency(windows: str = '3600,86400,604800', username: str = Depends(get_current_username)):
+    #p50/p90/p99 seconds per direction and stage (scan, send, confirm, complete, total) of the transfers detected within each window
+    try:
+        seconds = [int(window) for window in windows.split(',')]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="windows must be a comma separated list of seconds")
+
+    if len(seconds) == 0 or min(seconds) <= 0:
+        raise HTTPException(status_code=400, detail="windows must be a comma separated list of seconds")
+
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, latencyLedger.report, dbc, seconds)
+
+
+@app.get('/queries')
+async def getQueries(top: int = 20, username: str = Depends(get_current_username)):
+    #statements of this process by total, slowest and mean duration and by executions, plus the latest slow ones with their plans
+    return queryLog.report(top)
+
+
+def check_profile(seconds):
+    if seconds <= 0 or seconds > profileMax:
+        raise HTTPException(status_code=400, detail="seconds must be between 0 and " + str(profileMax))
+
+
+@app.get('/profile')
+async def getProfile(seconds: float = 10, interval: float = 0.005, username: str = Depends(get_current_username)):
+    #collapsed stacks of all threads sampled for seconds, feed them to flamegraph.pl or speedscope
+    check_profile(seconds)
+    loop = asyncio.get_event_loop()
+
+    try:
+        stacks = await loop.run_in_executor(None, profiler.profile, seconds, max(interval, 0.001))
+    except profiler.ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    return Response(content=stacks, media_type='text/plain')
+
+
+@app.get('/profile/memory')
+async def getMemoryProfile(seconds: float = 60, top: int = 25, frames: int = 1, username: str = Depends(get_current_username)):
+    #allocations that grew over seconds, by line or by the newest frames of their call stack
+    check_profile(seconds)
+    loop = asyncio.get_event_loop()
+
+    try:
+        return await loop.run_in_executor(None, profiler.memoryDiff, seconds, top, min(max(frames, 1), 25))
+    except profiler.ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
 @app.get('/tnAddress/{address}', response_model=cAdresses)
 async def checkTunnel(address: str):
     address = re.sub('[\W_]+', '', address)
@@ -226,55 +385,88 @@ async def checkTunnel(address: str):
 async def createTunnel(targetAddress: str):
     targetAddress = re.sub('[\W_]+', '', targetAddress)
 
-    if not tnCalls(config, dbc).validateaddress(targetAddress):
+    if not tnc.validateaddress(targetAddress):
         return cExecResult(successful=0, address='')
 
     if targetAddress == config['dcc']['gatewayAddress']:
         return {'successful': '0'}
 
-    result = dbc.getSourceAddress(targetAddress)
-    if len(result) == 0:
-        sourceAddress = otherCalls(config, dbc).getNewAddress()
+    #concurrent requests for the same target share one DB step and one address
+    sourceAddress, created = await tunnelFlight.run(targetAddress, pool.openTunnel, targetAddress)
 
-        dbc.insTunnel("created", sourceAddress, targetAddress)
-        print("INFO: tunnel created")
+    if created:
+        log.info('tunnel created', extra=logs.SAMPLED)
         return cExecResult(successful=1, address=sourceAddress)
     else:
-        return cExecResult(successful=2, address=result[0][0])
+        return cExecResult(successful=2, address=sourceAddress)
 
 
-@app.get("/api/fullinfo", response_model=cFullInfo)
-async def api_fullinfo():
-    heights = await getHeights()
+#plain def: the bulk calls run in the threadpool instead of blocking the event loop
+@app.post('/tunnel', response_model=cTunnelResults)
+def createTunnels(request: cAddressList):
+    check_bulk(request.addresses)
+
+    results = {}
+    valid = []
+
+    for targetAddress in dict.fromkeys(re.sub('[\W_]+', '', address) for address in request.addresses):
+        if targetAddress == config['dcc']['gatewayAddress'] or not tnc.validateaddress(targetAddress):
+            results[targetAddress] = ('', None)
+        else:
+            valid.append(targetAddress)
+
+    if len(valid) > 0:
+        results.update(pool.openTunnels(valid))
+        log.info('%s tunnels requested in bulk', len(valid), extra=logs.SAMPLED)
+
+    tunnels = []
+    for targetAddress, (sourceAddress, created) in results.items():
+        if created is None:
+            tunnels.append({'targetAddress': targetAddress, 'successful': 0, 'address': ''})
+        else:
+            tunnels.append({'targetAddress': targetAddress, 'successful': 1 if created else 2, 'address': sourceAddress})
+
+    return listResponse(cTunnelResult, 'tunnels', tunnels)
+
+
+def build_fullinfo():
+    result = dbc.getHeights()
+    heights = {'DCC': result[0][1], 'Other': result[1][1]}
     tnBalance = get_tnBalance()
     otherBalance = get_otherBalance()
-    return {"chainName": config['main']['name'],
-            "assetID": config['dcc']['assetId'],
-            "tn_gateway_fee": config['dcc']['gateway_fee'],
-            "tn_network_fee": config['dcc']['network_fee'],
-            "tn_total_fee": config['dcc']['network_fee'] + config['dcc']['gateway_fee'],
-            "other_gateway_fee": config['other']['gateway_fee'],
-            "other_network_fee": config['other']['network_fee'],
-            "other_total_fee": config['other']['network_fee'] + config['other']['gateway_fee'],
-            "fee": config['dcc']['fee'],
-            "company": config['main']['company'],
-            "email": config['main']['contact-email'],
-            "telegram": config['main']['contact-telegram'],
-            "recovery_amount": config['main']['recovery_amount'],
-            "recovery_fee": config['main']['recovery_fee'],
-            "otherHeight": heights['Other'],
-            "tnHeight": heights['DCC'],
-            "tnAddress": config['dcc']['gatewayAddress'],
-            "tnColdAddress": config['dcc']['coldwallet'],
-            "otherAddress": config['other']['gatewayAddress'],
-            "otherNetwork": config['other']['network'],
-            "disclaimer": config['main']['disclaimer'],
-            "tn_balance": tnBalance,
-            "other_balance": otherBalance,
-            "minAmount": config['main']['min'],
-            "maxAmount": config['main']['max'],
-            "type": "deposit",
-            "usageinfo": ""}
+    return cFullInfo(**{"chainName": config['main']['name'],
+                        "assetID": config['dcc']['assetId'],
+                        "tn_gateway_fee": config['dcc']['gateway_fee'],
+                        "tn_network_fee": config['dcc']['network_fee'],
+                        "tn_total_fee": config['dcc']['network_fee'] + config['dcc']['gateway_fee'],
+                        "other_gateway_fee": config['other']['gateway_fee'],
+                        "other_network_fee": config['other']['network_fee'],
+                        "other_total_fee": config['other']['network_fee'] + config['other']['gateway_fee'],
+                        "fee": config['dcc']['fee'],
+                        "company": config['main']['company'],
+                        "email": config['main']['contact-email'],
+                        "telegram": config['main']['contact-telegram'],
+                        "recovery_amount": config['main']['recovery_amount'],
+                        "recovery_fee": config['main']['recovery_fee'],
+                        "otherHeight": heights['Other'],
+                        "tnHeight": heights['DCC'],
+                        "tnAddress": config['dcc']['gatewayAddress'],
+                        "tnColdAddress": config['dcc']['coldwallet'],
+                        "otherAddress": config['other']['gatewayAddress'],
+                        "otherNetwork": config['other']['network'],
+                        "disclaimer": config['main']['disclaimer'],
+                        "tn_balance": tnBalance,
+                        "other_balance": otherBalance,
+                        "minAmount": config['main']['min'],
+                        "maxAmount": config['main']['max'],
+                        "type": "deposit",
+                        "usageinfo": ""}).json().encode('utf-8')
+
+
+@app.get("/api/fullinfo", response_model=cFullInfo)
+async def api_fullinfo(request: Request):
+    entry = await pageCache.get('fullinfo', build_fullinfo)
+    return cached_response(request, entry, 'application/json')
 
 
 @app.get("/api/deposit/{tnAddress}", response_model=cDepositWD)
@@ -291,19 +483,162 @@ async def api_wdCheck(tnAddress: str):
     return result
 
 
+@app.post("/api/deposit", response_model=cAddressStatuses)
+def api_depositChecks(request: cAddressList):
+    check_bulk(request.addresses)
+    results = checkit.checkTXs(request.addresses, 'target')
+    statuses = [dict(result, address=address, block=str(result['block'])) for address, result in results.items()]
+
+    return listResponse(cAddressStatus, 'statuses', statuses)
+
+
+@app.post("/api/wd", response_model=cAddressStatuses)
+def api_wdChecks(request: cAddressList):
+    check_bulk(request.addresses)
+    results = checkit.checkTXs(request.addresses, 'source')
+    statuses = [dict(result, address=address, block=str(result['block'])) for address, result in results.items()]
+
+    return listResponse(cAddressStatus, 'statuses', statuses)
+
+
+async def pollStatuses():
+    #with the scanners in another process (scanner.py) their writes do not reach this hub, so the subscribed
+    #statuses are read back from the db in one query per side. the hub drops what it has sent already
+    loop = asyncio.get_event_loop()
+
+    while True:
+        await asyncio.sleep(eventsPoll)
+        keys = hub.keys()
+
+        for side in ('target', 'source'):
+            addresses = [address for address, keySide in keys if keySide == side]
+            if len(addresses) == 0:
+                continue
+
+            try:
+                results = await loop.run_in_executor(None, dbc.getStatuses, addresses, side)
+            except Exception as e:
+                log.warning('reading subscribed statuses failed: %s', e, extra=logs.SAMPLED)
+                continue
+
+            for address, result in results.items():
+                hub.publish(address, side, result)
+
+
+def warm_up():
+    #builds the shared objects and checks that the db has been set up by the scanner side
+    dbc.get()
+    tnc.get()
+    checkit.get()
+    pool.get()
+    assets.get()
+
+    if len(dbc.getHeights()) < 2:
+        raise Exception('db is not initialised yet')
+
+
+async def warmUpLoop():
+    loop = asyncio.get_event_loop()
+
+    while not readiness['ready']:
+        try:
+            await loop.run_in_executor(None, warm_up)
+            readiness['ready'] = True
+            readiness['error'] = ''
+            log.info('gateway API ready')
+        except Exception as e:
+            readiness['error'] = str(e)
+            await asyncio.sleep(1)
+
+
+@app.on_event("startup")
+async def startup():
+    #only schedules work, the listener comes up without waiting for the db or the nodes
+    asyncio.ensure_future(warmUpLoop())
+
+    if eventsPoll > 0:
+        asyncio.ensure_future(pollStatuses())
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    if dbc.built():
+        dbc.close()
+
+
+@app.get('/api/live')
+async def api_live():
+    return {'status': 'ok'}
+
+
+@app.get('/api/ready')
+async def api_ready():
+    if readiness['ready']:
+        return {'ready': True, 'error': ''}
+
+    return fastJSONResponse({'ready': False, 'error': readiness['error']}, status_code=503)
+
+
+async def statusEvents(request: Request, sub, current):
+    #the current status of every key first, then each change as the scanners and the controller write it
+    try:
+        for message in current:
+            yield 'event: status\ndata: ' + json.dumps(message) + '\n\n'
+
+        while not await request.is_disconnected():
+            try:
+                message = await sub.get(15)
+                yield 'event: status\ndata: ' + json.dumps(message) + '\n\n'
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+    finally:
+        hub.unsubscribe(sub)
+
+
+@app.get("/api/events")
+async def api_statusEvents(request: Request, deposit: str = '', wd: str = ''):
+    #Server-Sent Events, e.g. /api/events?deposit=addr1,addr2&wd=addr3
+    addresses = {'target': [address for address in deposit.split(',') if address != ''],
+                 'source': [address for address in wd.split(',') if address != '']}
+    check_bulk(addresses['target'] + addresses['source'])
+
+    for side in addresses:
+        for address in addresses[side]:
+            if not tnc.validateaddress(address):
+                raise HTTPException(status_code=400, detail="invalid address " + address)
+
+    #subscribed before reading, so no change between the read and the subscription gets lost
+    sub = hub.subscribe([(address, side) for side in addresses for address in addresses[side]])
+
+    current = []
+    loop = asyncio.get_event_loop()
+    try:
+        for side in addresses:
+            results = await loop.run_in_executor(None, dbc.getStatuses, addresses[side], side)
+            for address, result in results.items():
+                hub.seed(address, side, result)
+                message = {'address': address, 'side': side}
+                message.update(result)
+                current.append(message)
+    except Exception:
+        hub.unsubscribe(sub)
+        raise
+
+    return StreamingResponse(statusEvents(request, sub, current), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
 @app.get("/api/checktxs/{tnAddress}", response_model=cTxs)
 async def api_checktxs(tnAddress: str):
-    if not tnCalls(config, dbc).validateaddress(tnAddress):
-        temp = cTxs(error='invalid address')
-    else:
-        result = dbc.checkTXs(address=tnAddress)
+    if not tnc.validateaddress(tnAddress):
+        return fastJSONResponse({'transactions': [], 'error': 'invalid address'})
 
-        if 'error' in result:
-            temp = cTxs(error=result['error'])
-        else:
-            temp = cTxs(transactions=result)
+    result = dbc.checkTXs(address=tnAddress)
 
-    return temp
+    if 'error' in result:
+        return fastJSONResponse({'transactions': [], 'error': result['error']})
+    else:
+        return listResponse(cTx, 'transactions', result, error='')
 
 
 @app.get("/api/checktxs", response_model=cTxs)
@@ -311,11 +646,9 @@ async def api_checktxs():
     result = dbc.checkTXs(address='')
 
     if 'error' in result:
-        temp = cTxs(error=result['error'])
+        return fastJSONResponse({'transactions': [], 'error': result['error']})
     else:
-        temp = cTxs(transactions=result)
-
-    return temp
+        return listResponse(cTx, 'transactions', result, error='')
 
 
 @app.get('/api/fees/{fromdate}/{todate}', response_model=cFees)
@@ -333,6 +666,21 @@ async def api_getFees():
     return dbc.getFees('', '')
 
 
+@app.get('/api/daily/{fromdate}/{todate}', response_model=cDailyStats)
+async def api_getDailyStats(fromdate: str, todate: str):
+    return listResponse(cDayStats, 'days', dbc.getDailyStats(fromdate, todate))
+
+
+@app.get('/api/daily/{fromdate}', response_model=cDailyStats)
+async def api_getDailyStats(fromdate: str):
+    return listResponse(cDayStats, 'days', dbc.getDailyStats(fromdate, ''))
+
+
+@app.get('/api/daily', response_model=cDailyStats)
+async def api_getDailyStats():
+    return listResponse(cDayStats, 'days', dbc.getDailyStats('', ''))
+
+
 @app.get('/api/health', response_model=cHealth)
 async def api_getHealth():
     return checkit.checkHealth()
@@ -0,0 +1,96 @@
+import asyncio
+import threading
+
+import metrics
+
+metrics.describe('gateway_status_subscribers', 'gauge', 'open status subscriptions')
+metrics.describe('gateway_status_published_total', 'counter', 'status changes delivered to subscribers')
+metrics.describe('gateway_status_dropped_total', 'counter', 'status changes dropped for slow subscribers')
+
+class subscription(object):
+    #the queue of one client, filled from any thread and read on the event loop that created it
+    def __init__(self, keys, maxsize = 100):
+        self.keys = keys
+        self.loop = asyncio.get_event_loop()
+        self.queue = asyncio.Queue(maxsize)
+
+    def put(self, message):
+        #runs on the loop, a client that does not keep up loses its oldest messages, not the newest
+        if self.queue.full():
+            self.queue.get_nowait()
+            metrics.inc('gateway_status_dropped_total')
+
+        self.queue.put_nowait(message)
+
+    async def get(self, timeout):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+class statusHub(object):
+    #in-process publish/subscribe of the (address, side) status rows. the storage hooks publish every row
+    #they write, subscribers only get told when the status of one of their keys actually changed
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = {}
+        self.last = {}
+
+    def subscribe(self, keys):
+        #keys are (address, side) pairs, called on the event loop that reads the subscription
+        sub = subscription(list(keys))
+
+        with self.lock:
+            for key in sub.keys:
+                self.subscribers.setdefault(key, []).append(sub)
+
+            metrics.setGauge('gateway_status_subscribers', self.count())
+
+        return sub
+
+    def unsubscribe(self, sub):
+        with self.lock:
+            for key in sub.keys:
+                subs = self.subscribers.get(key, [])
+
+                if sub in subs:
+                    subs.remove(sub)
+
+                if len(subs) == 0:
+                    self.subscribers.pop(key, None)
+                    self.last.pop(key, None)
+
+            metrics.setGauge('gateway_status_subscribers', self.count())
+
+    def keys(self):
+        with self.lock:
+            return list(self.subscribers)
+
+    def seed(self, address, side, result):
+        #the status a new subscriber got first, so the next poll does not send it again as a change
+        with self.lock:
+            if (address, side) in self.subscribers:
+                self.last.setdefault((address, side), result)
+
+    def count(self):
+        return len(set(id(sub) for subs in self.subscribers.values() for sub in subs))
+
+    def publish(self, address, side, result):
+        key = (address, side)
+
+        with self.lock:
+            subs = list(self.subscribers.get(key, []))
+            if len(subs) == 0 or self.last.get(key) == result:
+                return
+
+            self.last[key] = result
+
+        message = {'address': address, 'side': side}
+        message.update(result)
+
+        for sub in subs:
+            try:
+                sub.loop.call_soon_threadsafe(sub.put, message)
+                metrics.inc('gateway_status_published_total')
+            except RuntimeError:
+                #the loop of the subscriber is already closed
+                self.unsubscribe(sub)
+
+hub = statusHub()
@@ -0,0 +1,82 @@
+import time
+
+import logs
+from spans import percentile
+
+log = logs.get(__name__)
+
+#the lifecycle of every transfer in the latency table: the block time of the user's transaction, its detection
+#in checkBlock, the payout being sent, its confirmation in verifyTx and the completed tunnel. a failing ledger
+#write is only reported, it never stops a payout
+STAGES = (('scan', 'blockTime', 'detected'),
+          ('send', 'detected', 'sent'),
+          ('confirm', 'sent', 'confirmed'),
+          ('complete', 'confirmed', 'completed'),
+          ('total', 'blockTime', 'completed'))
+COLUMNS = ('direction', 'blockTime', 'detected', 'sent', 'confirmed', 'completed')
+
+def detected(db, sourceTxId, direction, blockTime, at = None):
+    try:
+        db.insLatency(sourceTxId, direction, blockTime, time.time() if at is None else at)
+    except Exception as e:
+        log.warning('latency of %s not recorded: %s', sourceTxId, e)
+
+def reached(db, stage, sourceTxId = '', payoutTxId = ''):
+    try:
+        db.updLatency(stage, time.time(), sourceTxId, payoutTxId)
+    except Exception as e:
+        log.warning('latency of %s not recorded: %s', sourceTxId or payoutTxId, e)
+
+def sent(db, sourceTxId, payoutTxId):
+    reached(db, 'sent', sourceTxId=sourceTxId, payoutTxId=payoutTxId)
+
+def confirmed(db, payoutTxId):
+    reached(db, 'confirmed', payoutTxId=payoutTxId)
+
+def completed(db, payoutTxId):
+    reached(db, 'completed', payoutTxId=payoutTxId)
+
+def summary(values):
+    values = sorted(values)
+
+    if len(values) == 0:
+        return {'count': 0}
+
+    return {'count': len(values),
+            'p50': round(percentile(values, 0.5), 3),
+            'p90': round(percentile(values, 0.9), 3),
+            'p99': round(percentile(values, 0.99), 3),
+            'max': round(values[-1], 3)}
+
+def report(db, windows):
+    #seconds per direction and stage for the transfers detected within each window (seconds), plus the
+    #transfers of the window that have not completed yet
+    now = time.time()
+    rows = db.getLatencies(now - max(windows))
+    result = {}
+
+    for window in windows:
+        directions = {}
+
+        for row in rows:
+            row = dict(zip(COLUMNS, row))
+
+            if row['detected'] < now - window:
+                continue
+
+            direction = directions.setdefault(row['direction'], {'transfers': 0, 'pending': 0, 'stages': dict((stage, []) for stage, start, end in STAGES)})
+            direction['transfers'] += 1
+
+            if row['completed'] is None:
+                direction['pending'] += 1
+
+            for stage, start, end in STAGES:
+                if row[start] is not None and row[end] is not None:
+                    direction['stages'][stage].append(max(row[end] - row[start], 0))
+
+        for direction in directions.values():
+            direction['stages'] = dict((stage, summary(values)) for stage, values in direction['stages'].items())
+
+        result[str(window)] = directions
+
+    return result
@@ -0,0 +1,151 @@
+import atexit
+import copy
+import datetime
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+
+import metrics
+
+#diagnostics of all modules as JSON lines. callers only put records on a queue, a listener thread writes them,
+#so a slow log sink never blocks a scanner. every module logs to gateway.<module>, with its own level if set
+ROOT = 'gateway'
+configLock = threading.Lock()
+listeners = []
+
+metrics.describe('gateway_log_dropped_total', 'counter', 'log records dropped because the log queue was full')
+metrics.describe('gateway_log_suppressed_total', 'counter', 'log records left out by sampling by logger')
+
+def get(name):
+    return logging.getLogger(ROOT + '.' + name)
+
+class jsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {'time': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec='milliseconds'),
+                 'level': record.levelname,
+                 'logger': record.name[len(ROOT) + 1:] if record.name.startswith(ROOT + '.') else record.name,
+                 'thread': record.threadName,
+                 'message': record.getMessage()}
+
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed > 0:
+            entry['suppressed'] = suppressed
+
+        if record.exc_info:
+            record.exc_text = self.formatException(record.exc_info)
+
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+
+        return json.dumps(entry, default=str)
+
+class queueHandler(logging.handlers.QueueHandler):
+    #never waits for the listener, a full queue drops the record and counts it
+    def prepare(self, record):
+        #the message and traceback are rendered here, the arguments may change once the caller goes on
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.inc('gateway_log_dropped_total')
+
+#extra= of the log calls that may be sampled, e.g. one per API request. all other records are always logged,
+#so payouts and errors are never left out
+SAMPLED = {'sample': True}
+
+class sampler(logging.Filter):
+    #lets the first burst records of a sampled message through per window of seconds, the next one passed on tells
+    #how many were suppressed in between. messages are told apart by logger, level and format string
+    def __init__(self, burst, seconds):
+        super().__init__()
+        self.burst = burst
+        self.seconds = seconds
+        self.windows = {}
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        if self.burst <= 0 or not getattr(record, 'sample', False):
+            return True
+
+        key = (record.name, record.levelno, str(record.msg))
+
+        with self.lock:
+            window = self.windows.get(key)
+
+            if window is None or record.created - window[0] >= self.seconds:
+                if window is not None and window[1] > self.burst:
+                    record.suppressed = window[1] - self.burst
+
+                if len(self.windows) >= 10000:
+                    self.windows.clear()
+
+                self.windows[key] = [record.created, 1]
+                return True
+
+            window[1] += 1
+
+            if window[1] <= self.burst:
+                return True
+
+        metrics.inc('gateway_log_suppressed_total', logger=record.name)
+        return False
+
+class queueListener(logging.handlers.QueueListener):
+    #a full queue at shutdown waits for the writer instead of failing
+    def enqueue_sentinel(self):
+        try:
+            self.queue.put(self._sentinel, timeout=10)
+        except queue.Full:
+            pass
+
+def configure(config):
+    #once per process, from the entry points. until then only warnings and errors reach stderr
+    with configLock:
+        if len(listeners) > 0:
+            return
+
+        main = config['main']
+        root = logging.getLogger(ROOT)
+        root.setLevel(main.get('log-level', 'INFO').upper())
+        root.propagate = False
+
+        for name, level in main.get('log-levels', {}).items():
+            get(name).setLevel(level.upper())
+
+        path = main.get('log-file', '')
+        if path == '':
+            target = logging.StreamHandler(sys.stdout)
+        else:
+            target = logging.handlers.RotatingFileHandler(path, maxBytes=main.get('log-file-size', 10485760), backupCount=main.get('log-file-count', 5))
+
+        target.setFormatter(jsonFormatter())
+
+        handler = queueHandler(queue.Queue(main.get('log-queue', 10000)))
+        handler.addFilter(sampler(main.get('log-sample-burst', 10), main.get('log-sample-seconds', 60)))
+        root.addHandler(handler)
+
+        listener = queueListener(handler.queue, target)
+        listener.start()
+        listeners.append(listener)
+        atexit.register(stop)
+
+def stop():
+    #writes what is still queued
+    with configLock:
+        for listener in listeners:
+            listener.stop()
+
+        del listeners[:]
@@ -0,0 +1,204 @@
+import base64
+import bisect
+import functools
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import spans
+
+#process wide counters, gauges and histograms, rendered in the Prometheus text format on /metrics
+lock = threading.Lock()
+kinds = {}
+helps = {}
+values = {}
+buckets = {}
+
+#seconds, from a cached db read up to a verification that waits for the chain
+TIMEBUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+def describe(name, kind, help, bounds = TIMEBUCKETS):
+    with lock:
+        kinds[name] = kind
+        helps[name] = help
+        values.setdefault(name, {})
+
+        if kind == 'histogram':
+            buckets[name] = tuple(bounds)
+
+def labelKey(labels):
+    return tuple(sorted(labels.items()))
+
+def inc(name, value = 1, **labels):
+    incKey(name, labelKey(labels), value)
+
+def incKey(name, key, value = 1):
+    with lock:
+        series = values.setdefault(name, {})
+        series[key] = series.get(key, 0) + value
+
+def setGauge(name, value, **labels):
+    with lock:
+        values.setdefault(name, {})[labelKey(labels)] = value
+
+def observe(name, value, **labels):
+    observeKey(name, labelKey(labels), value)
+
+def observeKey(name, key, value):
+    #histograms keep [counts per bucket, sum, count], the counts are made cumulative when rendered
+    bounds = buckets.get(name, TIMEBUCKETS)
+    index = bisect.bisect_left(bounds, value)
+
+    with lock:
+        series = values.setdefault(name, {})
+        histogram = series.get(key)
+
+        if histogram is None:
+            histogram = series[key] = [[0] * (len(bounds) + 1), 0.0, 0]
+
+        histogram[0][index] += 1
+        histogram[1] += value
+        histogram[2] += 1
+
+def get(name, **labels):
+    #the value, or the number of observations for a histogram
+    with lock:
+        value = values.get(name, {}).get(labelKey(labels), 0)
+
+    if isinstance(value, list):
+        return value[2]
+
+    return value
+
+class timer(object):
+    #with metrics.timer(name, **labels): observes the duration of the block in seconds
+    def __init__(self, name, **labels):
+        self.name = name
+        self.key = labelKey(labels)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, excType, excValue, tb):
+        observeKey(self.name, self.key, time.perf_counter() - self.start)
+        return False
+
+def errorsName(name):
+    return name.replace('_seconds', '') + '_errors_total'
+
+def timedMethod(func, name, method, labels, stage):
+    key = labelKey(dict(labels, method=method))
+    errors = errorsName(name)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        inStage = stage is not None and spans.enter(stage)
+        start = time.perf_counter()
+
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            incKey(errors, key)
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            observeKey(name, key, duration)
+
+            if inStage:
+                spans.leave(duration)
+
+    return wrapper
+
+def instrument(cls, name, help, methods, stage = None, **labels):
+    #times every call of the given methods of cls in the histogram name, labelled with the method.
+    #failed calls are also counted in <name without _seconds>_errors_total, with a stage the calls made
+    #while a block is checked also show up as that stage in its span summary
+    describe(name, 'histogram', help)
+    describe(errorsName(name), 'counter', 'failed calls counted in ' + name)
+
+    for method in methods:
+        func = getattr(cls, method, None)
+
+        if callable(func) and not getattr(func, 'instrumented', False):
+            wrapper = timedMethod(func, name, method, labels, stage)
+            wrapper.instrumented = True
+            setattr(cls, method, wrapper)
+
+def publicMethods(cls):
+    return [name for name, value in vars(cls).items() if callable(value) and not name.startswith('_')]
+
+def formatLabels(key):
+    if len(key) == 0:
+        return ''
+
+    return '{' + ','.join('%s="%s"' % (label, str(value).replace('\\', '\\\\').replace('"', '\\"')) for label, value in key) + '}'
+
+def formatBound(bound):
+    return repr(float(bound))
+
+def render():
+    lines = []
+
+    with lock:
+        for name in sorted(values):
+            if name in helps:
+                lines.append('# HELP %s %s' % (name, helps[name]))
+                lines.append('# TYPE %s %s' % (name, kinds[name]))
+
+            for key, value in sorted(values[name].items()):
+                if isinstance(value, list):
+                    counts, total, count = value
+                    cumulative = 0
+
+                    for bound, bucketCount in zip(buckets.get(name, TIMEBUCKETS) + ('+Inf',), counts):
+                        cumulative += bucketCount
+                        le = bound if bound == '+Inf' else formatBound(bound)
+                        lines.append('%s_bucket%s %d' % (name, formatLabels(key + (('le', le),)), cumulative))
+
+                    lines.append('%s_sum%s %s' % (name, formatLabels(key), repr(float(total))))
+                    lines.append('%s_count%s %d' % (name, formatLabels(key), count))
+                else:
+                    lines.append('%s%s %s' % (name, formatLabels(key), repr(float(value))))
+
+    return '\n'.join(lines) + '\n'
+
+def serve(port, username, password, pages = None):
+    #/metrics of a process without the API, e.g. scanner.py, behind the same basic auth as the API.
+    #pages maps further paths to functions returning (body, content type)
+    pages = dict(pages or {})
+    pages['/metrics'] = lambda: (render(), 'text/plain; version=0.0.4')
+    expected = 'Basic ' + base64.b64encode((username + ':' + password).encode('utf-8')).decode('ascii')
+
+    class handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if not secrets.compare_digest(self.headers.get('Authorization', ''), expected):
+                self.send_response(401)
+                self.send_header('WWW-Authenticate', 'Basic')
+                self.end_headers()
+                return
+
+            page = pages.get(self.path.split('?')[0])
+
+            if page is None:
+                self.send_response(404)
+                self.end_headers()
+                return
+
+            body, contentType = page()
+            body = body.encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', contentType)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('0.0.0.0', port), handler)
+    serverThread = threading.Thread(target=server.serve_forever, daemon=True)
+    serverThread.start()
+
+    return server
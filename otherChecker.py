@@ -1,21 +1,22 @@
 import time
-import traceback
+import latencyLedger
+import logs
+import metrics
 import sharedfunc
-from dbClass import dbCalls
-from dbPGClass import dbPGCalls
+import spans
+from dbInterface import getDB
 from tnClass import tnCalls
 from otherClass import otherCalls
 from verification import verifier
 
+log = logs.get(__name__)
+
 class OtherChecker(object):
     def __init__(self, config, db = None):
         self.config = config
 
         if db == None:
-            if self.config['main']['use-pg']:
-                self.db = dbPGCalls(config)
-            else:
-                self.db = dbCalls(config)
+            self.db = getDB(config)
         else:
             self.db = db
 
@@ -23,22 +24,25 @@ class OtherChecker(object):
         self.verifier = verifier(config, self.db)
 
         self.lastScannedBlock = self.db.lastScannedBlock("Other")
+        sharedfunc.configureSpans(config)
 
     def run(self):
         #main routine to run continuesly
-        #print('INFO: started checking Other blocks at: ' + str(self.lastScannedBlock))
+        #log.info('started checking Other blocks at: %s', self.lastScannedBlock)
 
         while True:
             try:
                 nextblock = otherCalls(self.config, self.db).currentBlock() - self.config['other']['confirmations']
+                metrics.setGauge('gateway_scanner_lag_blocks', max(nextblock - self.lastScannedBlock, 0), chain='Other')
 
                 if nextblock > self.lastScannedBlock:
                     self.lastScannedBlock += 1
-                    self.checkBlock(self.lastScannedBlock)
+                    with metrics.timer('gateway_checkblock_seconds', chain='Other'), spans.block('Other', self.lastScannedBlock):
+                        self.checkBlock(self.lastScannedBlock)
                     self.db.updHeights(self.lastScannedBlock, "Other")
             except Exception as e:
                 self.lastScannedBlock -= 1
-                print('ERROR: Something went wrong during Other block iteration: ' + str(traceback.TracebackException.from_exception(e)))
+                log.error('something went wrong during Other block iteration: %s', e, exc_info=True)
 
             time.sleep(self.config['other']['timeInBetweenChecks'])
 
@@ -46,9 +50,14 @@ class OtherChecker(object):
         if self.db.doWeHaveTunnels:
             #check content of the block for valid transactions
             otc = otherCalls(self.config, self.db)
-            block = otc.getBlock(heightToCheck)
+            with spans.span('getBlock'):
+                block = otc.getBlock(heightToCheck)
+            metrics.observe('gateway_block_transactions', len(block['tx']), chain='Other')
+
             for transaction in block['tx']:
-                txInfo = otc.checkTx(transaction)
+                with spans.span('checkTx'):
+                    txInfo = otc.checkTx(transaction)
+                detectedAt = time.time()
 
                 if txInfo is not None:
                     txContinue = False
@@ -80,21 +89,30 @@ class OtherChecker(object):
                             self.db.updTunnel("error", sourceAddress, targetAddress, statusOld='created')
                         else:
                             try:
+                                paid = False
+                                latencyLedger.detected(self.db, txInfo['id'], 'Deposit', block['time'], detectedAt)
                                 self.db.updTunnel("sending", sourceAddress, targetAddress, statusOld='created')
-                                tx = self.tnc.sendTx(targetAddress, amount, 'Thanks for using our service!')
+                                with spans.span('sendTx'):
+                                    tx = self.tnc.sendTx(targetAddress, amount, 'Thanks for using our service!')
 
                                 if 'error' in tx:
+                                    metrics.inc('gateway_payouts_total', chain='DCC', result='failed')
                                     self.faultHandler(txInfo, "senderror", e=tx['message'])
                                     self.db.updTunnel("error", sourceAddress, targetAddress, statusOld="sending")
                                 else:
-                                    print("INFO: send tx: " + str(tx))
+                                    log.info('send tx: %s', tx)
+                                    metrics.inc('gateway_payouts_total', chain='DCC', result='sent')
+                                    paid = True
+                                    latencyLedger.sent(self.db, txInfo['id'], tx['id'])
 
-                                    self.db.insExecuted(txInfo['sender'], targetAddress, txInfo['id'], tx['id'], amountCheck, self.config['dcc']['fee'])
-                                    print('INFO: send tokens from eth to tn!')
+                                    self.db.insExecuted(txInfo['sender'], targetAddress, txInfo['id'], tx['id'], amountCheck, self.config['dcc']['fee'], 'Deposit')
+                                    log.info('send tokens from eth to tn!')
 
                                     #self.db.delTunnel(txInfo['sender'], targetAddress)
                                     self.db.updTunnel("verifying", sourceAddress, targetAddress, statusOld="sending")
                             except Exception as e:
+                                if not paid:
+                                    metrics.inc('gateway_payouts_total', chain='DCC', result='failed')
                                 self.db.updTunnel("error", sourceAddress, targetAddress, statusOld="sending")
                                 self.faultHandler(txInfo, "txerror", e=e)
                                 continue
@@ -102,28 +120,28 @@ class OtherChecker(object):
                             if len(tx) == 0:
                                 #TODO
                                 self.db.insError(sourceAddress, targetAddress, '', txInfo['id'], amountCheck, 'tx failed to send - manual intervention required')
-                                print("ERROR: tx failed to send - manual intervention required")
+                                log.error('tx failed to send - manual intervention required')
                                 self.db.updTunnel("error", sourceAddress, targetAddress, statusOld="sending")
                             else:
-                                self.tnc.verifyTx(tx, sourceAddress, targetAddress)
+                                with spans.span('verifyTx'):
+                                    self.tnc.verifyTx(tx, sourceAddress, targetAddress)
 
                             
         
     def faultHandler(self, tx, error, e=""):
         #handle transfers to the gateway that have problems
         amount = tx['amount']
-        timestampStr = sharedfunc.getnow()
 
         if error == "notunnel":
             self.db.insError(tx['sender'], '', '', tx['id'], amount, 'no tunnel found for sender')
-            print("ERROR: " + timestampStr + " - Error: no tunnel found for transaction from " + tx['sender'] + " - check errors table.")
+            log.error('no tunnel found for transaction from %s - check errors table', tx['sender'])
 
         if error == "txerror":
             targetAddress = tx['recipient']
             self.db.insError(tx['sender'], targetAddress, '', tx['id'], amount, 'tx error, possible incorrect address', str(e))
-            print("ERROR: " + timestampStr + " - Error: on outgoing transaction for transaction from " + tx['sender'] + " - check errors table.")
+            log.error('error on outgoing transaction for transaction from %s - check errors table', tx['sender'])
 
         if error == "senderror":
             targetAddress = tx['recipient']
             self.db.insError(tx['sender'], targetAddress, '', tx['id'], amount, 'tx error, check exception error', str(e))
-            print("ERROR: " + timestampStr + " - Error: on outgoing transaction for transaction from " + tx['sender'] + " - check errors table.")
+            log.error('error on outgoing transaction for transaction from %s - check errors table', tx['sender'])
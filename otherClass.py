@@ -1,24 +1,49 @@
 import os
+import threading
 import traceback
 import bitcoinrpc.authproxy as authproxy
-from dbClass import dbCalls
-from dbPGClass import dbPGCalls
+import btcAddress
+import latencyLedger
+import logs
+import metrics
+import rpcReplay
+from cacheClass import ttlCache
+from dbInterface import configKey, getDB
+
+log = logs.get(__name__)
+local = threading.local()
+
+#answers of the validate-rpc cross-check by (node, address) for all threads, the node is asked once per address
+crossChecks = ttlCache(24 * 3600)
+
+def getOther(config, db = None):
+    #shared client per config and thread, the proxy keeps a single http connection that threads can not share
+    clients = getattr(local, 'clients', None)
+    if clients is None:
+        clients = local.clients = {}
+
+    key = configKey(config)
+    if key not in clients:
+        clients[key] = otherCalls(config, db)
+
+    return clients[key]
 
 class otherCalls(object):
     def __init__(self, config, db = None):
         self.config = config
 
         if db == None:
-            if self.config['main']['use-pg']:
-                self.db = dbPGCalls(config)
-            else:
-                self.db = dbCalls(config)
+            self.db = getDB(config)
         else:
             self.db = db
 
-        self.myProxy = authproxy.AuthServiceProxy(self.config['other']['node'])
+        #recorded or replayed with rpc-mode
+        self.myProxy = rpcReplay.wrap(config, 'Other', authproxy.AuthServiceProxy(self.config['other']['node']))
 
-        self.lastScannedBlock = self.db.lastScannedBlock("Other")
+        #addresses are checked offline for known networks, the node is only asked as a cross-check or for other chains.
+        #without address-network they are validated through the node as before, whatever network it runs on
+        self.addressNetwork = self.config['other'].get('address-network', '')
+        self.validateRPC = self.config['other'].get('validate-rpc', False)
 
     def currentBlock(self):
         result = self.myProxy.getblock(self.myProxy.getbestblockhash())
@@ -43,29 +68,56 @@ class otherCalls(object):
             return "invalid address"
 
     def validateaddress(self, address):
-        return self.myProxy.validateaddress(address)['isvalid']
+        if self.addressNetwork not in btcAddress.NETWORKS:
+            return self.myProxy.validateaddress(address)['isvalid']
+
+        isValid = btcAddress.isValidAddress(address, self.addressNetwork)
+
+        if isValid and self.validateRPC:
+            key = (self.config['other']['node'], address)
+            nodeValid = crossChecks.get(key)
+
+            if nodeValid is None:
+                try:
+                    nodeValid = self.myProxy.validateaddress(address)['isvalid']
+                    crossChecks.set(key, nodeValid)
+                except Exception as e:
+                    #a failed check is not cached, the next request asks again
+                    log.warning('address cross-check with the node failed: %s', e, extra=logs.SAMPLED)
+
+            if nodeValid is False:
+                log.warning('address %s is valid offline, but not for the node', address, extra=logs.SAMPLED)
+                return False
+
+        return isValid
 
     def getNewAddress(self):
         return self.myProxy.getnewaddress()
 
+    def getNewAddresses(self, count):
+        #one JSON-RPC batch instead of a round trip per address
+        return self.myProxy.batch_([['getnewaddress']] * count)
+
     def verifyTx(self, txId, sourceAddress = '', targetAddress = ''):
         tx = self.db.getExecuted(otherTxId=txId)
 
         try:
             verified = self.myProxy.gettransaction(txId)
-            block = self.myProxy.getblock(verified['blockhash'])
+            block = self.myProxy.getblock(verified['blockhash'])['height']
 
             if verified['status'] == 1:
                 self.db.insVerified("Other", txId, block)
-                print('INFO: tx to other verified!')
+                latencyLedger.confirmed(self.db, txId)
+                log.info('tx to other verified!')
 
                 self.db.delTunnel(sourceAddress, targetAddress)
+                latencyLedger.completed(self.db, txId)
             elif verified['status'] == 0:
-                print('ERROR: tx failed to send!')
+                log.error('tx failed to send!')
                 self.resendTx(txId)
         except:
             self.db.insVerified("Other", txId, 0)
-            print('WARN: tx to other not verified!')
+            log.warning('tx to other not verified!')
   
     def getReceivers(self, tx):
         results = list()
@@ -133,6 +185,7 @@ class otherCalls(object):
             amount = failedtx[0][6]
 
             self.db.insError(sourceAddress, targetAddress, tnTxId, txid, amount, 'tx failed on network - manual intervention required')
-            print("ERROR: tx failed on network - manual intervention required: " + txid)
+            log.error('tx failed on network - manual intervention required: %s', txid)
             self.db.updTunnel("error", sourceAddress, targetAddress, statusOld="verifying")
 
+metrics.instrument(otherCalls, 'gateway_rpc_seconds', 'duration of node calls by chain and method', metrics.publicMethods(otherCalls), chain='Other')
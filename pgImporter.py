@@ -0,0 +1,320 @@
+import hashlib
+import io
+import os
+import sqlite3
+import time
+
+import logs
+
+log = logs.get(__name__)
+
+#tables the dual writes keep up to date with upserts. The backfill does not copy them, their rows would
+#collide with the upserted keys. They are rebuilt from the backfilled rows once the copy is done
+DERIVED = {'dailystats': 'rebuildRollups', 'addressstatus': 'rebuildStatus'}
+
+def copyValue(value):
+    #text format of COPY
+    if value is None:
+        return '\\N'
+    if isinstance(value, float):
+        return repr(value)
+
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+def checksumValue(row, types):
+    #normalise values so both sides hash the same, e.g. real is only single precision in Postgres
+    parts = []
+
+    for value, pgType in zip(row, types):
+        if value is None:
+            parts.append('\\N')
+        elif pgType in ('real', 'double precision', 'numeric'):
+            parts.append(format(float(value), '.6g'))
+        elif pgType.startswith('timestamp'):
+            parts.append(str(value)[:19])
+        else:
+            parts.append(str(value))
+
+    return ('\t'.join(parts) + '\n').encode()
+
+def readChunk(consq, table, names, lastrowid, chunksize, maxrowid = None):
+    #keyset paging keeps every read short, so writers on the same SQLite file are not blocked
+    sql = 'SELECT rowid, %s FROM "%s" WHERE rowid > ?' % (', '.join('"' + name + '"' for name in names), table)
+    values = [lastrowid]
+
+    if maxrowid is not None:
+        sql += ' AND rowid <= ?'
+        values.append(maxrowid)
+
+    sql += ' ORDER BY rowid LIMIT ?'
+    values.append(chunksize)
+
+    cursq = consq.cursor()
+    rows = cursq.execute(sql, values).fetchall()
+    cursq.close()
+
+    return rows
+
+class sqliteImporter(object):
+    #streams an existing SQLite gateway.db into Postgres with COPY, chunk by chunk.
+    #progress is committed together with every chunk, so an interrupted import resumes where it stopped.
+    def __init__(self, config, db, chunksize = 0):
+        self.config = config
+        self.db = db
+
+        if chunksize > 0:
+            self.chunksize = chunksize
+        else:
+            self.chunksize = self.config['postgres'].get('import-chunk', 10000)
+
+        if self.config["main"]["db-location"] != "":
+            path= os.getcwd()
+            dbfile = path + '/' + self.config["main"]["db-location"] + '/' + 'gateway.db'
+            self.dbfile = os.path.normpath(dbfile)
+        else:
+            self.dbfile = 'gateway.db'
+
+    def createProgress(self, dbCon):
+        cursor = dbCon.cursor()
+        cursor.execute('CREATE TABLE IF NOT EXISTS importprogress (tablename text PRIMARY KEY, lastrowid bigint, copied bigint, done boolean, maxrowid bigint)')
+        cursor.close()
+
+    def run(self):
+        consq = sqlite3.connect(self.dbfile)
+        dbCon = self.db.openConn()
+
+        try:
+            self.createProgress(dbCon)
+
+            tables = self.getTables(consq)
+            for table in tables:
+                self.importTable(consq, dbCon, table)
+
+            mismatches = self.verify(consq, dbCon, tables)
+
+            if len(mismatches) > 0:
+                for mismatch in mismatches:
+                    log.error('import verification failed for %s', mismatch)
+
+                raise Exception('verification of the imported SQLite DB failed')
+
+            cursor = dbCon.cursor()
+            cursor.execute('DROP TABLE importprogress')
+            cursor.close()
+        finally:
+            self.db.closeConn(dbCon)
+            consq.close()
+
+        log.info('import of SQLite DB finished and verified')
+
+    def prepareBackfill(self):
+        #used by the dual-write migration before it starts writing to both stores: empties the copied Postgres
+        #tables once and moves their sequences behind the current SQLite rows, so new rows written to both
+        #stores never collide with the rows the backfill copies later on
+        consq = sqlite3.connect(self.dbfile)
+        dbCon = self.db.openConn()
+
+        try:
+            self.createProgress(dbCon)
+
+            cursor = dbCon.cursor()
+            cursor.execute('SELECT count(*) FROM importprogress')
+            if cursor.fetchone()[0] > 0:
+                cursor.close()
+                return
+
+            cursor.execute('BEGIN')
+            for table in self.getTables(consq):
+                cursq = consq.cursor()
+                maxrowid = cursq.execute('SELECT COALESCE(MAX(rowid), 0) FROM "%s"' % table).fetchone()[0]
+                cursq.close()
+
+                cursor.execute('SELECT to_regclass(%s)', (table.lower(),))
+                if cursor.fetchone()[0] is None:
+                    continue
+
+                if table.lower() not in DERIVED:
+                    cursor.execute('TRUNCATE TABLE %s' % table)
+                    cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", (table.lower(),))
+                    sequence = cursor.fetchone()[0]
+
+                    if sequence is not None:
+                        cursor.execute('SELECT setval(%s, %s, false)', (sequence, maxrowid + 1))
+
+                cursor.execute('INSERT INTO importprogress (tablename, lastrowid, copied, done, maxrowid) VALUES (%s, 0, 0, false, %s)', (table, maxrowid))
+            cursor.execute('COMMIT')
+            cursor.close()
+        finally:
+            self.db.closeConn(dbCon)
+            consq.close()
+
+    def backfill(self):
+        #copies the rows that existed before the dual writes started, resumable like the import
+        consq = sqlite3.connect(self.dbfile)
+        dbCon = self.db.openConn()
+
+        try:
+            cursor = dbCon.cursor()
+            cursor.execute('SELECT tablename, maxrowid FROM importprogress WHERE done = false ORDER BY tablename')
+            tables = cursor.fetchall()
+
+            for table, maxrowid in tables:
+                if table.lower() not in DERIVED:
+                    self.importTable(consq, dbCon, table, maxrowid)
+
+            for table, maxrowid in tables:
+                if table.lower() in DERIVED:
+                    log.info('rebuilding %s from the backfilled rows', table)
+                    getattr(self.db, DERIVED[table.lower()])()
+                    cursor.execute('UPDATE importprogress SET done = true WHERE tablename = %s', (table,))
+            cursor.close()
+        finally:
+            self.db.closeConn(dbCon)
+            consq.close()
+        log.info('backfill of SQLite rows finished')
+
+    def getTables(self, consq):
+        cursq = consq.cursor()
+        cursq.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%' ORDER BY name")
+        tables = [item[0] for item in cursq.fetchall()]
+        cursq.close()
+
+        return tables
+
+    def getColumns(self, consq, dbCon, table):
+        #columns present on both sides, with the Postgres type of each
+        cursq = consq.cursor()
+        cursq.execute('PRAGMA table_info("%s")' % table)
+        sqColumns = [item[1] for item in cursq.fetchall()]
+        cursq.close()
+
+        cursor = dbCon.cursor()
+        cursor.execute('SELECT column_name, data_type FROM information_schema.columns WHERE table_schema = current_schema() AND table_name = %s', (table.lower(),))
+        pgTypes = dict(cursor.fetchall())
+        cursor.close()
+
+        return [(column, pgTypes[column.lower()]) for column in sqColumns if column.lower() in pgTypes]
+
+    def importTable(self, consq, dbCon, table, maxrowid = None):
+        cursor = dbCon.cursor()
+        cursor.execute('SELECT lastrowid, copied, done FROM importprogress WHERE tablename = %s', (table,))
+        progress = cursor.fetchone()
+
+        if progress is None:
+            cursor.execute('SELECT to_regclass(%s)', (table.lower(),))
+            if cursor.fetchone()[0] is None:
+                cursq = consq.cursor()
+                cursq.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name = ?", (table,))
+                cursor.execute(cursq.fetchone()[0])
+                cursq.close()
+
+            cursor.execute('BEGIN')
+            cursor.execute('TRUNCATE TABLE %s' % table)
+            cursor.execute('INSERT INTO importprogress (tablename, lastrowid, copied, done) VALUES (%s, 0, 0, false)', (table,))
+            cursor.execute('COMMIT')
+            lastrowid = 0
+            copied = 0
+        elif progress[2]:
+            log.info('%s already imported, skipping', table)
+            cursor.close()
+            return
+        else:
+            lastrowid = progress[0]
+            copied = progress[1]
+            log.info('resuming import of %s after %s rows', table, copied)
+
+        columns = self.getColumns(consq, dbCon, table)
+        names = [column[0] for column in columns]
+        copySql = 'COPY %s (%s) FROM STDIN' % (table, ', '.join('"' + name.lower() + '"' for name in names))
+
+        cursq = consq.cursor()
+        if maxrowid is None:
+            total = cursq.execute('SELECT count(*) FROM "%s"' % table).fetchone()[0]
+        else:
+            total = cursq.execute('SELECT count(*) FROM "%s" WHERE rowid <= ?' % table, (maxrowid,)).fetchone()[0]
+        cursq.close()
+
+        started = time.time()
+        startcount = copied
+        while True:
+            rows = readChunk(consq, table, names, lastrowid, self.chunksize, maxrowid)
+            if len(rows) == 0:
+                break
+
+            buffer = io.StringIO()
+            for row in rows:
+                buffer.write('\t'.join(copyValue(value) for value in row[1:]) + '\n')
+            buffer.seek(0)
+
+            lastrowid = rows[-1][0]
+            copied += len(rows)
+
+            cursor.execute('BEGIN')
+            cursor.copy_expert(copySql, buffer)
+            cursor.execute('UPDATE importprogress SET lastrowid = %s, copied = %s WHERE tablename = %s', (lastrowid, copied, table))
+            cursor.execute('COMMIT')
+
+            rate = (copied - startcount) / max(time.time() - started, 0.001)
+            log.info('importing %s: %s/%s rows (%s rows/s)', table, copied, total, int(rate))
+
+        #continue the id sequence after the imported rows, a backfill already moved it in prepareBackfill
+        if maxrowid is None and 'id' in [name.lower() for name in names]:
+            cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", (table.lower(),))
+            sequence = cursor.fetchone()[0]
+
+            if sequence is not None:
+                cursor.execute('SELECT setval(%%s, COALESCE((SELECT MAX(id) FROM %s), 0) + 1, false)' % table, (sequence,))
+
+        cursor.execute('UPDATE importprogress SET done = true WHERE tablename = %s', (table,))
+        cursor.close()
+
+    def verify(self, consq, dbCon, tables):
+        #compare row counts and a checksum over the rows of every table in id order
+        mismatches = []
+
+        for table in tables:
+            columns = self.getColumns(consq, dbCon, table)
+            names = [column[0] for column in columns]
+            types = [column[1] for column in columns]
+
+            cursq = consq.cursor()
+            sqCount = cursq.execute('SELECT count(*) FROM "%s"' % table).fetchone()[0]
+            cursq.close()
+
+            cursor = dbCon.cursor()
+            cursor.execute('SELECT count(*) FROM %s' % table)
+            pgCount = cursor.fetchone()[0]
+            cursor.close()
+
+            if sqCount != pgCount:
+                mismatches.append(table + ': ' + str(sqCount) + ' rows in SQLite, ' + str(pgCount) + ' in Postgres')
+                continue
+
+            if 'id' not in [name.lower() for name in names]:
+                continue
+
+            sqHash = hashlib.md5()
+            lastrowid = -1
+            while True:
+                rows = readChunk(consq, table, names, lastrowid, self.chunksize)
+                if len(rows) == 0:
+                    break
+
+                for row in rows:
+                    sqHash.update(checksumValue(row[1:], types))
+                lastrowid = rows[-1][0]
+
+            pgHash = hashlib.md5()
+            cursor = dbCon.cursor(name='verify_' + table.lower(), withhold=True)
+            cursor.itersize = self.chunksize
+            cursor.execute('SELECT %s FROM %s ORDER BY id' % (', '.join('"' + name.lower() + '"' for name in names), table))
+            for row in cursor:
+                pgHash.update(checksumValue(row, types))
+            cursor.close()
+
+            if sqHash.hexdigest() != pgHash.hexdigest():
+                mismatches.append(table + ': checksum differs')
+            else:
+                log.info('verified %s: %s rows', table, pgCount)
+
+        return mismatches
@@ -0,0 +1,102 @@
+import threading
+import logs
+import metrics
+from dbInterface import getDB
+from otherClass import getOther
+
+log = logs.get(__name__)
+metrics.describe('gateway_pool_depth', 'gauge', 'unused deposit addresses in the address pool')
+metrics.describe('gateway_pool_refilled_total', 'counter', 'deposit addresses generated for the address pool')
+metrics.describe('gateway_pool_claimed_total', 'counter', 'deposit addresses taken from the address pool')
+metrics.describe('gateway_pool_empty_total', 'counter', 'tunnels that found the address pool empty')
+
+#wakes the refill loop early, e.g. when a claim finds the pool empty
+refillEvent = threading.Event()
+
+class addressPool(object):
+    #keeps deposit addresses generated in advance, so creating a tunnel does not wait for getnewaddress
+    def __init__(self, config, db = None):
+        self.config = config
+
+        if db == None:
+            self.db = getDB(config)
+        else:
+            self.db = db
+
+
+        self.watermark = self.config['other'].get('pool-watermark', 50)
+        self.batch = self.config['other'].get('pool-batch', 20)
+        self.interval = self.config['other'].get('pool-interval', 10)
+
+    @property
+    def otc(self):
+        #refills run in the pool thread, claims in the threads serving the API
+        return getOther(self.config, self.db)
+
+    def run(self):
+        #main routine to run continuesly
+        if self.watermark <= 0:
+            return
+
+        log.info('starting address pool')
+
+        while True:
+            refillEvent.clear()
+
+            try:
+                self.refill()
+            except Exception as e:
+                log.error('refilling the address pool failed: %s', e, exc_info=True)
+
+            refillEvent.wait(self.interval)
+
+    def refill(self):
+        size = self.db.getPoolSize()
+
+        while size < self.watermark:
+            addresses = self.otc.getNewAddresses(min(self.batch, self.watermark - size))
+            self.db.insPoolAddresses(addresses)
+
+            metrics.inc('gateway_pool_refilled_total', len(addresses))
+            size = self.db.getPoolSize()
+
+        metrics.setGauge('gateway_pool_depth', size)
+
+    def openTunnel(self, targetAddress):
+        #(sourceAddress, created), a pool address is claimed in the same DB step that creates the tunnel
+        sourceAddress, created = self.db.createOrGetTunnel(targetAddress)
+
+        if sourceAddress != '':
+            if created:
+                metrics.inc('gateway_pool_claimed_total')
+                refillEvent.set()
+
+            return sourceAddress, created
+
+        if self.watermark > 0:
+            metrics.inc('gateway_pool_empty_total')
+            log.warning('address pool is empty', extra=logs.SAMPLED)
+            refillEvent.set()
+
+        return self.db.createOrGetTunnel(targetAddress, self.otc.getNewAddress())
+
+    def openTunnels(self, targetAddresses):
+        #openTunnel for many targets: one DB step for all, and one node batch for whatever the pool could not cover
+        result = self.db.createOrGetTunnels(targetAddresses)
+
+        created = len([1 for sourceAddress, new in result.values() if new])
+        missing = [targetAddress for targetAddress, (sourceAddress, new) in result.items() if sourceAddress == '']
+
+        if created > 0:
+            metrics.inc('gateway_pool_claimed_total', created)
+            refillEvent.set()
+
+        if len(missing) > 0:
+            if self.watermark > 0:
+                metrics.inc('gateway_pool_empty_total', len(missing))
+                log.warning('address pool is empty', extra=logs.SAMPLED)
+                refillEvent.set()
+
+            result.update(self.db.createOrGetTunnels(missing, self.otc.getNewAddresses(len(missing))))
+
+        return result
@@ -0,0 +1,90 @@
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+#on demand profiling of a running gateway: a sampling profiler over all threads and a diff of two
+#tracemalloc snapshots. one profile at a time, both only cost something while they run
+busy = threading.Lock()
+
+class ProfilerBusy(Exception):
+    pass
+
+def frameName(frame):
+    code = frame.f_code
+    return '%s (%s:%d)' % (code.co_name, os.path.basename(code.co_filename), code.co_firstlineno)
+
+def threadNames():
+    return dict((thread.ident, thread.name) for thread in threading.enumerate())
+
+def sample(stacks, names, skip):
+    for ident, frame in sys._current_frames().items():
+        if ident == skip:
+            continue
+
+        path = []
+        while frame is not None:
+            path.append(frameName(frame))
+            frame = frame.f_back
+
+        path.append(names.get(ident, 'thread-' + str(ident)))
+        key = ';'.join(reversed(path))
+        stacks[key] = stacks.get(key, 0) + 1
+
+def profile(seconds, interval = 0.005):
+    #samples the stacks of all other threads every interval for seconds and returns them collapsed,
+    #one 'thread;outer;...;inner count' line per stack, the input format of flamegraph.pl and speedscope
+    if not busy.acquire(blocking=False):
+        raise ProfilerBusy('a profile is already running')
+
+    try:
+        stacks = {}
+        names = threadNames()
+        skip = threading.get_ident()
+        end = time.perf_counter() + seconds
+
+        while time.perf_counter() < end:
+            if len(names) != threading.active_count():
+                names = threadNames()
+
+            sample(stacks, names, skip)
+            time.sleep(interval)
+    finally:
+        busy.release()
+
+    lines = ['%s %d' % (stack, count) for stack, count in sorted(stacks.items(), key=lambda item: -item[1])]
+    return '\n'.join(lines) + '\n'
+
+def memoryDiff(seconds, top = 25, frames = 1):
+    #allocations that grew between two snapshots seconds apart, by the line (or call stack of frames) they come from
+    if not busy.acquire(blocking=False):
+        raise ProfilerBusy('a profile is already running')
+
+    started = not tracemalloc.is_tracing()
+
+    try:
+        if started:
+            tracemalloc.start(frames)
+
+        before = tracemalloc.take_snapshot()
+        time.sleep(seconds)
+        after = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        if started:
+            tracemalloc.stop()
+
+        busy.release()
+
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, '<frozen importlib._bootstrap*>')]
+    stats = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), 'traceback' if frames > 1 else 'lineno')
+
+    return {'seconds': seconds,
+            'traced': current,
+            'peak': peak,
+            'growth': [{'where': [str(frame) for frame in stat.traceback],
+                        'size': stat.size,
+                        'sizeDiff': stat.size_diff,
+                        'count': stat.count,
+                        'countDiff': stat.count_diff} for stat in stats if stat.size_diff > 0][:top]}
@@ -0,0 +1,154 @@
+import collections
+import json
+import logging
+import logging.handlers
+import re
+import threading
+import time
+
+import logs
+
+log = logs.get(__name__)
+
+#duration of every statement of the sql backends, by backend and statement. statements slower than the
+#threshold are logged with their query plan and redacted parameters to a rotating log
+lock = threading.Lock()
+stats = {}
+normalized = {}
+plans = {}
+recent = collections.deque(maxlen=50)
+logger = logging.getLogger('gateway.queries')
+logger.propagate = False
+logger.setLevel(logging.INFO)
+settings = {'threshold': 0.1, 'path': ''}
+
+#plans are captured again after this many seconds, the tables they depend on keep growing
+PLANTTL = 600
+EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH', 'REPLACE', 'EXECUTE')
+PLACEHOLDERS = re.compile(r'(\?|%s|\$\d+)(\s*,\s*(\?|%s|\$\d+))+')
+VALUELISTS = re.compile(r'VALUES\s*(\([^()]*\))(\s*,\s*\([^()]*\))+', re.IGNORECASE)
+LITERALS = re.compile(r"'(?:[^']|'')*'")
+SPACES = re.compile(r'\s+')
+
+def configure(thresholdMs, path, maxBytes = 10485760, backupCount = 5):
+    with lock:
+        settings['threshold'] = thresholdMs / 1000.0
+
+        if path == settings['path']:
+            return
+
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+            handler.close()
+
+        if path != '':
+            handler = logging.handlers.RotatingFileHandler(path, maxBytes=maxBytes, backupCount=backupCount)
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            logger.addHandler(handler)
+
+        settings['path'] = path
+
+def normalize(statement, inlined = False):
+    #one entry per statement, whatever the number of placeholders of its IN lists and multi row VALUES.
+    #statements with inlined values, e.g. from execute_values, lose their string literals
+    text = normalized.get(statement)
+
+    if text is None:
+        text = SPACES.sub(' ', statement).strip()
+
+        if inlined:
+            text = LITERALS.sub('?', text)
+
+        text = PLACEHOLDERS.sub(r'\1, ...', text)
+        text = VALUELISTS.sub(r'VALUES \1, ...', text)
+
+        if not inlined and len(normalized) < 10000:
+            normalized[statement] = text
+
+    return text
+
+def redact(params, many = False):
+    #types and sizes only, the values are addresses, transaction ids and amounts of users
+    if many:
+        return '<%d rows>' % len(params)
+
+    if params is None:
+        return []
+
+    return ['<%s:%d>' % (type(value).__name__, len(value)) if isinstance(value, (str, bytes)) else '<%s>' % type(value).__name__ for value in params]
+
+def isExplainable(statement):
+    return statement.lstrip().upper().startswith(EXPLAINABLE)
+
+def record(backend, statement, seconds, params = None, many = False, explain = None, inlined = False):
+    #explain(statement, params) returns the plan as a list of lines, it is only called for slow statements
+    key = (backend, normalize(statement, inlined))
+
+    with lock:
+        stat = stats.get(key)
+
+        if stat is None:
+            stat = stats[key] = [0, 0.0, 0.0]
+
+        stat[0] += 1
+        stat[1] += seconds
+        stat[2] = max(stat[2], seconds)
+
+    if seconds >= settings['threshold']:
+        logSlow(key, statement, seconds, params, many, explain)
+
+def plan(key, statement, params, many, explain):
+    cached = plans.get(key)
+
+    if cached is not None and time.time() - cached[0] < PLANTTL:
+        return cached[1]
+
+    if explain is None or not isExplainable(statement):
+        lines = []
+    else:
+        try:
+            lines = explain(statement, params[0] if many and len(params) > 0 else params)
+        except Exception as e:
+            lines = ['explain failed: ' + str(e)]
+
+    plans[key] = (time.time(), lines)
+    return lines
+
+def logSlow(key, original, seconds, params, many, explain):
+    backend, statement = key
+    entry = {'time': round(time.time(), 3),
+             'backend': backend,
+             'seconds': round(seconds, 6),
+             'statement': statement,
+             'params': redact(params, many),
+             'plan': plan(key, original, params, many, explain)}
+
+    recent.append(entry)
+
+    if len(logger.handlers) > 0:
+        logger.info(json.dumps(entry))
+    else:
+        log.warning('slow query (%sms): %s', round(seconds * 1000), statement)
+
+def report(top = 20):
+    #the top statements by total, slowest single and mean duration and by number of executions, plus the latest slow ones
+    with lock:
+        rows = [{'backend': backend,
+                 'statement': statement,
+                 'count': count,
+                 'totalSeconds': round(total, 6),
+                 'meanSeconds': round(total / count, 6),
+                 'maxSeconds': round(maximum, 6)} for (backend, statement), (count, total, maximum) in stats.items()]
+
+    return {'threshold': settings['threshold'],
+            'total': sorted(rows, key=lambda row: -row['totalSeconds'])[:top],
+            'slowest': sorted(rows, key=lambda row: -row['maxSeconds'])[:top],
+            'mean': sorted(rows, key=lambda row: -row['meanSeconds'])[:top],
+            'frequent': sorted(rows, key=lambda row: -row['count'])[:top],
+            'slow': list(recent)[-top:]}
+
+def reset():
+    with lock:
+        stats.clear()
+        plans.clear()
+        recent.clear()
@@ -0,0 +1,188 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+#content types worth compressing, images and fonts are compressed already
+COMPRESSIBLE = ('text/', 'application/json', 'application/javascript', 'image/svg+xml')
+
+def dumps(content):
+    #bytes of content as JSON, orjson when it is installed
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    else:
+        return json.dumps(content, separators=(',', ':')).encode('utf-8')
+
+class fastJSONResponse(Response):
+    #for list endpoints: the content is serialized as is, the rows are not run through the response model
+    media_type = 'application/json'
+
+    def render(self, content):
+        return dumps(content)
+
+def listResponse(model, key, rows, **fields):
+    #{key: rows, **fields}, the first row is validated against model once instead of every row
+    if len(rows) > 0:
+        model(**rows[0])
+
+    content = dict(fields)
+    content[key] = rows
+    return fastJSONResponse(content)
+
+def acceptedEncoding(header):
+    #br over gzip, an encoding with q=0 is refused
+    accepted = {}
+
+    for part in header.split(','):
+        items = part.strip().split(';')
+        quality = 1.0
+
+        for item in items[1:]:
+            item = item.strip()
+            if item.startswith('q='):
+                try:
+                    quality = float(item[2:])
+                except ValueError:
+                    quality = 0.0
+
+        accepted[items[0].strip().lower()] = quality
+
+    if brotli is not None and accepted.get('br', 0) > 0:
+        return 'br'
+    elif accepted.get('gzip', 0) > 0 or accepted.get('*', 0) > 0:
+        return 'gzip'
+    else:
+        return ''
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body)
+    else:
+        return gzip.compress(body, 6)
+
+def isCompressible(mediaType):
+    return mediaType.startswith(COMPRESSIBLE) and not mediaType.startswith('text/event-stream')
+
+class compressionMiddleware(object):
+    #negotiated br/gzip for responses sent in one piece, streamed and already encoded responses pass unchanged
+    def __init__(self, app, minimum_size = 500):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict((key.decode('latin-1').lower(), value.decode('latin-1')) for key, value in scope['headers'])
+        encoding = acceptedEncoding(headers.get('accept-encoding', ''))
+
+        if encoding == '':
+            await self.app(scope, receive, send)
+            return
+
+        start = {}
+
+        async def compressingSend(message):
+            if message['type'] == 'http.response.start':
+                #held back until the body shows whether it gets compressed
+                start.update(message)
+                return
+
+            if message['type'] != 'http.response.body' or len(start) == 0:
+                await send(message)
+                return
+
+            responseHeaders = dict((key.decode('latin-1').lower(), value.decode('latin-1')) for key, value in start['headers'])
+            body = message.get('body', b'')
+
+            if message.get('more_body', False) or 'content-encoding' in responseHeaders \
+                    or not isCompressible(responseHeaders.get('content-type', '')) or len(body) < self.minimum_size:
+                await send(start)
+            else:
+                body = compress(body, encoding)
+                rawHeaders = [(key, value) for key, value in start['headers'] if key.lower() not in (b'content-length', b'vary')]
+                rawHeaders.append((b'content-encoding', encoding.encode('latin-1')))
+                rawHeaders.append((b'content-length', str(len(body)).encode('latin-1')))
+                rawHeaders.append((b'vary', b'Accept-Encoding'))
+                await send(dict(start, headers=rawHeaders))
+                message = dict(message, body=body)
+
+            start.clear()
+            await send(message)
+
+        await self.app(scope, receive, compressingSend)
+
+class staticAssets(object):
+    #the files of a directory kept in memory together with their precompressed versions. url() adds the content
+    #hash, so a versioned url can be cached forever and changes as soon as the file does
+    FOREVER = 'public, max-age=31536000, immutable'
+    UNVERSIONED = 'public, max-age=300'
+
+    def __init__(self, directory, prefix = '/static/'):
+        self.directory = directory
+        self.prefix = prefix
+        self.files = {}
+
+        for root, dirs, names in os.walk(directory):
+            for name in names:
+                path = os.path.join(root, name)
+                self.add(os.path.relpath(path, directory).replace(os.sep, '/'), path)
+
+    def add(self, name, path):
+        with open(path, 'rb') as assetFile:
+            body = assetFile.read()
+
+        mediaType = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        variants = {'': body}
+
+        if isCompressible(mediaType) and len(body) > 0:
+            variants['gzip'] = compress(body, 'gzip')
+            if brotli is not None:
+                variants['br'] = compress(body, 'br')
+
+        version = hashlib.sha1(body).hexdigest()[:12]
+        self.files[name] = {'variants': variants, 'mediaType': mediaType, 'version': version, 'etag': '"' + version + '"'}
+
+    def url(self, name):
+        asset = self.files.get(name)
+
+        if asset is None:
+            return self.prefix + name
+
+        return self.prefix + name + '?v=' + asset['version']
+
+    def response(self, name, headers, version = ''):
+        asset = self.files.get(name)
+
+        if asset is None:
+            return Response(status_code=404)
+
+        responseHeaders = {'ETag': asset['etag'], 'Cache-Control': self.FOREVER if version == asset['version'] else self.UNVERSIONED}
+
+        if len(asset['variants']) > 1:
+            responseHeaders['Vary'] = 'Accept-Encoding'
+
+        if asset['etag'] in [tag.strip() for tag in headers.get('if-none-match', '').split(',')]:
+            return Response(status_code=304, headers=responseHeaders)
+
+        encoding = acceptedEncoding(headers.get('accept-encoding', ''))
+        if encoding not in asset['variants']:
+            encoding = ''
+        if encoding != '':
+            responseHeaders['Content-Encoding'] = encoding
+
+        return Response(content=asset['variants'][encoding], media_type=asset['mediaType'], headers=responseHeaders)
@@ -0,0 +1,258 @@
+import atexit
+import collections
+import decimal
+import glob
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+import logs
+from dbInterface import configKey
+
+log = logs.get(__name__)
+
+#node traffic of tnCalls and otherCalls on disk. with rpc-mode record every node call is also written to rpc-fixtures,
+#one gzipped JSON line per call with its answer and response time, repeats of the same answer folded into one line.
+#with rpc-mode replay the nodes are never contacted, calls are answered from the fixtures in the order they were
+#recorded per call and arguments, the last answer repeated once they run out. payouts that were not recorded get
+#a made up transaction id, so a recorded day of blocks can be scanned again and always sees the same input
+MODES = ('record', 'replay')
+
+#calls that change something on the node, by chain, with the kind of answer a replay makes up for them
+WRITES = {'DCC': {'sendTx': 'tx'},
+          'Other': {'sendtoaddress': 'txid', 'walletlock': None}}
+
+#calls whose arguments are secrets, e.g. the wallet passphrase. they are never written to the fixtures,
+#a replay answers them with None
+SECRETS = {'Other': ('walletpassphrase',)}
+
+#bitcoind numbers are read as Decimal, the same as the AuthServiceProxy does
+PARSEFLOAT = {'Other': decimal.Decimal}
+
+sessions = {}
+sessionsLock = threading.Lock()
+
+class NotRecorded(Exception):
+    pass
+
+class RecordedError(Exception):
+    #a call that failed while recording fails the same way in a replay, with the message of the original error
+    pass
+
+def jsonDefault(value):
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+
+    return str(value)
+
+def keyOf(name, args):
+    return name + ' ' + json.dumps(args, default=jsonDefault)
+
+def fixturePath(config):
+    return config['main'].get('rpc-fixtures', 'fixtures')
+
+def get(config, chain):
+    #the recorder or player of a chain, None when the nodes are used as they are
+    mode = config['main'].get('rpc-mode', '')
+
+    if mode not in MODES:
+        return None
+
+    key = (chain, configKey(config))
+    with sessionsLock:
+        if key not in sessions:
+            if mode == 'record':
+                sessions[key] = recorder(config, chain)
+            else:
+                sessions[key] = player(config, chain)
+
+        return sessions[key]
+
+def call(config, chain, name, args, func):
+    #func() asks the node, name and args tell the call apart in the fixtures
+    session = get(config, chain)
+
+    if session is None:
+        return func()
+
+    return session.call(name, list(args), func)
+
+def wrap(config, chain, target):
+    #target, or a stand-in that sends each of its method calls through the session
+    session = get(config, chain)
+
+    if session is None:
+        return target
+
+    return proxy(session, target)
+
+class proxy(object):
+    def __init__(self, session, target):
+        self.session = session
+        self.target = target
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+
+        def method(*args):
+            return self.session.call(name, list(args), lambda: getattr(self.target, name)(*args))
+
+        return method
+
+class recorder(object):
+    #every process writes its own file per chain, <chain>-<pid>.jsonl.gz
+    def __init__(self, config, chain):
+        self.chain = chain
+        self.lock = threading.Lock()
+        self.last = None
+        self.lastKey = None
+        self.unflushed = 0
+
+        os.makedirs(fixturePath(config), exist_ok=True)
+        self.path = os.path.join(fixturePath(config), '%s-%d.jsonl.gz' % (chain, os.getpid()))
+        self.file = gzip.open(self.path, 'at', encoding='utf-8')
+        atexit.register(self.close)
+        log.info('recording %s node calls to %s', chain, self.path)
+
+    def call(self, name, args, func):
+        if name in SECRETS.get(self.chain, ()):
+            return func()
+
+        start = time.perf_counter()
+
+        try:
+            result = func()
+        except Exception as e:
+            self.add(name, args, error='%s: %s' % (type(e).__name__, e), seconds=time.perf_counter() - start)
+            raise
+
+        self.add(name, args, result=result, seconds=time.perf_counter() - start)
+
+        return result
+
+    def add(self, name, args, result = None, error = None, seconds = 0):
+        #also for answers that were not asked from the node as they are, e.g. the end of a recorded block range
+        answer = {'error': error} if error is not None else {'result': result}
+        key = keyOf(name, args) + ' ' + json.dumps(answer, default=jsonDefault)
+
+        with self.lock:
+            if key == self.lastKey:
+                self.last['count'] += 1
+                self.last['ms'] += seconds * 1000
+                return
+
+            self.write()
+            self.last = {'call': name, 'args': args, 'count': 1, 'ms': seconds * 1000}
+            self.last.update(answer)
+            self.lastKey = key
+
+    def write(self):
+        if self.last is None:
+            return
+
+        self.last['ms'] = round(self.last['ms'], 3)
+        self.file.write(json.dumps(self.last, default=jsonDefault) + '\n')
+        self.last = None
+        self.lastKey = None
+        self.unflushed += 1
+
+        if self.unflushed >= 100:
+            self.file.flush()
+            self.unflushed = 0
+
+    def close(self):
+        with self.lock:
+            if self.file.closed:
+                return
+
+            self.write()
+            self.file.close()
+
+class player(object):
+    #rpc-replay-latency scales the recorded response times, 0 answers at once and 1 as fast as the node did,
+    #rpc-replay-latency-ms is added to every answer
+    def __init__(self, config, chain):
+        self.chain = chain
+        self.factor = config['main'].get('rpc-replay-latency', 0)
+        self.extra = config['main'].get('rpc-replay-latency-ms', 0) / 1000
+        self.parseFloat = PARSEFLOAT.get(chain, float)
+        self.lock = threading.Lock()
+        self.answers = {}
+        self.calls = collections.Counter()
+        self.madeUp = 0
+
+        paths = sorted(glob.glob(os.path.join(fixturePath(config), chain + '-*.jsonl.gz')), key=os.path.getmtime)
+        for path in paths:
+            self.load(path)
+
+        if len(paths) == 0:
+            log.warning('no recorded %s node calls in %s', chain, fixturePath(config))
+
+    def load(self, path):
+        entries = 0
+
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as fixture:
+                for line in fixture:
+                    entry = json.loads(line)
+                    #the answer is parsed again for every call, the same as a node response would be
+                    answer = {'count': entry['count'], 'left': entry['count'], 'seconds': entry['ms'] / entry['count'] / 1000}
+
+                    if 'error' in entry:
+                        answer['error'] = entry['error']
+                    else:
+                        answer['result'] = json.dumps(entry['result'])
+
+                    self.answers.setdefault(keyOf(entry['call'], entry['args']), collections.deque()).append(answer)
+                    entries += 1
+        except (EOFError, ValueError) as e:
+            #the end of a recording that was interrupted
+            log.warning('%s read up to entry %d: %s', path, entries, e)
+
+    def call(self, name, args, func):
+        key = keyOf(name, args)
+
+        with self.lock:
+            self.calls[name] += 1
+
+            if name in SECRETS.get(self.chain, ()):
+                return None
+
+            answers = self.answers.get(key)
+
+            if answers is None:
+                if name not in WRITES.get(self.chain, {}):
+                    raise NotRecorded('%s %s' % (self.chain, key))
+
+                self.madeUp += 1
+                answer = {'result': json.dumps(self.makeUp(name, key)), 'seconds': 0}
+            else:
+                answer = answers[0]
+                answer['left'] -= 1
+
+                if answer['left'] <= 0 and len(answers) > 1:
+                    answers.popleft()
+
+        wait = self.factor * answer['seconds'] + self.extra
+        if wait > 0:
+            time.sleep(wait)
+
+        if 'error' in answer:
+            raise RecordedError(answer['error'])
+
+        return json.loads(answer['result'], parse_float=self.parseFloat)
+
+    def makeUp(self, name, key):
+        txId = hashlib.sha256(('%s %s %d' % (self.chain, key, self.madeUp)).encode()).hexdigest()
+        kind = WRITES[self.chain][name]
+
+        if kind == 'tx':
+            return {'id': txId}
+        elif kind == 'txid':
+            return txId
+        else:
+            return None
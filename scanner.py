@@ -0,0 +1,20 @@
+import json
+import metrics
+import queryLog
+from dbInterface import getDB
+from start import config, prepareDB, startScanners
+
+def main():
+    #scanner service: block scanning, the controller and the address pool, without the API
+    if config['main'].get('metrics-port', 0) > 0:
+        pages = {'/queries': lambda: (json.dumps(queryLog.report()), 'application/json')}
+        metrics.serve(config['main']['metrics-port'], config['main']['admin-username'], config['main']['admin-password'], pages)
+
+    dbc = getDB(config)
+    prepareDB(dbc)
+
+    for thread in startScanners(dbc):
+        thread.join()
+
+if __name__ == "__main__":
+    main()
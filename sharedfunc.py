@@ -1,7 +1,12 @@
-import datetime
+import metrics
+import spans
 
-def getnow():
-    #return current datetime in str format
-    dateTimeObj = datetime.datetime.now()
-    timestampStr = dateTimeObj.strftime("%d-%b-%Y (%H:%M:%S.%f)")
-    return timestampStr
+#measured by both block scanners
+metrics.describe('gateway_checkblock_seconds', 'histogram', 'duration of checkBlock by chain')
+metrics.describe('gateway_block_transactions', 'histogram', 'transactions per checked block by chain', (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000))
+metrics.describe('gateway_payouts_total', 'counter', 'payouts by the chain they are sent on and result')
+metrics.describe('gateway_scanner_lag_blocks', 'gauge', 'confirmed blocks not scanned yet by chain')
+
+def configureSpans(config):
+    #the per block stage summaries of both scanners go to the same rotating log
+    spans.configure(config['main'].get('stage-log', 'checkblock.log'), config['main'].get('stage-log-size', 10485760), config['main'].get('stage-log-count', 5))
@@ -0,0 +1,144 @@
+import json
+import logging
+import logging.handlers
+import os
+import threading
+import time
+
+#stage timings of one block at a time per thread. stages nest, a stage is recorded under the path of the
+#stages around it, e.g. 'checkTx/db'. every block ends up as one JSON line in a rotating log
+local = threading.local()
+logger = logging.getLogger('gateway.stages')
+logger.propagate = False
+logger.setLevel(logging.INFO)
+configLock = threading.Lock()
+logPath = ''
+
+def configure(path, maxBytes = 10485760, backupCount = 5):
+    global logPath
+
+    with configLock:
+        if path == logPath:
+            return
+
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+            handler.close()
+
+        handler = logging.handlers.RotatingFileHandler(path, maxBytes=maxBytes, backupCount=backupCount)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logPath = path
+
+def record(trace, path, seconds):
+    stage = trace['stages'].get(path)
+
+    if stage is None:
+        trace['stages'][path] = [seconds, 1]
+    else:
+        stage[0] += seconds
+        stage[1] += 1
+
+class block(object):
+    #with spans.block(chain, height): collects the stages of the block and logs their summary at the end
+    def __init__(self, chain, height):
+        self.chain = chain
+        self.height = height
+
+    def __enter__(self):
+        local.trace = {'stages': {}, 'path': []}
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, excType, excValue, tb):
+        trace = local.trace
+        local.trace = None
+
+        if len(logger.handlers) > 0:
+            summary = {'time': round(time.time(), 3),
+                       'chain': self.chain,
+                       'height': self.height,
+                       'total': round(time.perf_counter() - self.start, 6),
+                       'error': '' if excType is None else excType.__name__,
+                       'stages': dict((path, {'seconds': round(seconds, 6), 'count': count}) for path, (seconds, count) in trace['stages'].items())}
+            logger.info(json.dumps(summary))
+
+        return False
+
+def enter(name):
+    #starts a stage, False outside of a block or when the stage would only repeat the one it is in
+    trace = getattr(local, 'trace', None)
+
+    if trace is None or (len(trace['path']) > 0 and trace['path'][-1] == name):
+        return False
+
+    trace['path'].append(name)
+    return True
+
+def leave(seconds):
+    trace = local.trace
+    record(trace, '/'.join(trace['path']), seconds)
+    trace['path'].pop()
+
+class span(object):
+    #with spans.span(name): one stage inside the current block, costs next to nothing without a block
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.active = enter(self.name)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, excType, excValue, tb):
+        if self.active:
+            leave(time.perf_counter() - self.start)
+
+        return False
+
+def readSummaries(path, limit):
+    #the newest limit block summaries from the log and the files it was rotated into
+    lines = []
+    filenames = [path] + [path + '.' + str(index) for index in range(1, 100)]
+
+    for filename in filenames:
+        if len(lines) >= limit or not os.path.isfile(filename):
+            break
+
+        with open(filename) as logFile:
+            lines = logFile.readlines()[-(limit - len(lines)):] + lines
+
+    summaries = []
+    for line in lines:
+        try:
+            summaries.append(json.loads(line))
+        except ValueError:
+            continue
+
+    return summaries
+
+def percentile(values, share):
+    #nearest rank of sorted values
+    index = max(int(round(share * len(values) + 0.5)) - 1, 0)
+    return values[min(index, len(values) - 1)]
+
+def breakdown(path, limit = 1000):
+    #p50/p95/p99 seconds per chain and stage over the newest limit blocks, a stage only counts the blocks it occurred in
+    samples = {}
+
+    for summary in readSummaries(path, limit):
+        stages = samples.setdefault(summary['chain'], {})
+        stages.setdefault('total', []).append(summary['total'])
+
+        for stage, values in summary['stages'].items():
+            stages.setdefault(stage, []).append(values['seconds'])
+
+    result = {}
+    for chain, stages in samples.items():
+        result[chain] = {}
+
+        for stage, values in sorted(stages.items()):
+            values.sort()
+            result[chain][stage] = {'blocks': len(values), 'p50': percentile(values, 0.5), 'p95': percentile(values, 0.95), 'p99': percentile(values, 0.99)}
+
+    return result
@@ -2,20 +2,25 @@ import json
 import os
 import sys
 import threading
-import uvicorn
 
-from dbClass import dbCalls
-from dbPGClass import dbPGCalls
+import logs
+from api import runAPI
+from dbInterface import backendName, getDB
 from tnClass import tnCalls
 from otherClass import otherCalls
 
 from tnChecker import TNChecker
 from otherChecker import OtherChecker
 from controlClass import controller
+from poolClass import addressPool
+
+log = logs.get('start')
 
 with open('config.json') as json_file:
     config = json.load(json_file)
 
+logs.configure(config)
+
 def initialisedb(db):
     #get current TN block:
     tnlatestBlock = tnCalls(config).currentBlock()
@@ -25,71 +30,75 @@ def initialisedb(db):
     ethlatestBlock = otherCalls(config).currentBlock()
     db.insHeights(ethlatestBlock, 'Other')
 
-def main():
-    #check db
-    if config['main']['use-pg']:
-        #use PostGres
-        dbc = dbPGCalls(config)
-
-        if config["main"]["db-location"] != "":
-            path= os.getcwd()
-            dbfile = path + '/' + config["main"]["db-location"] + '/' + 'gateway.db'
-            dbfile = os.path.normpath(dbfile)
-        else:
-            dbfile = 'gateway.db'
-
-        if os.path.isfile(dbfile):
-            #import old db
-            print("INFO: importing old SQLite DB")
-            try:
-                dbc.createdb()
-                dbc.importSQLite()
-                dbfile_new = dbfile.replace('gateway.db', 'gateway.db.imported')
-
-                os.rename(dbfile, dbfile_new)
-            except Exception as e:
-                print ('Error %s' % e) 
-                print("ERROR: Error occured during import of previous DB")
-                sys.exit()
-        else:
-            try:
-                result = dbc.lastScannedBlock("DCC")
-
-                if not isinstance(result, int):
-                    if len(result) == 0:
-                        initialisedb()
-            except:
-                dbc.createdb()
-                initialisedb(dbc)
+def prepareDB(dbc):
+    #creates or migrates the db, the scanner side does this before anything else uses it
+    if config["main"]["db-location"] != "":
+        path= os.getcwd()
+        dbfile = path + '/' + config["main"]["db-location"] + '/' + 'gateway.db'
+        dbfile = os.path.normpath(dbfile)
     else:
-        #use SQLite
-        dbc = dbCalls(config)
+        dbfile = 'gateway.db'
 
+    if backendName(config) == 'postgres' and os.path.isfile(dbfile):
+        #import old db
+        log.info('importing old SQLite DB')
         try:
-            result = dbc.lastScannedBlock("DCC")
-
-            if not isinstance(result, int):
-                if len(result) == 0:
-                    initialisedb()
-        except:
             dbc.createdb()
-            initialisedb(dbc)
+            dbc.importSQLite()
+            dbfile_new = dbfile.replace('gateway.db', 'gateway.db.imported')
 
+            os.rename(dbfile, dbfile_new)
+        except Exception as e:
+            log.error('error occured during import of previous DB: %s', e, exc_info=True)
+            sys.exit()
+    else:
+        dbc.createdb()
         dbc.createVerify()
         dbc.updateExisting()
-        
+
+        if backendName(config) == 'dual':
+            #migration between SQLite and Postgres, writes go to both while the backfill runs
+            dbc.startBackfill()
+
+        if dbc.lastScannedBlock("DCC") == 0:
+            initialisedb(dbc)
+
+def startScanners(dbc):
     #load and start threads
     tn = TNChecker(config, dbc)
     other = OtherChecker(config, dbc)
     ctrl = controller(config, dbc)
-    otherThread = threading.Thread(target=other.run)
-    tnThread = threading.Thread(target=tn.run)
-    ctrlThread = threading.Thread(target=ctrl.run)
+    pool = addressPool(config, dbc)
+    otherThread = threading.Thread(target=other.run, name='otherChecker')
+    tnThread = threading.Thread(target=tn.run, name='tnChecker')
+    ctrlThread = threading.Thread(target=ctrl.run, name='controller')
+    poolThread = threading.Thread(target=pool.run, name='addressPool')
     otherThread.start()
     tnThread.start()
     ctrlThread.start()
-    
+    poolThread.start()
+
+    return [otherThread, tnThread, ctrlThread, poolThread]
+
+def startServices():
+    #runs next to the API, a db that cannot be prepared ends the whole process as it did before the API started first
+    try:
+        dbc = getDB(config)
+        prepareDB(dbc)
+        startScanners(dbc)
+    except BaseException as e:
+        log.critical('preparing the db or starting the scanners failed, stopping: %s', e, exc_info=not isinstance(e, SystemExit))
+        logs.stop()
+        os._exit(1)
+
+def main():
+    #scanners and API in one process, scanner.py and api.py run them as separate services.
+    #the db is prepared next to the already listening API, /api/ready tells when it can serve
+    servicesThread = threading.Thread(target=startServices, name='startServices')
+    servicesThread.start()
+
     #start app
-    uvicorn.run("gateway:app", host="0.0.0.0", port=config["main"]["port"], log_level="warning")
+    runAPI()
 
-main()
+if __name__ == "__main__":
+    main()
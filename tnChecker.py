@@ -1,60 +1,73 @@
 import time
-import traceback
 import base58
+import latencyLedger
+import logs
+import metrics
 import sharedfunc
-from dbClass import dbCalls
-from dbPGClass import dbPGCalls
+import spans
+from dbInterface import getDB
 from tnClass import tnCalls
 from otherClass import otherCalls
 from verification import verifier
 
+log = logs.get(__name__)
+
 class TNChecker(object):
     def __init__(self, config, db = None):
         self.config = config
 
         if db == None:
-            if self.config['main']['use-pg']:
-                self.db = dbPGCalls(config)
-            else:
-                self.db = dbCalls(config)
+            self.db = getDB(config)
         else:
             self.db = db
 
         self.tnc = tnCalls(config, self.db)
+        self.otc = otherCalls(config, self.db)
         self.verifier = verifier(config, self.db)
 
         self.lastScannedBlock = self.db.lastScannedBlock("DCC")
+        sharedfunc.configureSpans(config)
 
     def run(self):
         #main routine to run continuesly
-        #print('INFO: started checking tn blocks at: ' + str(self.lastScannedBlock))
+        #log.info('started checking tn blocks at: %s', self.lastScannedBlock)
 
         while True:
             try:
                 nextblock = self.tnc.currentBlock() - self.config['dcc']['confirmations']
+                metrics.setGauge('gateway_scanner_lag_blocks', max(nextblock - self.lastScannedBlock, 0), chain='DCC')
 
                 if nextblock > self.lastScannedBlock:
                     self.lastScannedBlock += 1
-                    self.checkBlock(self.lastScannedBlock)
+                    with metrics.timer('gateway_checkblock_seconds', chain='DCC'), spans.block('DCC', self.lastScannedBlock):
+                        self.checkBlock(self.lastScannedBlock)
                     self.db.updHeights(self.lastScannedBlock, 'DCC')
             except Exception as e:
                 self.lastScannedBlock -= 1
-                print('ERROR: Something went wrong during tn block iteration: ' + str(traceback.TracebackException.from_exception(e)))
+                log.error('something went wrong during tn block iteration: %s', e, exc_info=True)
 
             time.sleep(self.config['dcc']['timeInBetweenChecks'])
 
     def checkBlock(self, heightToCheck):
         #check content of the block for valid transactions
-        block = self.tnc.getBlock(heightToCheck)
+        with spans.span('getBlock'):
+            block = self.tnc.getBlock(heightToCheck)
+        metrics.observe('gateway_block_transactions', len(block['transactions']), chain='DCC')
+
         for transaction in block['transactions']:
-            targetAddress = self.tnc.checkTx(transaction)
+            with spans.span('checkTx'):
+                targetAddress = self.tnc.checkTx(transaction)
+            detectedAt = time.time()
 
             if targetAddress is not None:
                 if targetAddress != "No attachment":
-                    if not(otherCalls(self.config, self.db).validateaddress(targetAddress)):
+                    with spans.span('validateAddress'):
+                        validAddress = self.otc.validateaddress(targetAddress)
+
+                    if not(validAddress):
                         self.faultHandler(transaction, "txerror")
                     else:
-                        targetAddress = otherCalls(self.config, self.db).normalizeAddress(targetAddress)
+                        targetAddress = self.otc.normalizeAddress(targetAddress)
                         amount = transaction['amount'] / pow(10, self.config['dcc']['decimals'])
                         amount = round(amount, 8)
                         
@@ -63,49 +76,58 @@ class TNChecker(object):
                         else:
                             try:
                                 txId = None
+                                paid = False
+                                latencyLedger.detected(self.db, transaction['id'], 'Withdraw', block['timestamp'] / 1000, detectedAt)
                                 self.db.insTunnel('sending', transaction['sender'], targetAddress)
-                                txId = otherCalls(self.config, self.db).sendTx(targetAddress, amount)
+                                with spans.span('sendTx'):
+                                    txId = self.otc.sendTx(targetAddress, amount)
 
                                 if 'error' in txId:
+                                    metrics.inc('gateway_payouts_total', chain='Other', result='failed')
                                     self.faultHandler(transaction, "senderror", e=txId)
                                     self.db.updTunnel("error", transaction['sender'], targetAddress, statusOld="sending")
                                 else:
-                                    print("INFO: send tx: " + str(txId))
+                                    log.info('send tx: %s', txId)
+                                    metrics.inc('gateway_payouts_total', chain='Other', result='sent')
+                                    paid = True
+                                    latencyLedger.sent(self.db, transaction['id'], txId)
 
-                                    self.db.insExecuted(transaction['sender'], targetAddress, txId, transaction['id'], amount, self.config['other']['fee'])
-                                    print('INFO: send tokens from tn to other!')
+                                    self.db.insExecuted(transaction['sender'], targetAddress, txId, transaction['id'], amount, self.config['other']['fee'], 'Withdraw')
+                                    log.info('send tokens from tn to other!')
 
                                     #self.db.delTunnel(transaction['sender'], targetAddress)
                                     self.db.updTunnel("verifying", transaction['sender'], targetAddress, statusOld='sending')
                             except Exception as e:
+                                if not paid:
+                                    metrics.inc('gateway_payouts_total', chain='Other', result='failed')
                                 self.faultHandler(transaction, "txerror", e=e)
                                 continue
 
                             if txId is None:
                                 if targetAddress != 'invalid address':
                                     self.db.insError(transaction['sender'], targetAddress, transaction['id'], '', amount, 'tx failed to send - manual intervention required')
-                                    print("ERROR: tx failed to send - manual intervention required")
+                                    log.error('tx failed to send - manual intervention required')
                                     self.db.updTunnel("error", transaction['sender'], targetAddress, statusOld="sending")
                             else:
-                                otherCalls(self.config, self.db).verifyTx(txId, transaction['sender'], targetAddress)
+                                with spans.span('verifyTx'):
+                                    self.otc.verifyTx(txId, transaction['sender'], targetAddress)
                 else:
                     self.faultHandler(transaction, 'noattachment')
         
     def faultHandler(self, tx, error, e=""):
         #handle transfers to the gateway that have problems
         amount = tx['amount'] / pow(10, self.config['dcc']['decimals'])
-        timestampStr = sharedfunc.getnow()
 
         if error == "noattachment":
             self.db.insError(tx['sender'], "", tx['id'], "", amount, "no attachment found on transaction")
-            print("ERROR: " + timestampStr + " - Error: no attachment found on transaction from " + tx['sender'] + " - check errors table.")
+            log.error('no attachment found on transaction from %s - check errors table', tx['sender'])
 
         if error == "txerror":
             targetAddress = base58.b58decode(tx['attachment']).decode()
             self.db.insError(tx['sender'], targetAddress, tx['id'], "", amount, "tx error, possible incorrect address", str(e))
-            print("ERROR: " + timestampStr + " - Error: on outgoing transaction for transaction from " + tx['sender'] + " - check errors table.")
+            log.error('error on outgoing transaction for transaction from %s - check errors table', tx['sender'])
 
         if error == "senderror":
             targetAddress = base58.b58decode(tx['attachment']).decode()
             self.db.insError(tx['sender'], targetAddress, tx['id'], "", amount, "tx error, check exception error", str(e))
-            print("ERROR: " + timestampStr + " - Error: on outgoing transaction for transaction from " + tx['sender'] + " - check errors table.")
+            log.error('error on outgoing transaction for transaction from %s - check errors table', tx['sender'])
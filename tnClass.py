@@ -1,20 +1,39 @@
 import os
+import threading
 import time
 import base58
 import PyCWaves
 import requests
-from dbClass import dbCalls
-from dbPGClass import dbPGCalls
+import latencyLedger
+import logs
+import metrics
+import rpcReplay
+from dbInterface import configKey, getDB
+
+log = logs.get(__name__)
+clients = {}
+clientsLock = threading.Lock()
+
+def getTN(config, db = None):
+    #one shared client per config for the API and other occasional callers, the scanners keep their own
+    key = configKey(config)
+
+    with clientsLock:
+        if key not in clients:
+            clients[key] = tnCalls(config, db)
+
+        return clients[key]
+
+def nodeGet(config, path):
+    #GET on the node API, recorded or replayed with rpc-mode
+    return rpcReplay.call(config, 'DCC', path, [], lambda: requests.get(config['dcc']['node'] + path).json())
 
 class tnCalls(object):
     def __init__(self, config, db = None):
         self.config = config
 
         if db == None:
-            if self.config['main']['use-pg']:
-                self.db = dbPGCalls(config)
-            else:
-                self.db = dbCalls(config)
+            self.db = getDB(config)
         else:
             self.db = db
 
@@ -23,20 +42,36 @@ class tnCalls(object):
         self.pwTN = PyCWaves.PyCWaves()
         self.pwTN.THROW_EXCEPTION_ON_ERROR = True
         self.pwTN.setNode(node=self.config['dcc']['node'], chain=self.config['dcc']['network'], chain_id=self.config['dcc']['chainid'])
-        seed = os.getenv(self.config['dcc']['seedenvname'], self.config['dcc']['gatewaySeed'])
-        self.tnAddress = self.pwTN.Address(seed=seed)
-        self.tnAsset = self.pwTN.Asset(self.config['dcc']['assetId'])
+        self.seed = os.getenv(self.config['dcc']['seedenvname'], self.config['dcc']['gatewaySeed'])
+        self.address = None
+        self.asset = None
+
+    @property
+    def tnAddress(self):
+        #the key derivation and the asset lookup on the node only happen once they are needed,
+        #address checks and block reads work without them
+        if self.address is None:
+            self.address = self.pwTN.Address(seed=self.seed)
+
+        return self.address
+
+    @property
+    def tnAsset(self):
+        if self.asset is None:
+            self.asset = self.pwTN.Asset(self.config['dcc']['assetId'])
+
+        return self.asset
 
     def currentBlock(self):
-        result = requests.get(self.node + '/blocks/height').json()['height'] - 1
+        result = nodeGet(self.config, '/blocks/height')['height'] - 1
 
         return result
 
     def getBlock(self, height):
-        return requests.get(self.node + '/blocks/at/' + str(height)).json()
+        return nodeGet(self.config, '/blocks/at/' + str(height))
 
     def currentBalance(self):
-        myBalance = self.tnAddress.balance(assetId=self.config['dcc']['assetId'])
+        myBalance = rpcReplay.call(self.config, 'DCC', 'balance', [self.config['dcc']['assetId']], lambda: self.tnAddress.balance(assetId=self.config['dcc']['assetId']))
         myBalance /= pow(10, self.config['dcc']['decimals'])
 
         return myBalance
@@ -46,20 +81,23 @@ class tnCalls(object):
 
     def verifyTx(self, tx, sourceAddress = '', targetAddress = ''):
         try:
-            time.sleep(60)
-            verified = self.pwTN.tx(tx['id'])
+            #the payout needs a block before it can be looked up
+            time.sleep(self.config['dcc'].get('verify-delay', 60))
+            verified = nodeGet(self.config, '/transactions/info/' + tx['id'])
 
             if verified['height'] > 0:
                 self.db.insVerified("DCC", tx['id'], verified['height'])
-                print('INFO: tx to tn verified!')
+                latencyLedger.confirmed(self.db, tx['id'])
+                log.info('tx to tn verified!')
 
                 self.db.delTunnel(sourceAddress, targetAddress)
+                latencyLedger.completed(self.db, tx['id'])
             else:
                 self.db.insVerified("DCC", tx['id'], 0)
-                print('WARN: tx to tn not verified!')
+                log.warning('tx to tn not verified!')
         except:
             self.db.insVerified("DCC", tx['id'], 0)
-            print('WARN: tx to tn not verified!')
+            log.warning('tx to tn not verified!')
 
     def checkTx(self, tx):
         #check the transaction
@@ -76,10 +114,15 @@ class tnCalls(object):
         return None
 
     def sendTx(self, address, amount, attachment):
-        addr = self.pwTN.Address(address)
-        if self.config['dcc']['assetId'] == 'DCC':
-            tx = self.tnAddress.sendWaves(addr, amount, attachment, txFee=2000000)
-        else:
-            tx = self.tnAddress.sendAsset(addr, self.tnAsset, amount, attachment, txFee=2000000)
+        def send():
+            addr = self.pwTN.Address(address)
+            if self.config['dcc']['assetId'] == 'DCC':
+                return self.tnAddress.sendWaves(addr, amount, attachment, txFee=2000000)
+            else:
+                return self.tnAddress.sendAsset(addr, self.tnAsset, amount, attachment, txFee=2000000)
+
+        tx = rpcReplay.call(self.config, 'DCC', 'sendTx', [address, amount, attachment], send)
 
         return tx
+
+metrics.instrument(tnCalls, 'gateway_rpc_seconds', 'duration of node calls by chain and method', metrics.publicMethods(tnCalls), chain='DCC')
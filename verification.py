@@ -1,30 +1,33 @@
-from dbClass import dbCalls
-from dbPGClass import dbPGCalls
-from tnClass import tnCalls
-from otherClass import otherCalls
+from dbInterface import getDB
+from tnClass import getTN
+from otherClass import getOther
 
 class verifier(object):
     def __init__(self, config, db = None):
         self.config = config
 
         if db == None:
-            if self.config['main']['use-pg']:
-                self.db = dbPGCalls(config)
-            else:
-                self.db = dbCalls(config)
+            self.db = getDB(config)
         else:
             self.db = db
 
-        self.tnc = tnCalls(config, self.db)
-        self.otc = otherCalls(config, self.db)
-        
+        self.tnc = getTN(config, self.db)
+
+    @property
+    def otc(self):
+        #the health checks run in whatever thread serves the request
+        return getOther(self.config, self.db)
+
     def checkTX(self, targetAddress = '', sourceAddress = ''):
+        #deposits are checked by their target, withdraws by their source address
         result = {'status': '', 'tx': '', 'block': '', 'error': ''}
 
         if targetAddress != '':
             address = targetAddress
+            side = 'target'
         elif  sourceAddress != '':
             address = sourceAddress
+            side = 'source'
         else:
             result['status'] = 'error'
             result['error'] = 'invalid address'
@@ -35,62 +38,22 @@ class verifier(object):
             result['error'] = 'invalid address'
             return result
         else:
-            tx = self.db.getTunnelStatus(targetAddress=address)
-
-            if len(tx) != 0:
-                result['status'] = tx[0][0]
-                
-                if result['status'] == "sending" or result['status'] == "verifying":
-                    resexec = self.checkExecuted(targetAddress=targetAddress, sourceAddress=sourceAddress)
-
-                    if 'error' in resexec:
-                        result['error'] = resexec['error']
-                    else:
-                        result['tx'] = resexec['tx']
-                        result['block'] = resexec['block']
-                elif result['status'] == "created":
-                    return result
-                elif result['status'] == "error":
-                    resexec = self.db.getError(targetAddress=targetAddress, sourceAddress=sourceAddress)
-
-                    if len(resexec) != 0:
-                        result['error'] = resexec[0][0]
-                        if targetAddress != '':
-                            result['tx'] = resexec[0][2]
-                        else:
-                            result['tx'] = resexec[0][1]
-            else:
-                resexec = self.checkExecuted(targetAddress=targetAddress, sourceAddress=sourceAddress)
+            return self.db.getStatus(address, side)
 
-                if 'error' in resexec:
-                    result['error'] = resexec['error']
-                else:
-                    result['tx'] = resexec['tx']
-                    result['block'] = resexec['block']
+    def checkTXs(self, addresses, side):
+        #checkTX for a list of deposit (target) or withdraw (source) addresses, address -> result
+        results = {}
+        valid = []
 
-        return result
+        for address in dict.fromkeys(addresses):
+            if address != '' and self.tnc.validateaddress(address):
+                valid.append(address)
+            else:
+                results[address] = {'status': 'error', 'tx': '', 'block': '', 'error': 'invalid address'}
 
-    def checkExecuted(self, targetAddress = '', sourceAddress = ''):
-        if targetAddress != '':
-            tx = self.db.getExecuted(targetAddress=targetAddress)
-        elif  sourceAddress != '':
-            tx = self.db.getExecuted(sourceAddress=sourceAddress)
-        else:
-            return {'error': 'invalid address'}
-        
-        if len(tx) == 0:
-            return {'error': 'no tx found'}
-        else:
-            tx = tx[0][0]
-            result = self.db.getVerified(tx)
+        results.update(self.db.getStatuses(valid, side))
 
-            if result is None:
-                return {'txVerified': False, 'tx': tx, 'block': 0} 
-            else:
-                if result > 0:
-                    return {'txVerified': True, 'tx': tx, 'block': result} 
-                else:
-                    return {'txVerified': False, 'tx': tx, 'block': result} 
+        return results
 
     def checkHealth(self):
         connTN = self.chConnection('DCC')